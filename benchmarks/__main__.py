@@ -0,0 +1,102 @@
+"""
+Run the benchmarks and write the results as JSON:
+
+    python -m benchmarks --devices 50 --clients 20 -o results.json
+
+Every run records the commit and machine it ran on, so that result files can be compared over time.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import subprocess
+
+from benchmarks import bench_polling, bench_history, bench_alerts
+
+SUITES = {
+    'polling': bench_polling,
+    'history': bench_history,
+    'alerts': bench_alerts,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Temperature web control benchmarks.")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="write the results to this file instead of stdout")
+    parser.add_argument("--only", choices=list(SUITES), action='append',
+                        help="run only this suite, can be repeated")
+    parser.add_argument("--devices", type=int, default=20, help="number of emulated devices")
+    parser.add_argument("--clients", type=int, default=10, help="number of websocket clients")
+    parser.add_argument("--client-processes", type=int, default=2,
+                        help="processes the websocket clients are spread over")
+    parser.add_argument("--encoding", choices=['json', 'binary', 'binary+zlib'], default='json',
+                        help="frames the status clients ask for")
+    parser.add_argument("--interval", type=float, default=0.2, help="update interval, in seconds")
+    parser.add_argument("--cycles", type=int, default=50, help="poll cycles to measure")
+    parser.add_argument("--read-latency", type=float, default=0.0,
+                        help="time a device takes to answer a read, in seconds")
+    parser.add_argument("--polling-workers", type=int, default=0,
+                        help="poll the devices in this many worker processes")
+    parser.add_argument("--history-lengths", type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help="history lengths of the fetch_history measurement")
+    parser.add_argument("--history-encodings", nargs='+', choices=['json', 'binary', 'binary+zlib'],
+                        default=['json', 'binary', 'binary+zlib'])
+    parser.add_argument("--repeat", type=int, default=5, help="fetch_history requests per history length")
+    parser.add_argument("--hours", type=float, default=1, help="hours of history of the memory measurement")
+    parser.add_argument("--rule-counts", type=int, nargs='+', default=[10, 100, 1000],
+                        help="numbers of alert rules to evaluate")
+    parser.add_argument("--alert-steps", type=int, default=500, help="status updates evaluated per rule count")
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    results = {}
+    for name, suite in SUITES.items():
+        if args.only and name not in args.only:
+            continue
+        start = time.perf_counter()
+        results.update(await suite.run(args))
+        logging.getLogger("benchmark").info(f"Benchmark: {name} took {time.perf_counter() - start:.1f} s.")
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("benchmark").setLevel(logging.INFO)
+    logging.getLogger("benchmark.app").setLevel(logging.WARNING)  # the app core logs every request
+
+    report = {
+        'meta': {
+            'time': time.time(),
+            'commit': git_commit(),
+            'python': sys.version,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'parameters': vars(args),
+        },
+        'results': asyncio.run(run(args)),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Alert evaluation cost versus the number of rules.
+"""
+import time
+import random
+import logging
+
+from benchmarks.harness import summarize, device_names
+from temperature_web_control.plugin.alert_plugin import StatusAlertEngine, HighTemperatureStatusAlertCondition, \
+    LowTemperatureStatusAlertCondition, ExpressionStatusAlertCondition
+
+logger = logging.getLogger("benchmark.app")
+
+
+def make_conditions(rules, names):
+    """
+    A mix of threshold conditions and expression rules, half each, spread over the devices.
+    """
+    conditions = []
+    for i in range(rules):
+        dev = names[i % len(names)]
+        other = names[(i * 7 + 1) % len(names)]
+        kind = i % 4
+        if kind == 0:
+            conditions.append(HighTemperatureStatusAlertCondition(dev, 25 + i % 10, 0, logger))
+        elif kind == 1:
+            conditions.append(LowTemperatureStatusAlertCondition(dev, 15 - i % 10, 0, logger))
+        elif kind == 2:
+            conditions.append(ExpressionStatusAlertCondition(
+                f"{dev} - {other} > {3 + i % 5} and rate({dev}) > 1", None, 0, logger))
+        else:
+            conditions.append(ExpressionStatusAlertCondition(
+                f"abs({dev} - setpoint({dev})) > {2 + i % 3} or max({dev}, {other}) > 30", None, 0, logger))
+    return conditions
+
+
+def evaluation_cost(rules, names, steps):
+    engine = StatusAlertEngine(make_conditions(rules, names), known_devices=names)
+    random.seed(rules)
+
+    durations = []
+    for step in range(steps):
+        now = 1.7e9 + step
+        status = {name: {'name': name, 'time': now, 'temperature': 20 + random.gauss(0, 4), 'setpoint': 20,
+                         'status': 'ok'} for name in names}
+        start = time.perf_counter()
+        engine.evaluate(status, now)
+        durations.append(time.perf_counter() - start)
+
+    return summarize(durations[steps // 10:])  # without the warm-up
+
+
+async def run(args):
+    names = device_names(args.devices)
+    return {
+        'alert_evaluation': {
+            'devices': args.devices,
+            'by_rule_count': {str(rules): {'duration_s': evaluation_cost(rules, names, args.alert_steps)}
+                              for rules in args.rule_counts},
+        }
+    }
@@ -0,0 +1,100 @@
+"""
+`fetch_history` latency versus history length, and memory use per device-hour of history.
+"""
+import gc
+import json
+import time
+import random
+import asyncio
+import tracemalloc
+
+import websockets
+
+from benchmarks.harness import make_config, make_app_core, AppServer, set_encoding, decode, summarize, \
+    temporary_directory, device_names
+from temperature_web_control.server.app_core import TemperatureHistory
+
+
+def synthetic_history(samples, interval, start=1.7e9):
+    times = [start + i * interval + random.uniform(0, 0.01) for i in range(samples)]
+    temperatures = [20 + random.gauss(0, 0.5) for _ in range(samples)]
+    return times, temperatures
+
+
+async def fetch_history_latency(args, length):
+    with temporary_directory() as directory:
+        config = make_config(directory, args.devices, history_length=length, update_interval=args.interval)
+        app_core = make_app_core(config)
+        for name in app_core.dev_instances:
+            app_core.history.load(name, *synthetic_history(length, args.interval))
+
+        results = {}
+        async with AppServer(app_core) as server:
+            for encoding in args.history_encodings:
+                async with websockets.connect(server.url, max_size=None) as websocket:
+                    await set_encoding(websocket, encoding)
+                    latencies = []
+                    size = 0
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        await websocket.send(json.dumps({'event': 'fetch_history'}))
+                        message = await websocket.recv()
+                        data = decode(message)['data']
+                        latencies.append(time.perf_counter() - start)
+                        size = len(message)
+                        assert len(data) == args.devices
+
+                results[encoding] = {'latency_s': summarize(latencies), 'message_bytes': size}
+
+        if app_core.worker_pool:
+            app_core.worker_pool.close()
+    return results
+
+
+def history_memory(args):
+    """
+    Bytes held by the history for `args.devices` devices recording for `args.hours` hours.
+    """
+    samples = int(args.hours * 3600 / args.interval)
+    names = device_names(args.devices)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = TemperatureHistory(samples, names)
+
+    async def record():
+        for i in range(samples):
+            now = 1.7e9 + i * args.interval
+            await history.status_update_handler(None, {'status': {
+                name: {'time': now + random.uniform(0, 0.01), 'temperature': 20 + random.gauss(0, 0.5)}
+                for name in names
+            }})
+
+    asyncio.run(record())
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del history
+
+    device_hours = args.devices * args.hours
+    return {
+        'devices': args.devices,
+        'hours': args.hours,
+        'interval_s': args.interval,
+        'samples_per_device': samples,
+        'bytes': used,
+        'bytes_per_device_hour': used / device_hours,
+        'bytes_per_sample': used / (samples * args.devices),
+    }
+
+
+async def run(args):
+    latency = {}
+    for length in args.history_lengths:
+        latency[str(length)] = await fetch_history_latency(args, length)
+
+    return {
+        'fetch_history': {'devices': args.devices, 'by_history_length': latency},
+        'history_memory': await asyncio.get_running_loop().run_in_executor(None, history_memory, args),
+    }
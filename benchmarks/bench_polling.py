@@ -0,0 +1,71 @@
+"""
+Poll cycle duration and jitter, and status broadcast latency to websocket clients.
+"""
+import time
+import asyncio
+
+from benchmarks.harness import make_config, make_app_core, AppServer, StatusClients, summarize, \
+    temporary_directory
+
+
+async def run(args):
+    with temporary_directory() as directory:
+        config = make_config(directory, args.devices, update_interval=args.interval,
+                             polling_workers=args.polling_workers)
+        app_core = make_app_core(config, args.read_latency)
+
+        durations = []
+        acquire_status = app_core.acquire_status
+
+        async def timed_acquire_status():
+            start = time.perf_counter()
+            status = await acquire_status()
+            durations.append(time.perf_counter() - start)
+            return status
+
+        app_core.acquire_status = timed_acquire_status
+
+        cycle_times = []
+
+        async def on_status(subscribers, message):
+            cycle_times.append(time.perf_counter())
+
+        app_core.subscribe_to('status_available', on_status, on_status)
+
+        try:
+            async with AppServer(app_core) as server:
+                clients = StatusClients(server.url, args.clients, args.client_processes,
+                                        args.cycles * args.interval * 2 + 10, args.encoding)
+                await clients.start()
+
+                app_core.start_monitoring()
+                while len(cycle_times) < args.cycles + 1:
+                    await asyncio.sleep(args.interval / 4)
+                app_core.monitor_task.cancel()
+                app_core.monitor_running = False
+
+                # the clients stop on their own after their duration; closing the server ends them now
+            latencies = await clients.latencies()
+        finally:
+            if app_core.worker_pool:
+                app_core.worker_pool.close()
+
+    periods = [b - a for a, b in zip(cycle_times, cycle_times[1:])]
+    return {
+        'poll_cycle': {
+            'devices': args.devices,
+            'interval_s': args.interval,
+            'read_latency_s': args.read_latency,
+            'polling_workers': args.polling_workers,
+            'duration_s': summarize(durations),
+            # deviation of the time between two status updates from the configured interval
+            'jitter_s': summarize([abs(period - args.interval) for period in periods]),
+            'period_s': summarize(periods),
+        },
+        'broadcast_latency': {
+            'devices': args.devices,
+            'clients': args.clients,
+            'encoding': args.encoding,
+            'latency_s': summarize(latencies),
+        },
+    }
@@ -0,0 +1,213 @@
+"""
+Shared setup of the benchmarks: an app core on emulated devices, served over a websocket, and
+synthetic clients running in separate processes.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+import statistics
+import multiprocessing
+
+import yaml
+import websockets
+
+from temperature_web_control.driver.dummy_driver import DummyDevice
+from temperature_web_control.server.app_core import TemperatureAppCore
+from temperature_web_control.server.ws_encoding import decode_message
+from temperature_web_control.server.ws_server import WebSocketServer
+from temperature_web_control.utils import Config
+
+logger = logging.getLogger("benchmark.app")
+
+
+def summarize(values):
+    """
+    Summary statistics of a list of measurements, in the unit of the measurements.
+    """
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def percentile(p):
+        return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+    return {
+        'count': len(values),
+        'mean': statistics.mean(values),
+        'stdev': statistics.pstdev(values),
+        'min': values[0],
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'p99': percentile(99),
+        'max': values[-1],
+    }
+
+
+class EmulatedDevice(DummyDevice):
+    """
+    Dummy device whose reads take `latency` seconds, like a controller on the network.
+    """
+
+    def __init__(self, name, logger, latency):
+        super().__init__(name, 1, logger)
+        self.latency = latency
+
+    @property
+    def temperature(self) -> float:
+        if self.latency:
+            time.sleep(self.latency)
+        return super().temperature
+
+
+def device_names(devices):
+    return [f"Bench{i:04d}" for i in range(devices)]
+
+
+def make_config(directory, devices, **settings):
+    """
+    Write a configuration with `devices` dummy devices to `directory` and load it.
+    """
+    config = {
+        'history_length': 1000,
+        'update_interval': 1,
+        'config_reload_interval': 0,
+        'devices': [{'name': name, 'dev_type': 'Dummy', 'fluctuation': 1} for name in device_names(devices)],
+        'programs': [],
+    }
+    config.update(settings)
+
+    path = os.path.join(directory, "config.yml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return Config(path)
+
+
+def make_app_core(config, latency=0.0):
+    app_core = TemperatureAppCore(config, logger)
+    if latency and not app_core.worker_pool:
+        # same dict as the program manager's, only the values are replaced
+        for name in list(app_core.dev_instances):
+            app_core.dev_instances[name] = EmulatedDevice(name, logger, latency)
+    return app_core
+
+
+class AppServer:
+    """
+    App core behind a websocket server on an ephemeral port of localhost, like `run_ws_server`.
+    """
+
+    def __init__(self, app_core):
+        self.app_core = app_core
+        self.ws_server = WebSocketServer("127.0.0.1", 0, logger)
+        self.server = None
+
+        async def subscribe_event_handler(event, handler):
+            app_core.subscribe_to(event['subscribe_to'], event['_client_ws'], self.ws_server.broadcast,
+                                  self.ws_server)
+
+        async def disconnected_event_handler(event, handler):
+            app_core.unsubscribe_to_all(event['_client_ws'])
+
+        self.ws_server.register_event_handler("subscribe", subscribe_event_handler)
+        self.ws_server.register_event_handler("disconnected", disconnected_event_handler)
+        for name, handler in app_core.get_event_handlers().items():
+            self.ws_server.register_event_handler(name, handler)
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    async def __aenter__(self):
+        self.server = await websockets.serve(self.ws_server.handler, "127.0.0.1", 0, max_size=None)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def set_encoding(websocket, encoding):
+    if encoding != 'json':
+        await websocket.send(json.dumps({'event': 'set_encoding', 'encoding': 'binary',
+                                         'compress': encoding == 'binary+zlib'}))
+        await websocket.recv()
+
+
+def decode(message):
+    return json.loads(message) if isinstance(message, str) else decode_message(message)
+
+
+async def _status_clients(url, clients, duration, encoding, ready):
+    latencies = []
+
+    async def client():
+        async with websockets.connect(url, max_size=None) as websocket:
+            await set_encoding(websocket, encoding)
+            await websocket.send(json.dumps({'event': 'subscribe', 'subscribe_to': 'status_available'}))
+            ready.release()
+
+            end = time.time() + duration
+            while time.time() < end:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), end - time.time())
+                except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                    break
+                received = time.time()
+                message = decode(message)
+                if message.get('event') != 'status_available':
+                    continue
+                acquired = [dev['time'] for dev in message['status'].values() if dev.get('time')]
+                if acquired:
+                    latencies.append(received - max(acquired))
+
+    await asyncio.gather(*[client() for _ in range(clients)])
+    return latencies
+
+
+def _status_client_process(url, clients, duration, encoding, ready, results):
+    latencies = asyncio.run(_status_clients(url, clients, duration, encoding, ready))
+    results.put(latencies)
+
+
+class StatusClients:
+    """
+    `clients` websocket clients subscribed to `status_available`, spread over `processes`
+    processes so that receiving doesn't compete with the server for its event loop. Each records
+    the delay between the acquisition of the newest reading of a status and its arrival.
+    """
+
+    def __init__(self, url, clients, processes, duration, encoding='json'):
+        context = multiprocessing.get_context("spawn")
+        self.clients = clients
+        self.ready = context.Semaphore(0)
+        self.results = context.Queue()
+        processes = max(min(processes, clients), 1)
+        self.processes = [
+            context.Process(target=_status_client_process, daemon=True,
+                            args=(url, clients // processes + (i < clients % processes), duration, encoding,
+                                  self.ready, self.results))
+            for i in range(processes)
+        ]
+
+    async def start(self):
+        for process in self.processes:
+            process.start()
+        loop = asyncio.get_running_loop()
+        for _ in range(self.clients):
+            await loop.run_in_executor(None, self.ready.acquire)
+
+    async def latencies(self):
+        loop = asyncio.get_running_loop()
+        latencies = []
+        for _ in self.processes:
+            latencies += await loop.run_in_executor(None, self.results.get)
+        for process in self.processes:
+            process.join()
+        return latencies
+
+
+def temporary_directory():
+    return tempfile.TemporaryDirectory(prefix="temperature_benchmark_")
@@ -30,9 +30,12 @@ setuptools.setup(
     description='Access and monitor your favorite temperature controllers from your browser.',
     long_description='A web dashboard for monitoring and controlling temperature controllers.',
     long_description_content_type="text/markdown",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*']),
     python_requires='>=3.7',
     install_requires=['pyyaml', 'requests', 'pyserial', 'websockets'],
+    extras_require={
+        'export': ['pyarrow'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,139 @@
+"""
+Framing of the Unix socket API.
+
+Every frame is `length (uint32) | request id (uint32) | type (uint8) | payload`, little endian,
+with `length` counting the bytes after itself. Requests carry an id chosen by the client, which
+the reply repeats, so any number of requests can be in flight on one connection; id 0 is used
+for the events the client subscribed to.
+
+Payload types:
+    FRAME_JSON: a JSON object, like the messages of the websocket API.
+    FRAME_STATUS: device statuses (the answer to `request_status` and the `status_available`
+        event), as a uint16 count followed, for every device, by its name (uint16 length + UTF-8),
+        time, temperature, setpoint, settle ETA (float64 each, NaN if unknown), control enabled
+        and ok (uint8 each), then the current program, current action and error message (uint16
+        length + UTF-8 each).
+"""
+import json
+import math
+import struct
+
+FRAME_JSON = 0
+FRAME_STATUS = 1
+
+HEADER = struct.Struct("<IIB")
+MAX_FRAME = 16 * 1024 * 1024
+
+COUNT = struct.Struct("<H")
+DEVICE = struct.Struct("<ddddBB")
+
+STATUS_KEYS = {'status', 'result', 'event'}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def _float(value):
+    return math.nan if value is None else float(value)
+
+
+def _unfloat(value):
+    return None if math.isnan(value) else value
+
+
+def _pack_str(parts, text):
+    data = (text or "").encode("utf-8")[:0xFFFF]
+    parts.append(COUNT.pack(len(data)))
+    parts.append(data)
+
+
+def encode_status(status):
+    parts = [COUNT.pack(len(status))]
+    for name, dev_status in status.items():
+        ok = dev_status.get('status') == 'ok'
+        _pack_str(parts, name)
+        parts.append(DEVICE.pack(_float(dev_status.get('time')), _float(dev_status.get('temperature')),
+                                 _float(dev_status.get('setpoint')), _float(dev_status.get('settle_eta')),
+                                 bool(dev_status.get('control_enabled')), ok))
+        _pack_str(parts, dev_status.get('current_program'))
+        _pack_str(parts, dev_status.get('current_action'))
+        _pack_str(parts, None if ok else str(dev_status.get('error_msg', '')))
+    return b"".join(parts)
+
+
+def decode_status(payload):
+    view = memoryview(payload)
+    offset = 0
+
+    def unpack_str():
+        nonlocal offset
+        length = COUNT.unpack_from(view, offset)[0]
+        offset += COUNT.size
+        text = bytes(view[offset:offset + length]).decode("utf-8", "replace")
+        offset += length
+        return text
+
+    count = COUNT.unpack_from(view, 0)[0]
+    offset = COUNT.size
+    status = {}
+    for _ in range(count):
+        name = unpack_str()
+        acquired, temperature, setpoint, settle_eta, control_enabled, ok = DEVICE.unpack_from(view, offset)
+        offset += DEVICE.size
+        current_program, current_action, error_msg = unpack_str(), unpack_str(), unpack_str()
+
+        if ok:
+            status[name] = {
+                'name': name,
+                'temperature': _unfloat(temperature),
+                'time': _unfloat(acquired),
+                'control_enabled': bool(control_enabled),
+                'current_program': current_program,
+                'current_action': current_action,
+                'setpoint': _unfloat(setpoint),
+                'settle_eta': _unfloat(settle_eta),
+                'status': 'ok'
+            }
+        else:
+            status[name] = {'status': 'error', 'error_msg': error_msg}
+
+    return status
+
+
+def is_status_message(message):
+    return set(message) <= STATUS_KEYS and isinstance(message.get('status'), dict) \
+        and message.get('result', 'ok') == 'ok'
+
+
+def encode_frame(request_id, message):
+    """
+    Encode a message, with the binary status encoding if it only carries a status.
+    """
+    if is_status_message(message):
+        frame_type, payload = FRAME_STATUS, encode_status(message['status'])
+    else:
+        frame_type, payload = FRAME_JSON, json.dumps(message, separators=(',', ':')).encode("utf-8")
+
+    return HEADER.pack(HEADER.size - 4 + len(payload), request_id, frame_type) + payload
+
+
+def decode_payload(frame_type, payload):
+    if frame_type == FRAME_JSON:
+        return json.loads(payload)
+    if frame_type == FRAME_STATUS:
+        return {'result': 'ok', 'status': decode_status(payload)}
+    raise ProtocolError(f"unknown frame type {frame_type}")
+
+
+async def read_frame(reader):
+    """
+    Read one frame from an asyncio stream; returns (request id, message).
+    """
+    header = await reader.readexactly(HEADER.size)
+    length, request_id, frame_type = HEADER.unpack(header)
+    if not HEADER.size - 4 <= length <= MAX_FRAME:
+        raise ProtocolError(f"invalid frame length {length}")
+
+    payload = await reader.readexactly(length - (HEADER.size - 4))
+    return request_id, decode_payload(frame_type, payload)
@@ -0,0 +1,107 @@
+"""
+Reader of the status board, a file the app keeps the latest status of every device in (see
+`status_board_path` in the README). Only needs the standard library.
+
+Layout (little endian):
+    header, 64 bytes: magic b"TEMPBRD1", slot count (uint16), slot size (uint16), name size (uint16),
+        2 bytes padding, directory sequence counter (uint64), 40 bytes padding
+    directory: one device name per slot, `name size` bytes each, UTF-8, NUL padded
+    slots: one per device, `slot size` bytes each: sequence counter (uint64), acquisition time
+        (float64, Unix time), temperature (float64, NaN if unknown), setpoint (float64, NaN if
+        unknown), control enabled (uint8), error (uint8), 6 bytes padding, error message (88 bytes)
+
+The directory and every slot are guarded by a sequence lock: the counter is odd while the app is
+writing, so a reader retries until it reads the same even value before and after the data. A
+reader gives up with `SlotBusyError` if the counter stays odd, e.g. because the app died halfway
+through a write; check `replaced()` and open the board again if it was.
+"""
+import os
+import mmap
+import struct
+
+from temperature_web_control.server.status_table import SlotArray, SLOT_SIZE, SlotBusyError, seqlock_read
+
+MAGIC = b"TEMPBRD1"
+HEADER = struct.Struct("<8sHHH2xQ40x")
+NAME_SIZE = 64
+GENERATION_OFFSET = 16
+
+
+def board_size(slots):
+    return HEADER.size + slots * (NAME_SIZE + SLOT_SIZE)
+
+
+class StatusBoardReader:
+    """
+    Maps the status board file and reads readings out of it, without any request to the app.
+
+        board = StatusBoardReader("/dev/shm/temperature_board")
+        reading = board.read("SodiumCup(T1)")
+        reading.temperature, reading.time, reading.error
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, slots, slot_size, name_size, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or slot_size != SLOT_SIZE or name_size != NAME_SIZE:
+            self.close()
+            raise ValueError(f"{path} is not a status board of a compatible version.")
+
+        self.slots = SlotArray(self.map, slots, HEADER.size + slots * NAME_SIZE)
+        self._generation = None
+        self._index = {}
+
+    def _generation_now(self):
+        return struct.unpack_from("<Q", self.map, GENERATION_OFFSET)[0]
+
+    def _read_directory(self):
+        index = {}
+        for slot in range(self.slots.slots):
+            offset = HEADER.size + slot * NAME_SIZE
+            name = self.map[offset:offset + NAME_SIZE].rstrip(b"\0")
+            if name:
+                index[name.decode("utf-8", "replace")] = slot
+        return index
+
+    def _load_directory(self):
+        self._generation, self._index = seqlock_read(self.map, GENERATION_OFFSET, self._read_directory,
+                                                     abort=self.replaced)
+
+    def devices(self):
+        if self._generation_now() != self._generation:
+            self._load_directory()
+        return list(self._index)
+
+    def read(self, name):
+        """
+        The latest reading of device `name` (a `Reading`), or None if the board has none.
+
+        :raise SlotBusyError: if the app stopped halfway through writing it, or replaced the board
+            while we were waiting.
+        """
+        if self._generation_now() != self._generation:
+            self._load_directory()
+
+        slot = self._index.get(name)
+        return None if slot is None else self.slots.read(slot, abort=self.replaced)
+
+    def read_all(self):
+        return {name: self.read(name) for name in self.devices()}
+
+    def replaced(self):
+        """
+        Whether the app has started over with a new board file, in which case open it again.
+        """
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def close(self):
+        self.slots = None
+        self.map.close()
+        self._file.close()
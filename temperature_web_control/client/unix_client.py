@@ -0,0 +1,76 @@
+import asyncio
+import itertools
+
+from temperature_web_control.client.protocol import encode_frame, read_frame, ProtocolError
+
+PUSH_ID = 0
+
+
+class UnixSocketClient:
+    """
+    Client of the Unix socket API, for scripts running on the same machine as the app:
+
+        client = await UnixSocketClient.connect("/run/temperature_app.sock")
+        status = (await client.request('request_status'))['status']
+        await client.request('standby_device', device="SodiumCup(T1)")
+
+    Requests can be sent concurrently (e.g. with `asyncio.gather`) and are answered as soon as
+    each is done. Events subscribed to with `subscribe` are passed to their callback.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = {}
+        self.event_callbacks = {}
+        self._request_ids = itertools.count()
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    @staticmethod
+    async def connect(path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        return UnixSocketClient(reader, writer)
+
+    async def _receive(self):
+        error = ConnectionError("Connection closed.")
+        try:
+            while True:
+                request_id, message = await read_frame(self.reader)
+                if request_id == PUSH_ID:
+                    # only the status is sent without its event name
+                    event = message.get('event', 'status_available')
+                    if event in self.event_callbacks:
+                        self.event_callbacks[event](message)
+                elif request_id in self.pending:
+                    future = self.pending.pop(request_id)
+                    if not future.done():
+                        future.set_result(message)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as e:
+            error = ConnectionError(str(e) or "Connection closed.")
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def request(self, event, **kwargs):
+        """
+        Send `event` with the arguments of its websocket message, and return the reply.
+        """
+        if self._receiver.done():
+            raise ConnectionError("Connection closed.")
+
+        request_id = next(self._request_ids) % 0xFFFFFFFF + 1  # never PUSH_ID
+        future = asyncio.get_event_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(encode_frame(request_id, dict(kwargs, event=event)))
+        await self.writer.drain()
+        return await future
+
+    async def subscribe(self, event, callback):
+        self.event_callbacks[event] = callback
+        return await self.request('subscribe', subscribe_to=event)
+
+    async def close(self):
+        self.writer.close()
+        await asyncio.gather(self._receiver, return_exceptions=True)
@@ -1,15 +1,22 @@
-import os
+import time
 
-from temperature_web_control.utils import list_all_modules
+from temperature_web_control.utils import ModuleRegistry
 
-# Automatically load available drivers
+# Drivers are imported when a device of one of their types is loaded. Third-party packages can
+# register theirs under the `temperature_web_control.drivers` entry point group, named by device type.
 
-drivers = list_all_modules("(.*)_driver", os.path.dirname(os.path.abspath(__file__)))
-driver_loaders = {}
+drivers = ModuleRegistry(
+    __name__, r"(.*)_driver$",
+    builtin={
+        'Dummy': 'dummy_driver',
+        'Omega iSeries Ethernet': 'omega_driver',
+        'Omega iSeries Serial': 'omega_driver'
+    },
+    group="temperature_web_control.drivers",
+    names_of=lambda driver: driver.dev_types())
+
+init_times = {}  # device name -> seconds it took to instantiate
 
-for driver in drivers.values():
-    for t in driver.dev_types():
-        driver_loaders[t] = driver.from_config_dict
 
 def load_driver(config_dict: dict, logger):
     """
@@ -17,5 +24,9 @@ def load_driver(config_dict: dict, logger):
     :param: config_dict:
     :return: device instance described by config_dict.
     """
-    if config_dict['dev_type'] in driver_loaders:
-        return driver_loaders[config_dict['dev_type']](config_dict, logger)
\ No newline at end of file
+    driver = drivers.get(config_dict['dev_type'])
+    if driver is not None:
+        start = time.perf_counter()
+        dev = driver.from_config_dict(config_dict, logger)
+        init_times[config_dict['name']] = time.perf_counter() - start
+        return dev
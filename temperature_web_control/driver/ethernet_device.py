@@ -14,6 +14,10 @@ class EthernetDevice(IODevice):
         self.interval = interval
         self.last_send = 0
 
+    @property
+    def bus_id(self):
+        return f"tcp:{self.addr}:{self.port}"
+
     def send(self, data: bytes):
         if time.time() - self.last_send < self.interval:
             time.sleep(self.interval - (time.time() - self.last_send))
@@ -14,6 +14,10 @@ class IODevice(ABC):
     def recv(self, max_len=-1) -> bytes:
         pass
 
+    @property
+    def bus_id(self):
+        return id(self)
+
     def query(self, query: bytes, max_len=-1) -> bytes:
         with self.query_lock:
             self.send(query)
@@ -8,6 +8,12 @@ from temperature_web_control.model.temperature_monitor import TemperatureMonitor
 
 retry = 5
 
+# Ramp & soak of setpoint 1, see the command index table in section 5 of manual M3397
+RAMP_TIME_INDEX = "1D"  # ramp time as hours * 100 + minutes, at most 99:59
+MAX_RAMP_MINUTES = 99 * 60 + 59
+OUTPUT_CONFIG_RAMP = 1 << 6  # ramp enable bit of the output configuration
+OUTPUT_CONFIG_SOAK = 1 << 7  # soak enable bit of the output configuration
+
 class OmegaNetworkError(Exception):
     def __init__(self, error):
         super().__init__(f"Error occurred when communicating with controller: {error}")
@@ -65,10 +71,11 @@ class OmegaISeries(TemperatureMonitor):
     See https://assets.omega.com/manuals/M3397.pdf
     """
 
-    def __init__(self, name, io_dev: IODevice, output, logger):
+    def __init__(self, name, io_dev: IODevice, output, logger, native_ramp=False):
         super().__init__(name)
         self.logger = logger
         self.io_dev = io_dev
+        self.native_ramp = native_ramp
         self.echo_enabled = self._check_echo_enable()
         self.unit = self._check_unit()
         self.run = False
@@ -82,14 +89,14 @@ class OmegaISeries(TemperatureMonitor):
         self.io_dev.reset(wait)
 
     @staticmethod
-    def get_ethernet_instance(logger, name, addr, port, output=1, interval=1):
+    def get_ethernet_instance(logger, name, addr, port, output=1, interval=1, native_ramp=False):
         io_dev = EthernetDevice(addr, port, b'\r', interval)
-        return OmegaISeries(name, io_dev, output, logger)
+        return OmegaISeries(name, io_dev, output, logger, native_ramp)
 
     @staticmethod
-    def get_serial_instance(logger, name, port, baudrate=9600, output=1):
+    def get_serial_instance(logger, name, port, baudrate=9600, output=1, native_ramp=False):
         io_dev = SerialDevice(port, baudrate, b'\r')
-        return OmegaISeries(name, io_dev, output, logger)
+        return OmegaISeries(name, io_dev, output, logger, native_ramp)
 
     def other_options(self) -> List[Option]:
         return [
@@ -99,6 +106,10 @@ class OmegaISeries(TemperatureMonitor):
             Option("d_param", "d parameter of PID control.", int),
         ]
 
+    @property
+    def bus(self):
+        return self.io_dev.bus_id
+
     @property
     def controllable(self):
         return True
@@ -165,6 +176,41 @@ class OmegaISeries(TemperatureMonitor):
         cmd = f"*W01{sign_mask | factor_mask | setpoint_data:06X}"
         self.send(cmd)
 
+    @property
+    def supports_native_ramp(self):
+        return self.native_ramp
+
+    @property
+    def max_native_ramp_minutes(self):
+        return MAX_RAMP_MINUTES
+
+    def upload_ramp(self, target, duration):
+        # checked before any I/O: a bad argument is not a communication error worth a reset
+        if int(duration) > MAX_RAMP_MINUTES:
+            raise ValueError(f"Ramp of {duration} minutes is longer than the controller supports.")
+
+        self._upload_ramp(target, duration)
+
+    @retry_wrap
+    def _upload_ramp(self, target, duration):
+        hours, minutes = divmod(int(duration), 60)
+        self.send(f"*W{RAMP_TIME_INDEX}{hours * 100 + minutes:04X}")
+
+        out_cfg = self._query_output_config()
+        self._write_output_config((out_cfg | OUTPUT_CONFIG_RAMP) & ~OUTPUT_CONFIG_SOAK)
+
+        # the controller starts ramping from the current temperature when setpoint 1 changes
+        self.setpoint = target
+
+    @retry_wrap
+    def cancel_ramp(self, hold=True):
+        if hold:
+            self.setpoint = self.temperature
+
+        out_cfg = self._query_output_config()
+        if out_cfg & OUTPUT_CONFIG_RAMP:
+            self._write_output_config(out_cfg & ~OUTPUT_CONFIG_RAMP)
+
     @retry_wrap
     def _query_output_config(self):
         cmd_index = "R"
@@ -307,7 +353,8 @@ def from_config_dict(config_dict: dict, logger):
             config_dict['addr'],
             config_dict['port'] if 'port' in config_dict else 2000,
             config_dict['output'] if 'output' in config_dict else 1,
-            config_dict['request_interval'] if 'request_interval' in config_dict else 0
+            config_dict['request_interval'] if 'request_interval' in config_dict else 0,
+            config_dict.get('native_ramp', False)
         )
     elif config_dict['dev_type'] == 'Omega iSeries Serial':
         return OmegaISeries.get_serial_instance(
@@ -315,5 +362,6 @@ def from_config_dict(config_dict: dict, logger):
             config_dict['name'],
             config_dict['port'],
             config_dict['baudrate'] if 'baudrate' in config_dict else 9600,
-            config_dict['output'] if 'output' in config_dict else 1
+            config_dict['output'] if 'output' in config_dict else 1,
+            config_dict.get('native_ramp', False)
         )
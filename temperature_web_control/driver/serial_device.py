@@ -16,6 +16,10 @@ class SerialDevice(IODevice):
         self.last_send = 0
         self.interval = interval
 
+    @property
+    def bus_id(self):
+        return f"serial:{self.port}"
+
     def send(self, data: bytes):
         if time.time() - self.last_send < self.interval:
             time.sleep(self.interval - (time.time() - self.last_send))
@@ -1,21 +1,26 @@
 import asyncio
 import logging
 import argparse
+import time
+import signal
 import threading
 
-from temperature_web_control.server.app_core import TemperatureAppCore
+from temperature_web_control.server.app_core import EventBus, TemperatureAppCore
 from temperature_web_control.server.ws_server import WebSocketServer
 from temperature_web_control.server.http_server import serve_http
+from temperature_web_control.server.export import export_handler
+from temperature_web_control.server.unix_server import UnixSocketServer
 from temperature_web_control.utils import Config
-from temperature_web_control.plugin import plugins
+from temperature_web_control.driver import drivers, init_times as device_init_times
+from temperature_web_control.plugin import plugins, load_plugins
 
 config: Config = None
-app_core: TemperatureAppCore = None
+app_core: EventBus = None
 logger = None
 
 async def run_ws_server():
     global app_core
-    assert isinstance(app_core, TemperatureAppCore)
+    assert isinstance(app_core, EventBus)
 
     ws_server = WebSocketServer(
         config.get("bind_addr", default="0.0.0.0"),
@@ -61,7 +66,91 @@ def run_http_server():
     serve_http(
         config.get("bind_addr", default="0.0.0.0"),
         int(config.get("http_port", default=8000)),
-        directory, { '/websocket' : get_websocket }, logger)
+        directory, {
+            '/websocket': get_websocket,
+            '/export': export_handler(lambda: app_core.history)
+        }, logger)
+
+
+async def run_simulation(args):
+    global config, logger
+    import json
+    from temperature_web_control.model.program import Program, ProgramCompileError
+    from temperature_web_control.server.simulator import simulate_program
+
+    programs = {program['name']: program for program in config.get('programs', default=[])}
+    if args.program not in programs:
+        logger.error(f"Unknown program {args.program}.")
+        return
+
+    program = Program.from_dict(programs[args.program])
+    device_names = [dev['name'] for dev in config.get('devices', default=[])]
+    initial_temperatures = {}
+    if args.initial_temperature is not None:
+        initial_temperatures = {name: args.initial_temperature for name in device_names}
+
+    try:
+        program.compile(device_names)
+        result = await asyncio.get_event_loop().run_in_executor(
+            None, simulate_program, config, program, initial_temperatures)
+    except ProgramCompileError as e:
+        logger.error(str(e))
+        return
+
+    for step in result['steps']:
+        logger.info(f"Step {step['step']}: {step['start'] / 60:.1f} - {step['end'] / 60:.1f} min")
+    for error in result['errors']:
+        logger.error(error)
+    logger.info(f"Program {program.name} {'finished' if result['completed'] else 'failed'} after "
+                f"{result['duration'] / 60:.1f} min (estimated {result['estimated_duration'] / 60:.1f} min).")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+
+
+async def run_relay(hub, serve_http=True):
+    global config, app_core, logger
+
+    if hub:
+        from temperature_web_control.server.hub import FederationHub
+        app_core = FederationHub.create_from_config(config, logger)
+    else:
+        from temperature_web_control.server.replica import ReplicaCore
+        app_core = ReplicaCore.create_from_config(config, logger)
+    app_core.start()
+
+    if serve_http:
+        threading.Thread(target=run_http_server, daemon=True).start()
+
+    await run_ws_server()
+
+
+async def initialize_plugins(init_times):
+    global config, app_core, logger
+
+    plugin_states = []
+    for name, plugin in load_plugins(config).items():
+        start = time.perf_counter()
+        plugin_state = await plugin.initialize(config, app_core, logger)
+        init_times[name] = time.perf_counter() - start
+        if plugin_state:
+            plugin_states.append(plugin_state)
+
+    return plugin_states
+
+
+def report_startup_profile(plugin_init_times, total):
+    global logger
+
+    logger.info("Startup profile:")
+    for module_name, seconds in list(drivers.import_times.items()) + list(plugins.import_times.items()):
+        logger.info(f"  import {module_name}: {seconds * 1000:.1f} ms")
+    for name, seconds in device_init_times.items():
+        logger.info(f"  device {name}: {seconds * 1000:.1f} ms")
+    for name, seconds in plugin_init_times.items():
+        logger.info(f"  plugin {name}: {seconds * 1000:.1f} ms")
+    logger.info(f"  total: {total * 1000:.1f} ms")
 
 
 async def run(serve_http=True):
@@ -73,6 +162,18 @@ async def run(serve_http=True):
                         help="path to the config yaml file")
     parser.add_argument("-v", "--verbose", dest="verbose", action='store_true',
                         help="turn on the verbose logging mode")
+    parser.add_argument("--hub", dest="hub", action='store_true',
+                        help="run as a hub merging the instances listed under `instances` in the config")
+    parser.add_argument("--profile-startup", dest="profile_startup", action='store_true',
+                        help="report how long importing and initializing each driver, device and plugin took")
+
+    subparsers = parser.add_subparsers(dest="command")
+    simulate_parser = subparsers.add_parser("simulate", help="dry-run a program on simulated devices")
+    simulate_parser.add_argument("program", type=str, help="name of the program in the config file")
+    simulate_parser.add_argument("-t", "--initial-temperature", dest="initial_temperature", type=float,
+                                 default=None, help="start temperature of all devices, in °C")
+    simulate_parser.add_argument("-o", "--output", dest="output", type=str, default=None,
+                                 help="write the full simulation result as JSON to this file")
     args = parser.parse_args()
 
     logger = logging.getLogger("temperature_app")
@@ -93,13 +194,19 @@ async def run(serve_http=True):
 
     config = Config(args.config)
 
+    if args.command == "simulate":
+        await run_simulation(args)
+        return
+
+    if args.hub or config.get('replica_of', default=None):
+        await run_relay(args.hub, serve_http)
+        return
+
+    startup_time = time.perf_counter()
     app_core = TemperatureAppCore(config, logger)
 
-    plugin_coroutine = []
-    for plugin in plugins.values():
-        plugin_run = plugin.initialize(config, app_core, logger)
-        if plugin_run:
-            plugin_coroutine.append(plugin_run)
+    plugin_init_times = {}
+    plugin_coroutine = [plugin_state.run() for plugin_state in await initialize_plugins(plugin_init_times)]
 
     if serve_http:
         http_thread = threading.Thread(target=run_http_server, daemon=True)
@@ -107,14 +214,34 @@ async def run(serve_http=True):
 
     try:
         coroutines = [run_ws_server()] + plugin_coroutine
+
+        unix_server = UnixSocketServer.create_from_config(config, app_core, logger)
+        if unix_server:
+            coroutines.append(unix_server.serve_until_exit())
         for coro in coroutines:
             asyncio.create_task(coro)
 
         app_core.start_monitoring()
+        asyncio.create_task(app_core.recover_programs())
+
+        reload_interval = config.get('config_reload_interval', default=2)  # in seconds
+        if reload_interval:
+            asyncio.create_task(config.watch(app_core.apply_config_diff, app_core.on_config_error, reload_interval))
+        if hasattr(signal, 'SIGHUP'):
+            asyncio.get_event_loop().add_signal_handler(
+                signal.SIGHUP, lambda: asyncio.create_task(app_core.reload_config()))
+
+        if args.profile_startup:
+            report_startup_profile(plugin_init_times, time.perf_counter() - startup_time)
 
         await asyncio.Future()  # block forever
     except KeyboardInterrupt:
         pass
+    finally:
+        try:
+            await config.flush()  # programs edited within the last `write_delay`
+        except OSError:
+            pass  # logged by the config
 
 def main():
     try:
@@ -0,0 +1,179 @@
+import math
+from collections import deque
+
+
+class SlopeEstimator:
+    """
+    Least-squares slope of (time, temperature) samples in a sliding time window.
+
+    The regression sums are updated as samples enter and leave the window, so each sample costs
+    O(1) regardless of the window length. Times are stored relative to a reference point which is
+    moved forward once in a while to keep the sums well-conditioned.
+    """
+
+    REBASE_AFTER = 3600  # seconds
+
+    def __init__(self, window, min_samples=3):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples = deque()
+
+        self.t0 = None
+        self.sum_t = 0.0
+        self.sum_y = 0.0
+        self.sum_tt = 0.0
+        self.sum_ty = 0.0
+        self.sum_yy = 0.0
+
+    def __len__(self):
+        return len(self.samples)
+
+    @property
+    def last_time(self):
+        return self.samples[-1][0] if self.samples else None
+
+    @property
+    def last_value(self):
+        return self.samples[-1][1] if self.samples else None
+
+    def _accumulate(self, t, y, sign):
+        x = t - self.t0
+        self.sum_t += sign * x
+        self.sum_y += sign * y
+        self.sum_tt += sign * x * x
+        self.sum_ty += sign * x * y
+        self.sum_yy += sign * y * y
+
+    def _rebase(self):
+        self.t0 = self.samples[0][0] if self.samples else None
+        self.sum_t = self.sum_y = self.sum_tt = self.sum_ty = self.sum_yy = 0.0
+        for t, y in self.samples:
+            self._accumulate(t, y, 1)
+
+    def add(self, t, y):
+        if self.samples and t <= self.samples[-1][0]:
+            return  # repeated or out-of-order sample
+
+        if self.t0 is None:
+            self.t0 = t
+
+        self.samples.append((t, y))
+        self._accumulate(t, y, 1)
+
+        while self.samples[0][0] < t - self.window:
+            old_t, old_y = self.samples.popleft()
+            self._accumulate(old_t, old_y, -1)
+
+        if t - self.t0 > self.REBASE_AFTER:
+            self._rebase()
+
+    def clear(self):
+        self.samples.clear()
+        self._rebase()
+
+    @property
+    def slope(self):
+        """
+        Slope in degrees per second, or None if there are not enough samples yet.
+        """
+        n = len(self.samples)
+        if n < self.min_samples:
+            return None
+
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+
+        return (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+    @property
+    def rate(self):
+        """
+        Slope in degrees per minute, or None if there are not enough samples yet.
+        """
+        slope = self.slope
+        return slope * 60 if slope is not None else None
+
+    @property
+    def residual_std(self):
+        """
+        Standard deviation of the samples around the fitted line, or None if there are not enough
+        samples yet.
+        """
+        slope = self.slope
+        if slope is None:
+            return None
+
+        n = len(self.samples)
+        var_y = self.sum_yy / n - (self.sum_y / n) ** 2
+        var_t = self.sum_tt / n - (self.sum_t / n) ** 2
+        return math.sqrt(max(var_y - slope * slope * var_t, 0.0))
+
+
+class SettleDetector(SlopeEstimator):
+    """
+    Decides when a temperature has settled at `target`: for at least `window` seconds every
+    reading was within `tolerance` of the target, and over that window the fitted slope is below
+    `max_rate` (degrees/min) and the scatter around the fit below `max_std`. Requiring the slope to
+    be flat keeps an overshoot that is just passing through the band from counting as settled.
+
+    Samples taken before `start_time` (when the setpoint was changed) are ignored.
+    """
+
+    def __init__(self, target, tolerance, window, max_rate, max_std, start_time, min_samples=3):
+        super().__init__(window, min_samples)
+        self.target = target
+        self.tolerance = tolerance
+        self.max_rate = max_rate
+        self.max_std = max_std
+        self.start_time = start_time
+        self.last_out_of_band = start_time
+
+    @staticmethod
+    def create_from_config(config, target, start_time):
+        tolerance = config.get('temperature_tolerance', default=1)  # in degrees
+        window = config.get('settle_window', default=1)  # in minutes
+        return SettleDetector(
+            target, tolerance, window * 60,
+            config.get('settle_max_rate', default=tolerance / window),
+            config.get('settle_max_std', default=tolerance),
+            start_time
+        )
+
+    def add(self, t, y):
+        if t <= self.start_time:
+            return
+
+        super().add(t, y)
+        if abs(y - self.target) > self.tolerance:
+            self.last_out_of_band = max(self.last_out_of_band, t)
+
+    @property
+    def settled(self):
+        if not self.samples or self.last_time - self.last_out_of_band < self.window:
+            return False
+
+        rate = self.rate
+        std = self.residual_std
+        return rate is not None and abs(rate) <= self.max_rate and std <= self.max_std
+
+    @property
+    def eta(self):
+        """
+        Predicted seconds until the temperature counts as settled, or None if it isn't heading
+        towards the target.
+        """
+        if not self.samples:
+            return None
+        if self.settled:
+            return 0.0
+
+        distance = self.last_value - self.target
+        if abs(distance) <= self.tolerance:
+            return max(self.last_out_of_band + self.window - self.last_time, 0.0)
+
+        slope = self.slope
+        if not slope or slope * distance >= 0:
+            return None
+
+        return (abs(distance) - self.tolerance) / abs(slope) + self.window
@@ -1,4 +1,5 @@
 from collections import namedtuple
+from types import MappingProxyType
 from typing import List
 
 ActionDefinition = namedtuple("Action", ["name", "display_name", "status_word", "description", "params_desc",
@@ -68,14 +69,89 @@ actions = {
     ),
 }
 
+# Parameter types of each action, used to validate and convert the parameters when compiling programs
+action_param_types = {
+    "CHANGE": {"SETPOINT": float},
+    "LINEAR_RAMP": {"TARGET_TEMP": float, "RATE": float},
+    "SOAK": {"TIME": float},
+    "STANDBY": {},
+    "LOOP": {"GOTO": int, "TIMES": int},
+}
+
 Action = namedtuple("Action", ["name", "device", "params"])
 
+PlanStep = namedtuple("PlanStep", ["index", "actions", "loop"])
+LoopJump = namedtuple("LoopJump", ["goto", "times", "counter"])
+
+
+class ProgramCompileError(Exception):
+    def __init__(self, program_name, error, step=None):
+        where = f" (step {step})" if step is not None else ""
+        super().__init__(f"Error in program {program_name}{where}: {error}")
+
+
+class ProgramPlan(namedtuple("ProgramPlan", ["name", "steps", "devices", "loop_count"])):
+    """
+    Validated, immutable execution plan of a program.
+
+    `steps` is a tuple of `PlanStep`, whose actions carry typed parameters, and whose `loop` is a
+    `LoopJump` if the step contains a LOOP action. Every LOOP owns one slot in a list of
+    `loop_count` counters.
+    """
+    __slots__ = ()
+
+    MAX_ESTIMATED_STEPS = 1000000
+
+    def estimate_duration(self, initial_temperatures=None):
+        """
+        Estimate the run time of the program in seconds, assuming ramps start from
+        `initial_temperatures` (or from the end of the previous ramp/change on that device) and
+        that CHANGE settles immediately. Ramps with an unknown start temperature count as zero, so
+        the estimate is a lower bound.
+        """
+        temperatures = dict(initial_temperatures) if initial_temperatures else {}
+        loop_counters = [0] * self.loop_count
+        duration = 0.0
+        pointer = 0
+        executed_steps = 0
+
+        while pointer < len(self.steps) and executed_steps < self.MAX_ESTIMATED_STEPS:
+            step = self.steps[pointer]
+            step_duration = 0.0
+            executed_steps += 1
+
+            for action in step.actions:
+                if action.name == "SOAK":
+                    step_duration = max(step_duration, action.params["TIME"] * 60)
+                elif action.name == "LINEAR_RAMP":
+                    start = temperatures.get(action.device)
+                    if start is not None:
+                        ramp_time = abs(action.params["TARGET_TEMP"] - start) / abs(action.params["RATE"]) * 60
+                        step_duration = max(step_duration, ramp_time)
+                    temperatures[action.device] = action.params["TARGET_TEMP"]
+                elif action.name == "CHANGE":
+                    temperatures[action.device] = action.params["SETPOINT"]
+
+            duration += step_duration
+
+            if step.loop:
+                loop_counters[step.loop.counter] += 1
+                if loop_counters[step.loop.counter] < step.loop.times:
+                    pointer = step.loop.goto
+                    continue
+                loop_counters[step.loop.counter] = 0
+
+            pointer += 1
+
+        return duration
+
 class Program:
     def __init__(self, name: str, description: str, steps: List[List[Action]]):
         self.name = name
         self.description = description
         self.steps = steps
         self.occupied_device = []
+        self._plans = {}
 
         self._calculate_occupied_devices()
 
@@ -85,6 +161,85 @@ class Program:
                 if action.device and action.device not in self.occupied_device:
                     self.occupied_device.append(action.device)
 
+    def compile(self, device_names=None) -> ProgramPlan:
+        """
+        Validate the program and compile it into a `ProgramPlan`. Plans are cached per set of
+        available devices, so compiling the same program again is cheap.
+
+        :param device_names: names of the available devices, or None to skip the check.
+        :raise ProgramCompileError: if the program is invalid.
+        """
+        key = frozenset(device_names) if device_names is not None else None
+        if key not in self._plans:
+            self._plans[key] = self._compile(key)
+
+        return self._plans[key]
+
+    def _compile(self, device_names):
+        if len(self.steps) == 0:
+            raise ProgramCompileError(self.name, "Program is empty.")
+
+        if not self.occupied_device:
+            raise ProgramCompileError(self.name, "No device specified.")
+
+        steps = []
+        loop_count = 0
+        for index, step in enumerate(self.steps):
+            compiled_actions = []
+            step_devices = set()
+            loop = None
+
+            for action in step:
+                if action.name not in actions:
+                    raise ProgramCompileError(self.name, f"Unknown action {action.name}.", index)
+
+                if actions[action.name].need_device:
+                    if not action.device:
+                        raise ProgramCompileError(self.name, f"{action.name} needs a device.", index)
+
+                    if device_names is not None and action.device not in device_names:
+                        raise ProgramCompileError(self.name, f"Device {action.device} doesn't exist.", index)
+
+                    if action.device in step_devices:
+                        raise ProgramCompileError(
+                            self.name, "Only one action can be performed on one device at each step.", index)
+                    step_devices.add(action.device)
+
+                params = {}
+                for param, param_type in action_param_types[action.name].items():
+                    if not action.params or param not in action.params:
+                        raise ProgramCompileError(self.name, f"{action.name} is missing parameter {param}.", index)
+                    try:
+                        params[param] = param_type(action.params[param])
+                    except (TypeError, ValueError):
+                        raise ProgramCompileError(
+                            self.name, f"Invalid value {action.params[param]} of {action.name} parameter {param}.",
+                            index)
+
+                if action.name == "LINEAR_RAMP" and params["RATE"] == 0:
+                    raise ProgramCompileError(self.name, "Ramp rate can't be zero.", index)
+
+                if action.name == "SOAK" and params["TIME"] < 0:
+                    raise ProgramCompileError(self.name, "Soak time can't be negative.", index)
+
+                if action.name == "LOOP":
+                    if loop is not None:
+                        raise ProgramCompileError(self.name, "Only one LOOP can be performed at each step.", index)
+
+                    if not (0 <= params["GOTO"] < len(self.steps)):
+                        raise ProgramCompileError(self.name, "Loop target out range.", index)
+
+                    loop = LoopJump(params["GOTO"], params["TIMES"], loop_count)
+                    loop_count += 1
+
+                compiled_actions.append(
+                    Action(action.name, action.device if actions[action.name].need_device else None,
+                           MappingProxyType(params)))
+
+            steps.append(PlanStep(index, tuple(compiled_actions), loop))
+
+        return ProgramPlan(self.name, tuple(steps), tuple(self.occupied_device), loop_count)
+
     @staticmethod
     def from_dict(steps_dict: dict):
         steps = [
@@ -17,6 +17,14 @@ class TemperatureMonitor(ABC):
     def temperature(self) -> float:
         raise NotImplementedError
 
+    @property
+    def bus(self):
+        """
+        Identifies the physical link of the device. Writes to devices on the same bus are sent one
+        after another, and writes to different buses in parallel.
+        """
+        return self.name
+
     # ===== Setpoint ====
     @property
     @abstractmethod
@@ -43,6 +51,31 @@ class TemperatureMonitor(ABC):
     def setpoint(self, value):
         raise NotImplementedError
 
+    # ==== Native ramp ====
+    @property
+    def supports_native_ramp(self) -> bool:
+        # whether the controller can run a linear ramp by itself, see `upload_ramp`
+        return False
+
+    @property
+    def max_native_ramp_minutes(self):
+        # longest ramp `upload_ramp` accepts, None if there is no limit
+        return None
+
+    def upload_ramp(self, target, duration):
+        """
+        Let the controller ramp the setpoint from the current temperature to `target` in
+        `duration` minutes (a whole number).
+        """
+        raise NotImplementedError
+
+    def cancel_ramp(self, hold=True):
+        """
+        Leave the ramp mode. With `hold`, the setpoint is first set to the current temperature, so
+        that an interrupted ramp doesn't jump to its target.
+        """
+        raise NotImplementedError
+
     # ==== Other options ====
     @property
     @abstractmethod
@@ -1,7 +1,28 @@
-import os
+from temperature_web_control.utils import ModuleRegistry
 
-from temperature_web_control.utils import list_all_modules
+# A plugin is imported only if its config section is present. Third-party packages can register
+# theirs under the `temperature_web_control.plugins` entry point group, named by config section.
+# Other `*_plugin` modules in this folder are always loaded.
 
-# Automatically load available drivers
+plugins = ModuleRegistry(
+    __name__, r"(.*)_plugin$",
+    builtin={
+        'alerts': 'alert_plugin',
+        'influx_plugin': 'influx_push_plugin'
+    },
+    group="temperature_web_control.plugins")
 
-plugins = list_all_modules("(.*)_plugin", os.path.dirname(os.path.abspath(__file__)))
\ No newline at end of file
+
+def load_plugins(config):
+    """
+    :return: dict from name to the plugin modules to run with `config`.
+    """
+    loaded = {}
+    for section in list(plugins.builtin) + list(plugins.entry_points()):
+        if config.get(section, default=None) is not None:
+            loaded[section] = plugins.get(section)
+
+    for module_name in plugins.extra_modules():
+        loaded[module_name] = plugins.import_module(module_name)
+
+    return loaded
@@ -0,0 +1,248 @@
+import ast
+import re
+
+NAN = float('nan')
+
+# Device names that aren't valid identifiers, like `SodiumCup(T1)`, can be quoted with backticks
+_QUOTED_DEVICE = re.compile(r"`([^`]*)`")
+
+_DEVICE_FUNCTIONS = {'temperature': 't', 'rate': 'r', 'setpoint': 's'}
+_FUNCTIONS = {'abs': 1, 'min': None, 'max': None}
+
+_COMPARE_OPERATORS = {ast.Gt: '>', ast.GtE: '>=', ast.Lt: '<', ast.LtE: '<=', ast.Eq: '==', ast.NotEq: '!='}
+_BINARY_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*'}
+
+
+class AlertExpressionError(Exception):
+    def __init__(self, rule, error):
+        super().__init__(f"Invalid alert rule '{rule}': {error}")
+
+
+def _div(a, b):
+    return a / b if b != 0 else NAN
+
+
+# Comparisons involving NaN (a missing reading, a division by zero) are unknown, None, instead of
+# False, so that `not` doesn't turn them into True. `and`, `or` and `not` follow three-valued logic.
+
+def _and(*values):
+    result = True
+    for value in values:
+        if value is None:
+            result = None
+        elif not value:
+            return False
+    return result
+
+
+def _or(*values):
+    result = False
+    for value in values:
+        if value is None:
+            result = None
+        elif value:
+            return True
+    return result
+
+
+def _not(value):
+    return None if value is None else not value
+
+
+class CompiledRuleSet:
+    """
+    A set of alert rules compiled into one generated Python function.
+
+    The function takes the temperature, rate and setpoint vectors, indexed like `devices`, and
+    returns one boolean per rule. A rule is false whenever one of the values it reads is missing.
+    """
+
+    def __init__(self, source, function, devices, rule_devices, rate_devices, uses_setpoint):
+        self.source = source
+        self.function = function
+        self.devices = devices
+        self.rule_devices = rule_devices
+        self.rate_devices = rate_devices
+        self.uses_setpoint = uses_setpoint
+        self.results = ()
+
+    def evaluate(self, status, estimators=None):
+        temperatures = [NAN] * len(self.devices)
+        rates = [NAN] * len(self.devices)
+        setpoints = [NAN] * len(self.devices)
+
+        for i, dev in enumerate(self.devices):
+            dev_status = status.get(dev)
+            if not dev_status:
+                continue
+
+            temperature = dev_status.get('temperature')
+            if temperature is not None:
+                temperatures[i] = temperature
+
+            if self.uses_setpoint and dev_status.get('setpoint') is not None:
+                setpoints[i] = dev_status['setpoint']
+
+            if estimators and dev in self.rate_devices and dev in estimators:
+                rate = estimators[dev].rate
+                if rate is not None:
+                    rates[i] = rate
+
+        self.results = self.function(temperatures, rates, setpoints, _div)
+        return self.results
+
+
+class RuleSetCompiler:
+    """
+    Compiles alert rules like `T1 > 250 and rate(T2) < -5` into a flat list of assignments, one per
+    distinct subexpression. Subexpressions appearing in several rules are computed only once.
+
+    Supported: device names (temperature), `temperature(dev)`, `rate(dev)` (degrees/min),
+    `setpoint(dev)`, numbers, `+ - * /`, comparisons, `and`, `or`, `not`, `abs`, `min` and `max`.
+    """
+
+    def __init__(self, known_devices=None):
+        self.known_devices = known_devices
+        self.devices = []
+        self.device_index = {}
+        self.variables = {}
+        self.constants = set()
+        self.lines = []
+        self.outputs = []
+        self.rule_devices = []
+        self.rule_stateful = []
+        self.rate_devices = set()
+        self.uses_setpoint = False
+
+    def _emit(self, key, code):
+        if key not in self.variables:
+            var = f"v{len(self.variables)}"
+            self.variables[key] = var
+            self.lines.append(f"    {var} = {code}")
+        return self.variables[key]
+
+    def _device(self, name, rule):
+        if self.known_devices is not None and name not in self.known_devices:
+            raise AlertExpressionError(rule, f"unknown device {name}")
+
+        if name not in self.device_index:
+            self.device_index[name] = len(self.devices)
+            self.devices.append(name)
+        return self.device_index[name]
+
+    def _read(self, vector, name, rule, inputs):
+        index = self._device(name, rule)
+        inputs.add((vector, index))
+        if vector == 'r':
+            self.rate_devices.add(name)
+        elif vector == 's':
+            self.uses_setpoint = True
+
+        return self._emit((vector, index), f"{vector}[{index}]")
+
+    def _compile(self, node, rule, inputs):
+        if isinstance(node, ast.Expression):
+            return self._compile(node.body, rule, inputs)
+
+        if isinstance(node, ast.Constant) and type(node.value) in [int, float]:
+            var = self._emit(('const', float(node.value)), repr(float(node.value)))
+            self.constants.add(var)
+            return var
+
+        if isinstance(node, ast.Name):
+            return self._read('t', node.id, rule, inputs)
+
+        if isinstance(node, ast.BoolOp):
+            op = 'and' if isinstance(node.op, ast.And) else 'or'
+            values = tuple(self._compile(value, rule, inputs) for value in node.values)
+            return self._emit((op, values), f"_{op}({', '.join(values)})")
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand, rule, inputs)
+            if isinstance(node.op, ast.Not):
+                return self._emit(('not', operand), f"_not({operand})")
+            if isinstance(node.op, ast.USub):
+                return self._emit(('neg', operand), f"(-{operand})")
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        if isinstance(node, ast.BinOp):
+            left = self._compile(node.left, rule, inputs)
+            right = self._compile(node.right, rule, inputs)
+            if isinstance(node.op, ast.Div):
+                return self._emit(('/', left, right), f"_div({left}, {right})")
+            if type(node.op) in _BINARY_OPERATORS:
+                op = _BINARY_OPERATORS[type(node.op)]
+                return self._emit((op, left, right), f"({left} {op} {right})")
+
+        if isinstance(node, ast.Compare):
+            operands = [self._compile(node.left, rule, inputs)] + \
+                       [self._compile(comparator, rule, inputs) for comparator in node.comparators]
+            comparisons = []
+            for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+                if type(op) not in _COMPARE_OPERATORS:
+                    break
+                symbol = _COMPARE_OPERATORS[type(op)]
+                nan_checks = [f"{var} != {var}" for var in (left, right) if var not in self.constants]
+                code = f"({left} {symbol} {right})"
+                if nan_checks:
+                    code = f"(None if {' or '.join(nan_checks)} else {code})"
+                comparisons.append(self._emit((symbol, left, right), code))
+            else:
+                if len(comparisons) == 1:
+                    return comparisons[0]
+                return self._emit(('and', tuple(comparisons)), f"_and({', '.join(comparisons)})")
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            func = node.func.id
+            if func in _DEVICE_FUNCTIONS and len(node.args) == 1:
+                arg = node.args[0]
+                if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name) and arg.func.id == 'temperature' \
+                        and len(arg.args) == 1:
+                    arg = arg.args[0]  # a backtick-quoted device name
+
+                if isinstance(arg, ast.Name):
+                    return self._read(_DEVICE_FUNCTIONS[func], arg.id, rule, inputs)
+                if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                    return self._read(_DEVICE_FUNCTIONS[func], arg.value, rule, inputs)
+
+            if func in _FUNCTIONS and node.args and _FUNCTIONS[func] in [None, len(node.args)]:
+                args = tuple(self._compile(arg, rule, inputs) for arg in node.args)
+                return self._emit((func, args), f"{func}({', '.join(args)})")
+
+        raise AlertExpressionError(rule, f"unsupported expression '{ast.dump(node)}'")
+
+    def add_rule(self, rule):
+        """
+        Compile a rule and return its slot in the results of the rule set.
+        """
+        try:
+            tree = ast.parse(_QUOTED_DEVICE.sub(lambda m: f"temperature({m[1]!r})", rule.strip()), mode='eval')
+        except SyntaxError as e:
+            raise AlertExpressionError(rule, e.msg)
+
+        inputs = set()
+        expression = self._compile(tree, rule, inputs)
+
+        # a rule never fires on missing readings: NaN != NaN, nor when its result is unknown
+        valid = tuple(self._emit(('valid', vector, index), f"({vector}[{index}] == {vector}[{index}])")
+                      for vector, index in sorted(inputs))
+        if valid:
+            expression = self._emit(('and', valid + (expression,)), f"_and({', '.join(valid + (expression,))})")
+        expression = self._emit(('true', expression), f"({expression} is True)")
+
+        self.outputs.append(expression)
+        self.rule_devices.append(sorted({self.devices[index] for _, index in inputs}))
+        # rates and setpoints can change while the temperature reading doesn't
+        self.rule_stateful.append(any(vector in ['r', 's'] for vector, _ in inputs))
+
+        return len(self.outputs) - 1
+
+    def build(self):
+        source = "\n".join(["def _evaluate(t, r, s, _div):"] + self.lines +
+                           [f"    return ({''.join(output + ', ' for output in self.outputs)})"])
+        namespace = {'_and': _and, '_or': _or, '_not': _not}
+        exec(compile(source, "<alert rules>", "exec"), namespace)
+
+        return CompiledRuleSet(source, namespace['_evaluate'], list(self.devices), list(self.rule_devices),
+                               set(self.rate_devices), self.uses_setpoint)
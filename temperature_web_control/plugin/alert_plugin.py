@@ -1,15 +1,28 @@
+import json
 import time
+import bisect
 import asyncio
+import threading
 from abc import ABC, abstractmethod
-from collections import deque
 from logging import Logger
 from typing import Union
 
+from temperature_web_control.model.estimators import SlopeEstimator
+from temperature_web_control.model.program import ProgramCompileError
+from temperature_web_control.plugin.alert_expression import RuleSetCompiler
 from temperature_web_control.plugin.plugin_base import PluginState
 from temperature_web_control.server.app_core import TemperatureAppCore
+from temperature_web_control.server.program_manager import TemperatureProgramException
 from temperature_web_control.utils import Config
 
 
+def status_time(status):
+    """
+    Acquisition time of the newest reading in a status dict.
+    """
+    return max((dev['time'] for dev in status.values() if 'time' in dev), default=None) or time.time()
+
+
 class StatusAlertCondition(ABC):
     def __init__(self, name, last_for, logger):
         self.name = name
@@ -22,10 +35,14 @@ class StatusAlertCondition(ABC):
     def is_condition_satisfied(self, status):
         pass
 
+    # conditions whose result depends on the reading history must see every sample, even unchanged ones
+    stateful = False
+
     def should_alert(self, status):
-        if self.is_condition_satisfied(status):
-            current_time = time.time()
+        return self.update(self.is_condition_satisfied(status), status_time(status))
 
+    def update(self, satisfied, current_time):
+        if satisfied:
             if self.triggered_time == 0:
                 self.triggered_time = current_time
 
@@ -156,13 +173,13 @@ class TemperatureDifferencesTooLargeStatusAlertCondition(StatusAlertCondition):
 
 
 class TemperatureChangingTooFastStatusAlertCondition(StatusAlertCondition):
+    stateful = True
+
     def __init__(self, dev, rate, last_for, logger):
         super().__init__(f"Temperature changing rate of {dev} higher than {rate} degrees/min", last_for, logger)
         self.dev = dev
         self.rate = rate
-        self.last_temperature = None
-        self.last_time = None
-        self.history_rate = deque(maxlen=3)
+        self.estimator = None  # shared per-device SlopeEstimator, attached by StatusAlertEngine
 
     @staticmethod
     def create_from_config(config, logger):
@@ -181,35 +198,17 @@ class TemperatureChangingTooFastStatusAlertCondition(StatusAlertCondition):
             self.logger.debug(f"Alert Plugin: {self.dev} not in status dict, ignored.")
             return False
 
-        dev = status[self.dev]
-
-        if 'temperature' not in dev:
+        if 'temperature' not in status[self.dev] or self.estimator is None:
             return False
 
-        if self.last_temperature is None:
-            self.last_temperature = dev['temperature']
-            self.last_time = time.time()
+        rate = self.estimator.rate
+        if rate is None:
             return False
 
-        current_temperature = dev['temperature']
-        current_time = time.time()
+        return self.compare_rate(rate)
 
-        diff_time = current_time - self.last_time
-        rate = (current_temperature - self.last_temperature) / (diff_time / 60)
-        self.last_temperature = current_temperature
-        self.last_time = current_time
-
-        self.history_rate.append(rate)
-
-        if self.compare_rate():
-            return True
-
-        return False
-
-    def compare_rate(self):
-        if abs(sum(self.history_rate) / len(self.history_rate)) > self.rate:
-            return True
-        return False
+    def compare_rate(self, rate):
+        return abs(rate) > self.rate
 
 
 class TemperatureRisingTooFastAlertMonitor(TemperatureChangingTooFastStatusAlertCondition):
@@ -226,10 +225,8 @@ class TemperatureRisingTooFastAlertMonitor(TemperatureChangingTooFastStatusAlert
         return TemperatureRisingTooFastAlertMonitor(config['device'], config['rate_threshold'],
                                                     last_for, logger)
 
-    def compare_rate(self):
-        if abs(sum(self.history_rate) / len(self.history_rate)) > self.rate:
-            return True
-        return False
+    def compare_rate(self, rate):
+        return rate > self.rate
 
 
 class TemperatureDroppingTooFastAlertMonitor(TemperatureChangingTooFastStatusAlertCondition):
@@ -246,11 +243,29 @@ class TemperatureDroppingTooFastAlertMonitor(TemperatureChangingTooFastStatusAle
         return TemperatureDroppingTooFastAlertMonitor(config['device'], config['rate_threshold'],
                                                       last_for, logger)
 
-    def compare_rate(self):
-        avg_rate = sum(self.history_rate) / len(self.history_rate)
-        if avg_rate < 0 and avg_rate < self.rate:
-            return True
-        return False
+    def compare_rate(self, rate):
+        return rate < self.rate
+
+
+class ExpressionStatusAlertCondition(StatusAlertCondition):
+    def __init__(self, rule, name, last_for, logger):
+        super().__init__(name if name else f"Alert rule {rule}", last_for, logger)
+        self.rule = rule
+        self.rule_set = None  # shared compiled rules, attached by StatusAlertEngine
+        self.slot = None
+
+    @staticmethod
+    def create_from_config(config, logger):
+        assert 'rule' in config, "Missing parameter"
+        last_for = config.get('last_for', 0) * 60
+
+        return ExpressionStatusAlertCondition(str(config['rule']), config.get('name', None), last_for, logger)
+
+    def get_alert_devices(self):
+        return self.rule_set.rule_devices[self.slot] if self.rule_set else []
+
+    def is_condition_satisfied(self, status):
+        return self.rule_set is not None and self.rule_set.results[self.slot]
 
 
 class ErrorAlertCondition(ABC):
@@ -301,6 +316,9 @@ class RegexFilterErrorAlertCondition(ErrorAlertCondition):
 
 
 class AlertAction(ABC):
+    # blocking actions talk to the devices and are executed in a worker thread
+    blocking = False
+
     def __init__(self, name, app_core: TemperatureAppCore, logger):
         self.name = name
         self.app_core = app_core
@@ -317,6 +335,8 @@ class AlertAction(ABC):
 
 
 class DisengageAction(AlertAction):
+    blocking = True
+
     def __init__(self, dev, app_core, logger):
         super().__init__(f"Disengage {dev}", app_core, logger)
         self.dev = dev
@@ -338,6 +358,8 @@ class DisengageAction(AlertAction):
 
 
 class EngageAction(AlertAction):
+    blocking = True
+
     def __init__(self, dev, app_core, logger):
         super().__init__(f"Engage {dev}", app_core, logger)
         self.dev = dev
@@ -359,6 +381,8 @@ class EngageAction(AlertAction):
 
 
 class SetpointAction(AlertAction):
+    blocking = True
+
     def __init__(self, dev, setpoint, app_core, logger):
         super().__init__(f"Set setpoint of {dev} to {setpoint}", app_core, logger)
         self.dev = dev
@@ -386,15 +410,33 @@ class RunProgramAction(AlertAction):
 
         if type(config) is dict:
             assert 'program' in config, "Missing parameter"
-            return RunProgramAction(config['program'], app_core, logger)
+            action = RunProgramAction(config['program'], app_core, logger)
         else:
-            return RunProgramAction(config, app_core, logger)
+            action = RunProgramAction(config, app_core, logger)
+
+        # compile the program now, so that errors show up at startup rather than when the alert fires
+        if action.program in app_core.programs:
+            try:
+                app_core.programs[action.program].compile(app_core.dev_instances.keys())
+            except ProgramCompileError as e:
+                logger.error(f"Alert Plugin: Program {action.program} of alert action is invalid: {e}")
+
+        return action
 
     def execute(self, status, error, alert):
         if self.program in self.app_core.programs:
             program = self.app_core.programs[self.program]
+            try:
+                program.compile(self.app_core.dev_instances.keys())
+            except ProgramCompileError as e:
+                self.logger.error(f"Alert Plugin: Can't run program {self.program}: {e}")
+                return
+
             self.logger.warning(f"Alert Plugin: Run program {self.program}")
-            self.app_core.program_manager.create_program_task(program)
+            try:
+                self.app_core.program_manager.create_program_task(program)
+            except TemperatureProgramException as e:
+                self.logger.error(f"Alert Plugin: Can't run program {self.program}: {e}")
         else:
             self.logger.warning(f"Alert Plugin: Program {self.program} doesn't exist")
 
@@ -456,6 +498,7 @@ class SendEmailAction(AlertAction):
         self.password = password
         self.subject = subject
         self.content = content
+        self.email_sender = None  # shared with the actions of the same server and recipients, see AlertPluginState
 
     @staticmethod
     def create_from_config(config, app_core, logger):
@@ -509,8 +552,6 @@ class SendEmailAction(AlertAction):
         return False
 
     def execute(self, status, error, alert):
-        import smtplib
-        from email.message import EmailMessage
         from datetime import datetime
 
         subject = self.subject
@@ -520,45 +561,323 @@ class SendEmailAction(AlertAction):
             subject = f"TEMPERATURE ALERT: {alert.name}"
 
         if not content:
-            time = datetime.now().isoformat()
-            content = f"""\
-            TEMPERATURE ALERT: {alert.name}
-            
-            Time: {time}
-            """
+            content = f"TEMPERATURE ALERT: {alert.name}\n\nTime: {datetime.now().isoformat()}\n"
 
             if error:
-                content += f"""\
-                Error: {error}
-                """
+                content += f"Error: {error}\n"
+
+        self.email_sender.add(subject, content)
+
+
+class EmailDigestSender:
+    """
+    Sends alert emails from a worker thread over one reused, authenticated SMTP connection.
+
+    Alerts added within `digest_window` seconds of the first pending one are combined into a single
+    digest message, so an alert storm produces one email instead of one per alert.
+    """
+
+    def __init__(self, *, smtp_host, smtp_port, ssl, ssl_verify, sender, password, recipients, digest_window,
+                 logger):
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.ssl = ssl
+        self.ssl_verify = ssl_verify
+        self.sender = sender
+        self.password = password
+        self.recipients = recipients
+        self.digest_window = digest_window
+        self.logger = logger
+
+        self.pending = []
+        self.flush_handle = None
+        self.flush_task = None
+        self.server = None
+        self.lock = threading.Lock()
+
+    def add(self, subject, content):
+        self.pending.append((subject, content))
+        if self.flush_handle is None:
+            loop = asyncio.get_event_loop()
+            self.flush_handle = loop.call_later(self.digest_window, self._start_flush)
+
+    def _start_flush(self):
+        self.flush_task = asyncio.ensure_future(self.flush())
+        self.flush_task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error("Alert Plugin: Failed to send email digest:", exc_info=task.exception())
+
+    def build_message(self, entries):
+        from email.message import EmailMessage
 
         msg = EmailMessage()
+        if len(entries) == 1:
+            subject, content = entries[0]
+        else:
+            subject = f"TEMPERATURE ALERT: {len(entries)} alerts"
+            content = "\n\n".join(f"== {_subject} ==\n{_content}" for _subject, _content in entries)
+
         msg.set_content(content)
         msg['Subject'] = subject
         msg['From'] = self.sender
         msg['To'] = ', '.join(self.recipients)
 
+        return msg
+
+    async def flush(self):
+        self.flush_handle = None
+        entries = self.pending
+        self.pending = []
+        if not entries:
+            return
+
+        msg = self.build_message(entries)
         self.logger.warning(f"Alert Plugin: Send email \n {msg.as_string()}")
 
-        server = None
         try:
-            if not self.ssl:
-                server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            else:
-                import ssl
-                context = ssl.create_default_context()
-                if not self.ssl_verify:
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context)
+            await asyncio.get_event_loop().run_in_executor(None, self._send, msg)
+        except Exception as e:
+            self.logger.error("Alert Plugin: Failed to send email:")
+            self.logger.exception(e)
+
+    def _connect(self):
+        import smtplib
 
-            if self.password:
-                server.login(self.sender, self.password)
+        if not self.ssl:
+            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+        else:
+            import ssl
+            context = ssl.create_default_context()
+            if not self.ssl_verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port, context=context)
 
-            server.send_message(msg)
-        finally:
-            if server:
-                server.quit()
+        if self.password:
+            server.login(self.sender, self.password)
+
+        return server
+
+    def _is_connected(self):
+        import smtplib
+
+        if self.server is None:
+            return False
+
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+
+    def _send(self, msg):
+        import smtplib
+
+        with self.lock:
+            if not self._is_connected():
+                self.close()
+                self.server = self._connect()
+
+            try:
+                self.server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self.server = self._connect()
+                self.server.send_message(msg)
+
+    def close(self):
+        import smtplib
+
+        if self.server:
+            try:
+                self.server.quit()
+            except smtplib.SMTPException:
+                pass
+            self.server = None
+
+
+class AlertActionQueue:
+    """
+    Executes alert actions in order from a background task, so that slow actions don't hold up
+    the status event handlers.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.queue = asyncio.Queue()
+
+    def submit(self, action: AlertAction, status, error, alert):
+        self.queue.put_nowait((action, status, error, alert))
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            action, status, error, alert = await self.queue.get()
+            try:
+                if action.blocking:
+                    await loop.run_in_executor(None, action.execute, status, error, alert)
+                else:
+                    action.execute(status, error, alert)
+            except Exception as e:
+                self.logger.error(f"Alert Plugin: Error while executing action {action.name}:")
+                self.logger.exception(e)
+
+
+class _ThresholdTable:
+    """
+    Threshold conditions of one device kept sorted by threshold, so that a single bisect finds
+    every condition a reading violates. Conditions above the threshold form a prefix of the table
+    (high temperature), those below it a suffix (low temperature).
+    """
+
+    def __init__(self, conditions, above):
+        self.conditions = sorted(conditions, key=lambda c: c.temperature)
+        self.thresholds = [c.temperature for c in self.conditions]
+        self.above = above
+        self.boundary = 0 if above else len(self.conditions)
+
+    def update(self, temperature):
+        """
+        Return the conditions that became satisfied and those that stopped being satisfied.
+        """
+        if temperature is None:
+            boundary = 0 if self.above else len(self.conditions)
+        elif self.above:
+            boundary = bisect.bisect_left(self.thresholds, temperature)
+        else:
+            boundary = bisect.bisect_right(self.thresholds, temperature)
+
+        lo, hi = sorted((self.boundary, boundary))
+        changed = self.conditions[lo:hi]
+        grew = (boundary > self.boundary) == self.above
+        self.boundary = boundary
+
+        return (changed, []) if grew else ([], changed)
+
+
+class StatusAlertEngine:
+    """
+    Evaluates status alert conditions incrementally.
+
+    Conditions are indexed by the devices they watch, and only those touching a device whose
+    reading changed are re-evaluated. High/low threshold conditions are not evaluated one by one
+    at all: one bisect per device over the sorted thresholds tells which of them changed state.
+
+    An engine built for a reloaded configuration takes over the alert state of the conditions it
+    shares with the `previous` engine, and the rate estimators of the devices, so that alerts
+    already active don't fire again.
+    """
+
+    def __init__(self, conditions, rate_window=20, known_devices=None, previous: 'StatusAlertEngine' = None):
+        self.conditions = set(conditions)
+        self.threshold_conditions = set()
+        self.estimators = {}
+        self.rule_set = None
+        self.tables = {}
+        self.device_conditions = {}
+        self.stateful_conditions = {}
+
+        self.last_readings = {}
+        self.pending = set()  # satisfied, but not yet for `last_for`
+        self.active = set()
+        if previous is not None:
+            self.pending = previous.pending & self.conditions
+            self.active = previous.active & self.conditions
+
+        def estimator(dev):
+            kept = previous.estimators.get(dev) if previous is not None else None
+            return kept if kept is not None and kept.window == rate_window else SlopeEstimator(rate_window)
+
+        # all expression rules are compiled together, so that they share common subexpressions
+        expressions = [c for c in conditions if isinstance(c, ExpressionStatusAlertCondition)]
+        if expressions:
+            compiler = RuleSetCompiler(known_devices)
+            slots = [compiler.add_rule(condition.rule) for condition in expressions]
+            self.rule_set = compiler.build()
+
+            # only now, conditions kept from a previous engine must stay intact if compiling fails
+            for condition, slot in zip(expressions, slots):
+                condition.slot = slot
+                condition.stateful = compiler.rule_stateful[slot]
+                condition.rule_set = self.rule_set
+            for dev in self.rule_set.rate_devices:
+                self.estimators[dev] = estimator(dev)
+
+        high = {}
+        low = {}
+        for condition in conditions:
+            if type(condition) is HighTemperatureStatusAlertCondition:
+                high.setdefault(condition.dev, []).append(condition)
+                self.threshold_conditions.add(condition)
+                continue
+            elif type(condition) is LowTemperatureStatusAlertCondition:
+                low.setdefault(condition.dev, []).append(condition)
+                self.threshold_conditions.add(condition)
+                continue
+
+            if isinstance(condition, TemperatureChangingTooFastStatusAlertCondition):
+                # rate conditions and rules on one device share one estimator
+                if condition.dev not in self.estimators:
+                    self.estimators[condition.dev] = estimator(condition.dev)
+                condition.estimator = self.estimators[condition.dev]
+
+            index = self.stateful_conditions if condition.stateful else self.device_conditions
+            for dev in condition.get_alert_devices():
+                index.setdefault(dev, []).append(condition)
+
+        for dev in set(high.keys()) | set(low.keys()):
+            self.tables[dev] = [_ThresholdTable(high.get(dev, []), True),
+                                _ThresholdTable(low.get(dev, []), False)]
+
+    def evaluate(self, status, current_time):
+        """
+        Update the state of the conditions with a new status, and return the conditions that
+        should start alerting.
+        """
+        to_check = set(self.pending)
+
+        for dev, dev_status in status.items():
+            if dev in self.estimators and 'temperature' in dev_status and 'time' in dev_status:
+                self.estimators[dev].add(dev_status['time'], dev_status['temperature'])
+            to_check.update(self.stateful_conditions.get(dev, []))
+
+            reading = dev_status.get('temperature')
+            if dev in self.last_readings and self.last_readings[dev] == reading:
+                continue
+            self.last_readings[dev] = reading
+
+            to_check.update(self.device_conditions.get(dev, []))
+            for table in self.tables.get(dev, []):
+                entered, left = table.update(reading)
+                to_check.update(entered)
+                for condition in left:
+                    condition.update(False, current_time)
+                    to_check.discard(condition)
+                    self.pending.discard(condition)
+                    self.active.discard(condition)
+
+        if self.rule_set and any(isinstance(c, ExpressionStatusAlertCondition) for c in to_check):
+            self.rule_set.evaluate(status, self.estimators)
+
+        fired = []
+        for condition in to_check:
+            if condition in self.threshold_conditions:
+                satisfied = True  # only satisfied threshold conditions are ever checked
+            else:
+                satisfied = condition.is_condition_satisfied(status)
+
+            if condition.update(satisfied, current_time):
+                self.pending.discard(condition)
+                if condition not in self.active:
+                    self.active.add(condition)
+                    fired.append(condition)
+            elif satisfied:
+                self.pending.add(condition)
+            else:
+                self.pending.discard(condition)
+                self.active.discard(condition)
+
+        return fired
 
 
 alert_condition_mapping = {
@@ -568,6 +887,7 @@ alert_condition_mapping = {
     'large_temperature_changing_rate': TemperatureChangingTooFastStatusAlertCondition,
     'large_temperature_rising_rate': TemperatureRisingTooFastAlertMonitor,
     'large_temperature_dropping_rate': TemperatureDroppingTooFastAlertMonitor,
+    'expression': ExpressionStatusAlertCondition,
     'error_message_matches': RegexFilterErrorAlertCondition
 }
 
@@ -590,12 +910,37 @@ class AlertPluginState(PluginState):
         self.config = config
         self.app_core = app_core
         self.logger = logger
-        self.current_alert_list = []
+
+        self.action_queue = AlertActionQueue(logger)
+        self.email_senders = {}  # kept across reloads, so that pending digests aren't lost
+        self.rules = {}  # rule config as JSON -> list of (condition, actions) loaded from it
+        self.status_engine = None
+        self._load_alerts()
+
+        self.app_core.subscribe_to("status_available", self, self.on_status_available_event)
+        self.app_core.subscribe_to("program_error", self, self.on_error_event)
+        self.app_core.subscribe_to("config_changed", self, self.on_config_changed_event)
+
+    def _load_alerts(self):
+        logger = self.logger
+        app_core = self.app_core
 
         alerts = self.config.get("alerts", default=None)
-        self.condition_action_tuples = []
+        condition_action_tuples = []
+        condition_actions = {}
+        rules = {}
+        unchanged = {key: list(loaded) for key, loaded in self.rules.items()}
 
         for alert_condition in alerts:
+            key = json.dumps(alert_condition, sort_keys=True, default=str)
+            if unchanged.get(key):
+                # an unchanged rule keeps its condition, and with it its alert state
+                condition_instance, action_instances = unchanged[key].pop(0)
+                rules.setdefault(key, []).append((condition_instance, action_instances))
+                condition_action_tuples.append((condition_instance, action_instances))
+                condition_actions[condition_instance] = action_instances
+                continue
+
             assert len(list(alert_condition.keys())) == 1, "Syntax error"
             _type = list(alert_condition.keys())[0]
             _config = alert_condition[_type]
@@ -623,32 +968,69 @@ class AlertPluginState(PluginState):
                                                                                         app_core,
                                                                                         logger)
 
+                if isinstance(action_instance, SendEmailAction):
+                    action_instance.email_sender = self._email_sender(action_instance)
+
                 self.logger.info(f"Alert Plugin: - action: {action_instance.name}")
 
                 action_instances.append(action_instance)
 
-            self.condition_action_tuples.append((condition_instance, action_instances))
+            rules.setdefault(key, []).append((condition_instance, action_instances))
+            condition_action_tuples.append((condition_instance, action_instances))
+            condition_actions[condition_instance] = action_instances
 
-
-        self.app_core.subscribe_to("status_available", self, self.on_status_available_event)
-        self.app_core.subscribe_to("program_error", self, self.on_error_event)
+        rate_window = self.config.get("alert_rate_window", default=None)
+        if rate_window is None:
+            rate_window = 4 * self.config.get("update_interval", default=5)
+        else:
+            rate_window *= 60
+
+        status_engine = StatusAlertEngine([condition for condition, _ in condition_action_tuples
+                                           if isinstance(condition, StatusAlertCondition)],
+                                          rate_window, list(self.app_core.dev_instances.keys()),
+                                          previous=self.status_engine)
+
+        self.rules = rules
+        self.condition_action_tuples = condition_action_tuples
+        self.condition_actions = condition_actions
+        self.status_engine = status_engine
+
+    def _email_sender(self, action: SendEmailAction):
+        key = (action.smtp_host, action.smtp_port, action.ssl, action.sender, tuple(action.recipients))
+        if key not in self.email_senders:
+            self.email_senders[key] = EmailDigestSender(
+                smtp_host=action.smtp_host,
+                smtp_port=action.smtp_port,
+                ssl=action.ssl,
+                ssl_verify=action.ssl_verify,
+                sender=action.sender,
+                password=action.password,
+                recipients=action.recipients,
+                digest_window=email_config_dict.get('digest_window', 10),
+                logger=self.logger)
+
+        return self.email_senders[key]
+
+    async def on_config_changed_event(self, subscribers, message):
+        devices = message['devices']
+        if not ({'alerts', 'alert_rate_window', 'update_interval'} & set(message['sections'])
+                or devices['added'] or devices['removed']):
+            return
+
+        self.logger.info("Alert Plugin: Configuration changed, reloading alerts.")
+        try:
+            self._load_alerts()
+        except Exception as e:
+            self.logger.error("Alert Plugin: Invalid alerts in the new configuration, keeping the old ones:")
+            self.logger.exception(e)
 
     async def on_status_available_event(self, subscribers, message):
         status = message['status']
 
-        for (condition, actions) in self.condition_action_tuples:
-            if isinstance(condition, ErrorAlertCondition):
-                continue
-
-            assert isinstance(condition, StatusAlertCondition)
-            if condition.should_alert(status):
-                if condition not in self.current_alert_list:
-                    self.current_alert_list.append(condition)
-                    for action in actions:
-                        action.execute(status, None, condition)
-            else:
-                if condition in self.current_alert_list:
-                    self.current_alert_list.remove(condition)
+        for condition in self.status_engine.evaluate(status, status_time(status)):
+            self.logger.warning(f"Alert Plugin: Alert triggered: {condition.name}")
+            for action in self.condition_actions[condition]:
+                self.action_queue.submit(action, status, None, condition)
 
     async def on_error_event(self, subscribers, message):
         for (condition, actions) in self.condition_action_tuples:
@@ -661,10 +1043,10 @@ class AlertPluginState(PluginState):
             if condition.should_alert(error):
                 self.logger.warning(f"Alert Plugin: Alert triggered: {condition.name}")
                 for action in actions:
-                    action.execute(None, error, condition)
+                    self.action_queue.submit(action, None, error, condition)
 
     async def run(self):
-        pass
+        await self.action_queue.run()
 
 
 async def initialize(config: Config, app_core: TemperatureAppCore, logger: Logger) -> Union[PluginState, None]:
@@ -1,4 +1,7 @@
+import os
+import gzip
 import time
+import asyncio
 import requests
 import base64
 from typing import Union
@@ -18,6 +21,187 @@ class TokenAuth(requests.auth.AuthBase):
         return r
 
 
+class InfluxWriteError(Exception):
+    def __init__(self, error, retryable=True):
+        super().__init__(f"Error occurred when writing to InfluxDB: {error}")
+        self.retryable = retryable
+
+
+def escape_key(key):
+    # See https://docs.influxdata.com/influxdb/v1/write_protocols/line_protocol_reference/#special-characters
+    return str(key).replace(",", r"\,").replace("=", r"\=").replace(" ", r"\ ")
+
+
+class WindowAggregate:
+    """
+    Running mean/min/max/last/count of the readings received in one push window, O(1) per sample.
+    """
+
+    __slots__ = ['count', 'total', 'minimum', 'maximum', 'last']
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.last = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_fields(self, name):
+        return f"{name}_mean={self.mean:.3f},{name}_min={self.minimum:.1f},{name}_max={self.maximum:.1f}," \
+               f"{name}_last={self.last:.1f},{name}_count={self.count}i,{name}_units=\"C\""
+
+
+class InfluxWriter:
+    """
+    Buffers line protocol records and writes them to InfluxDB from a background task.
+
+    Records are flushed in gzip-compressed batches whenever `batch_size` lines are buffered or
+    `flush_interval` seconds have passed. A failed batch is retried with exponential backoff and,
+    if the endpoint stays unreachable, spooled to `spool_dir`. Spooled batches are replayed, oldest
+    first, as soon as a write succeeds again.
+    """
+
+    def __init__(self, url, database, auth, logger: Logger, *, batch_size=5000, flush_interval=60,
+                 spool_dir=None, max_retries=3, backoff=1, timeout=5):
+        self.logger = logger
+        self.write_url = requests.compat.urljoin(url, f"/write?db={database}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        # One session for the lifetime of the writer, so the connection is kept alive between batches
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.headers.update({
+            'Content-Encoding': 'gzip',
+            'Content-Type': 'text/plain; charset=utf-8'
+        })
+
+        self.buffer = []
+        self.flush_requested = asyncio.Event()
+
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+
+    def write(self, lines):
+        self.buffer.extend(lines)
+        if len(self.buffer) >= self.batch_size:
+            self.flush_requested.set()
+
+    def request_flush(self):
+        self.flush_requested.set()
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self.flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.error("Influx Push Plugin: Unexpected error while flushing:")
+                self.logger.exception(e)
+
+    async def flush(self):
+        while self.buffer:
+            batch = self.buffer[:self.batch_size]
+            del self.buffer[:self.batch_size]
+
+            body = gzip.compress("\n".join(batch).encode("utf-8"))
+            try:
+                await self._post_with_retry(body)
+            except InfluxWriteError as e:
+                self.logger.error(f"Influx Push Plugin: {e}")
+                if e.retryable and self.spool_dir:
+                    await self._spool(body)
+                    self.logger.warning(f"Influx Push Plugin: Spooled {len(batch)} records to {self.spool_dir}.")
+                return
+
+        await self.replay_spool()
+
+    def _post(self, body):
+        try:
+            r = self.session.post(self.write_url, data=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise InfluxWriteError(e)
+
+        if r.status_code >= 400:
+            # client errors other than throttling mean the batch itself is rejected, retrying won't help
+            retryable = r.status_code >= 500 or r.status_code in [408, 429]
+            raise InfluxWriteError(f"HTTP {r.status_code}: {r.text.strip()}", retryable)
+
+    async def _post_with_retry(self, body):
+        loop = asyncio.get_event_loop()
+
+        for i in range(self.max_retries + 1):
+            try:
+                self.logger.debug(f"Influx Push Plugin: Push {len(body)} bytes to {self.write_url}")
+                await loop.run_in_executor(None, self._post, body)
+                return
+            except InfluxWriteError as e:
+                if not e.retryable or i == self.max_retries:
+                    raise
+                self.logger.warning(f"Influx Push Plugin: Write failed, retrying, {i+1} of {self.max_retries} "
+                                    f"times...")
+                await asyncio.sleep(self.backoff * 2 ** i)
+
+    def _spool_files(self):
+        return sorted(f for f in os.listdir(self.spool_dir) if f.endswith(".lp.gz"))
+
+    async def _spool(self, body):
+        def _write():
+            path = os.path.join(self.spool_dir, f"{time.time_ns():020d}.lp.gz")
+            with open(path + ".tmp", "wb") as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+
+        await asyncio.get_event_loop().run_in_executor(None, _write)
+
+    async def replay_spool(self):
+        if not self.spool_dir:
+            return
+
+        loop = asyncio.get_event_loop()
+        for filename in self._spool_files():
+            path = os.path.join(self.spool_dir, filename)
+            with open(path, "rb") as f:
+                body = f.read()
+
+            try:
+                await loop.run_in_executor(None, self._post, body)
+            except InfluxWriteError as e:
+                if e.retryable:
+                    return  # endpoint is down again, keep the spool for later
+                self.logger.error(f"Influx Push Plugin: Dropping rejected spool file {filename}: {e}")
+
+            os.remove(path)
+            self.logger.info(f"Influx Push Plugin: Replayed spooled batch {filename}.")
+
+
 class InfluxPushPluginState(PluginState):
     def __init__(self, config: Config, app_core: TemperatureAppCore, logger: Logger):
         self.config = config
@@ -29,49 +213,79 @@ class InfluxPushPluginState(PluginState):
             user = self.config.get("influx_plugin", "user")
             password = self.config.get("influx_plugin", "password")
 
-            token = base64.b64decode(f"{user}:{password}".encode("utf-8"))
+            token = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("utf-8")
 
-        self.auth = TokenAuth(token)
-        self.url = self.config.get("influx_plugin", "influx_api_url")
-        self.database =self.config.get("influx_plugin", "database")
-        self.measurement = self.config.get("influx_plugin", "measurement")
-        self.interval = self.config.get("influx_plugin", "push_interval", default=5) * 60
+        default_spool_dir = os.path.join(os.path.dirname(os.path.abspath(config.path)), "influx_spool")
 
-        self.last_push_time = 0
+        self.measurement = escape_key(self.config.get("influx_plugin", "measurement"))
+        self.interval = self.config.get("influx_plugin", "push_interval", default=5) * 60
+        # opt-in: aggregated points have other field names than the raw ones, which would break
+        # the queries and dashboards of existing databases
+        self.aggregate = self.config.get("influx_plugin", "aggregate", default=False)
+        self.aggregates = {}
+        self.window_start = time.time()
+        self.window_last_sample = 0
+        self.writer = InfluxWriter(
+            self.config.get("influx_plugin", "influx_api_url"),
+            self.config.get("influx_plugin", "database"),
+            TokenAuth(token),
+            logger,
+            batch_size=self.config.get("influx_plugin", "batch_size", default=5000),
+            flush_interval=self.interval,
+            spool_dir=self.config.get("influx_plugin", "spool_dir", default=default_spool_dir),
+            max_retries=self.config.get("influx_plugin", "max_retries", default=3)
+        )
 
         self.app_core.subscribe_to("status_available", self, self.on_status_available_event)
 
     async def on_status_available_event(self, subscribers, message):
-        if time.time() - self.last_push_time < self.interval:
-            return
+        if self.aggregate:
+            self.aggregate_status(message['status'])
+        else:
+            self.write_status(message['status'])
 
-        self.last_push_time = time.time()
+    def aggregate_status(self, status):
+        current_time = time.time()
 
-        try:
-            status = message['status']
-            t = f"{int(time.time()*1e9):d}"
+        for dev in status.values():
+            if 'temperature' not in dev:
+                continue
+
+            if dev['name'] not in self.aggregates:
+                self.aggregates[dev['name']] = WindowAggregate()
+            self.aggregates[dev['name']].add(dev['temperature'])
+            self.window_last_sample = dev.get('time', current_time)
+
+        if current_time - self.window_start < self.interval:
+            return
 
-            req_url = requests.compat.urljoin(self.url, f"/write?db={self.database}")
-            self.logger.debug(f"Influx Push Plugin: Push to {req_url}")
+        t = f"{int(self.window_last_sample*1e9):d}"
+        lines = []
+        for name, aggregate in self.aggregates.items():
+            if aggregate.count == 0:
+                continue
 
-            req = []
-            for dev in status.values():
-                if 'temperature' not in dev:
-                    pass
+            lines.append(f"{self.measurement} {aggregate.to_fields(escape_key(name))} {t}")
+            aggregate.reset()
 
-                req.append(f"{self.measurement} {dev['name']}={dev['temperature']:.1f},{dev['name']}_units=\"C\" {t}")
+        self.window_start = current_time
+        self.writer.write(lines)
+        self.writer.request_flush()
 
-            self.logger.debug(f"Influx Push Plugin: Request {req}")
-            r = requests.post(req_url, data="\n".join(req), auth=self.auth, timeout=3)
+    def write_status(self, status):
+        lines = []
+        for dev in status.values():
+            if 'temperature' not in dev:
+                continue
 
-            r.raise_for_status()
-        except Exception as e:
-            self.logger.error("Influx Push Plugin: Error while making request:")
-            self.logger.exception(e)
+            t = f"{int(dev.get('time', time.time())*1e9):d}"
+            name = escape_key(dev['name'])
+            lines.append(f"{self.measurement} {name}={dev['temperature']:.1f},{name}_units=\"C\" {t}")
 
+        self.writer.write(lines)
 
     async def run(self):
-        pass
+        await self.writer.run()
 
 
 async def initialize(config: Config, app_core: TemperatureAppCore, logger: Logger) -> Union[PluginState, None]:
@@ -1,13 +1,25 @@
 import asyncio
+import bisect
+import hmac
+import math
+import threading
 import time
+from itertools import islice
 from functools import wraps, partial
 from logging import Logger
 from collections import deque
 
+import yaml
+
 from temperature_web_control.driver import load_driver
-from temperature_web_control.model.program import Program, actions
-from temperature_web_control.server.program_manager import ProgramManager
-from temperature_web_control.utils import Config
+from temperature_web_control.model.program import Program, ProgramCompileError, actions
+from temperature_web_control.server.program_manager import ProgramManager, TemperatureProgramException
+from temperature_web_control.server.checkpoint import CheckpointLog
+from temperature_web_control.server.polling_workers import PollingWorkerPool, RemoteDevice
+from temperature_web_control.server.profiler import SamplingProfiler
+from temperature_web_control.server.status_board import StatusBoard
+from temperature_web_control.server.simulator import simulate_program
+from temperature_web_control.utils import Config, ConfigDiff
 
 
 def async_wrap(func):
@@ -30,83 +42,100 @@ class SubscriberGroup:
 
 class TemperatureHistory:
     def __init__(self, length, devices):
+        self.length = length
         self.times = {}
         self.temperatures = {}
+        self.dropped = {}  # samples of each device pushed out of the deques, to keep exports in place
+        # the HTTP export reads the history from another thread
+        self.lock = threading.Lock()
         for device in devices:
-            self.times[device] = deque(maxlen=length)
-            self.temperatures[device] = deque(maxlen=length)
+            self.add_device(device)
+
+    def add_device(self, device):
+        with self.lock:
+            self.times[device] = deque(maxlen=self.length)
+            self.temperatures[device] = deque(maxlen=self.length)
+            self.dropped[device] = 0
+
+    def remove_device(self, device):
+        with self.lock:
+            self.times.pop(device, None)
+            self.temperatures.pop(device, None)
+            self.dropped.pop(device, None)
+
+    def load(self, device, times, temperatures):
+        # replace the history of `device`, e.g. with the one fetched from another instance
+        with self.lock:
+            self.times[device] = deque(times, maxlen=self.length)
+            self.temperatures[device] = deque(temperatures, maxlen=self.length)
+            self.dropped[device] = 0
 
     async def status_update_handler(self, subscribers, status_dict):
         dev_status = status_dict['status']
 
-        for dev, status in dev_status.items():
-            self.times[dev].append(time.time())
-            if 'temperature' in status:
-                self.temperatures[dev].append(status['temperature'])
-            else:
-                self.temperatures[dev].append(None)
+        with self.lock:
+            for dev, status in dev_status.items():
+                if dev not in self.times:
+                    continue
+                if len(self.times[dev]) == self.length:
+                    self.dropped[dev] += 1
+                self.times[dev].append(status.get('time', time.time()))
+                if 'temperature' in status:
+                    self.temperatures[dev].append(status['temperature'])
+                else:
+                    self.temperatures[dev].append(None)
+
+    def iter_range(self, device, start=None, end=None, chunk_size=4096):
+        """
+        Yield the samples of `device` taken between `start` and `end` (Unix times, inclusive) as
+        (times, temperatures) lists of at most `chunk_size` samples. Only one chunk is copied at a
+        time, so it can run from another thread while samples are being added; the samples added
+        after the first chunk are not included.
+        """
+        position = None  # index of the next sample, counting the dropped ones
+        while True:
+            with self.lock:
+                times = self.times.get(device)
+                if times is None:
+                    return
+                if position is None:
+                    position = self.dropped[device] + (bisect.bisect_left(times, start) if start is not None else 0)
+                    stop = self.dropped[device] + len(times)
+                # samples dropped since the last chunk are skipped
+                i = max(position - self.dropped[device], 0)
+                n = min(chunk_size, stop - self.dropped[device] - i)
+                chunk_times = list(islice(times, i, i + n))
+                chunk_temperatures = list(islice(self.temperatures[device], i, i + n))
+                position = self.dropped[device] + i + len(chunk_times)
+
+            if end is not None and chunk_times and chunk_times[-1] > end:
+                n = bisect.bisect_right(chunk_times, end)
+                if n:
+                    yield chunk_times[:n], chunk_temperatures[:n]
+                return
+            if not chunk_times:
+                return
+            yield chunk_times, chunk_temperatures
 
     def dump_data(self):
         ret = {}
-        for dev in self.times.keys():
-            ret[dev] = {}
-            ret[dev]['time'] = list(self.times[dev])
-            ret[dev]['temperature'] = list(self.temperatures[dev])
+        with self.lock:
+            for dev in self.times.keys():
+                ret[dev] = {}
+                ret[dev]['time'] = list(self.times[dev])
+                ret[dev]['temperature'] = list(self.temperatures[dev])
 
         return ret
 
 
-class TemperatureAppCore:
-    def __init__(self, config: Config, logger: Logger):
-        self.config = config
-        self.logger = logger
-        self.dev_instances = {}
-        self.programs = {}
-        self.subscribers = {
-            'status_available': {},
-            'control_changed': {},
-            'program_error': {}
-        }
-        self.last_status = {}
-
-        self.monitor_running = False
-        self.monitor_task = None
-        self.monitor_last_update = 0
-
-        self._load_devices()
-        self._load_programs()
+class EventBus:
+    """
+    Events that clients and plugins subscribe to, and the replies to their requests.
+    """
 
-        self.program_manager = ProgramManager(config, self.dev_instances,
-                                              lambda: asyncio.gather(self.update_status_and_fire_event(),
-                                                                     self.fire_control_changed_event()),
-                                              self.fire_program_error,
-                                              logger)
-        history_len = config.get('history_length', default=1000)
-        self.history = TemperatureHistory(history_len, self.dev_instances)
-        self.subscribe_to('status_available', self.history, self.history.status_update_handler)
-
-    def _load_devices(self):
-        dev_instances = {}
-        for dev in self.config.get('devices'):
-            self.dev_instances[dev["name"]] = load_driver(dev, self.logger)
-
-        return dev_instances
-
-    def get_event_handlers(self):
-        # The events that can be handled by this class
-        event_handlers = {
-            'request_status': self.on_request_status_event,
-            'run_predefined_program': self.on_predefined_program_run_event,
-            'run_program': self.on_run_program_event,
-            'abort_program': self.on_abort_program_event,
-            'edit_program': self.on_edit_program_event,
-            'list_programs': self.on_list_program_event,
-            'list_actions': self.on_list_actions_event,
-            'current_programs': self.on_current_programs_event,
-            'fetch_history': self.on_fetch_history_event,
-            'standby_device': self.on_standby_device_event,
-        }
-        return event_handlers
+    def __init__(self, logger: Logger, events):
+        self.logger = logger
+        self.subscribers = {event: {} for event in events}
 
     def subscribe_to(self, event_name, subscriber, handler, group_id=None):
         self.logger.info(f"AppCore: {subscriber} subscribes to {event_name}, group id {group_id}.")
@@ -151,6 +180,105 @@ class TemperatureAppCore:
                     unfinished.cancel()
                     await self.fire_program_error(f"Timeout executing event handler {unfinished}")
 
+    async def fire_program_error(self, error):
+        self.logger.error("AppCore: Received error, broadcasting to clients...")
+        if  isinstance(error, Exception):
+            self.logger.exception(error)
+            await self._fire_event('program_error', {'error': str(error)})
+        else:
+            self.logger.error(error)
+            await self._fire_event('program_error', {'error': error})
+
+    async def fire_control_changed_event(self):
+        await self._fire_event('control_changed', {})
+
+    async def _return_error(self, callback, error_msg):
+        if callback:
+            await callback({"result": "error", "error_msg": error_msg})
+
+    async def _return_ok(self, callback, message=None):
+        if callback:
+            result = {"result": "ok"}
+            if message:
+                result.update(message)
+
+            await callback(result)
+
+
+class TemperatureAppCore(EventBus):
+    def __init__(self, config: Config, logger: Logger):
+        super().__init__(logger, ['status_available', 'control_changed', 'program_error', 'config_changed'])
+        self.config = config
+        self.dev_instances = {}
+        self.programs = {}
+        self.last_status = {}
+
+        self.monitor_running = False
+        self.monitor_task = None
+        self.monitor_last_update = 0
+
+        self.profiler_running = False
+
+        self.worker_pool = None
+        self._load_devices()
+        self._load_programs()
+
+        self.checkpoint = CheckpointLog.create_from_config(config, logger)
+        self.program_manager = ProgramManager(config, self.dev_instances,
+                                              lambda: asyncio.gather(self.update_status_and_fire_event(),
+                                                                     self.fire_control_changed_event()),
+                                              self.fire_program_error,
+                                              logger, checkpoint=self.checkpoint)
+        self.pending_device_configs = {}  # device name -> configuration to load once no program uses it
+        self.reload_tasks = {}  # device name -> task loading its pending configuration
+        self.program_manager.resources.on_release = self.on_devices_released
+        history_len = config.get('history_length', default=1000)
+        self.history = TemperatureHistory(history_len, self.dev_instances)
+        self.subscribe_to('status_available', self.history, self.history.status_update_handler)
+        self.subscribe_to('status_available', self.program_manager, self.program_manager.status_update_handler)
+
+        self.status_board = StatusBoard.create_from_config(config, logger)
+        if self.status_board:
+            self.subscribe_to('status_available', self.status_board, self.status_board.status_update_handler)
+
+    def _load_devices(self):
+        if self.worker_pool:
+            self.worker_pool.close()
+
+        self.worker_pool = PollingWorkerPool.create_from_config(self.config, self.logger)
+        if self.worker_pool:
+            self.dev_instances.update(self.worker_pool.devices)
+            return
+
+        for dev in self.config.get('devices'):
+            self.dev_instances[dev["name"]] = load_driver(dev, self.logger)
+
+    def _load_device(self, dev_config):
+        if self.worker_pool:
+            return self.worker_pool.load_device(dev_config)
+        return load_driver(dev_config, self.logger)
+
+    def get_event_handlers(self):
+        # The events that can be handled by this class
+        event_handlers = {
+            'request_status': self.on_request_status_event,
+            'run_predefined_program': self.on_predefined_program_run_event,
+            'run_program': self.on_run_program_event,
+            'abort_program': self.on_abort_program_event,
+            'edit_program': self.on_edit_program_event,
+            'list_programs': self.on_list_program_event,
+            'list_actions': self.on_list_actions_event,
+            'current_programs': self.on_current_programs_event,
+            'fetch_history': self.on_fetch_history_event,
+            'standby_device': self.on_standby_device_event,
+            'profile': self.on_profile_event,
+            'simulate_program': self.on_simulate_program_event,
+            'list_interrupted_programs': self.on_list_interrupted_programs_event,
+            'resume_program': self.on_resume_program_event,
+            'discard_checkpoint': self.on_discard_checkpoint_event,
+        }
+        return event_handlers
+
     def start_monitoring(self):
         def done_handler(task):
             try:
@@ -197,27 +325,131 @@ class TemperatureAppCore:
                     await self.fire_program_error(f"Monitoring routine got stuck. Probably due to unresponsive drivers. "
                                       "Restarting.")
                     self.monitor_task.cancel()
-                    self.dev_instances = {}
+                    self.dev_instances.clear()  # shared with the program manager, keep the same dict
                     self._load_devices()
                     self.start_monitoring()
                     return
 
-    async def fire_program_error(self, error):
-        self.logger.error("AppCore: Received error, broadcasting to clients...")
-        if  isinstance(error, Exception):
-            self.logger.exception(error)
-            await self._fire_event('program_error', {'error': str(error)})
-        else:
-            self.logger.error(error)
-            await self._fire_event('program_error', {'error': error})
+    async def reload_config(self):
+        self.logger.info("AppCore: Reloading the configuration.")
+        try:
+            diff = self.config.reload()
+        except (OSError, yaml.YAMLError) as e:
+            await self.on_config_error(e)
+            return
+
+        await self.apply_config_diff(diff)
+
+    async def on_config_error(self, error):
+        await self.fire_program_error(f"Cannot load the configuration: {error}")
+
+    async def on_config_write_error(self, error):
+        await self.fire_program_error(f"Cannot save the configuration: {error}")
+
+    async def apply_config_diff(self, diff: ConfigDiff):
+        """
+        Bring the app in line with a reloaded configuration. Only devices and programs that were
+        added, removed or changed are touched; the rest keep running.
+        """
+        for name in list(diff.devices.removed) + list(diff.devices.changed):
+            self.pending_device_configs.pop(name, None)
+            reload_task = self.reload_tasks.get(name)
+            if reload_task is not None:
+                reload_task.cancel()  # superseded, the device stays held until it has stopped
+
+            owner = self.program_manager.resources.owner(name)
+            if owner is not None and name in diff.devices.changed:
+                self.logger.warning(f"AppCore: Device {name} is used by program {owner}, "
+                                    f"its new configuration is loaded when the program ends.")
+                self.pending_device_configs[name] = diff.devices.changed[name]
+                continue
+            if owner is not None and reload_task is None:
+                self.logger.warning(f"AppCore: Device {name} was removed, aborting program {owner}.")
+                self.program_manager.abort_program(owner)
+
+            await self._unload_device(name)
+
+        for name, dev_config in list(diff.devices.added.items()) + list(diff.devices.changed.items()):
+            if name in self.pending_device_configs:
+                continue
+            await self._add_device(name, dev_config)
+
+        for name in diff.programs.removed:
+            self.programs.pop(name, None)
+
+        for name, program_dict in list(diff.programs.added.items()) + list(diff.programs.changed.items()):
+            try:
+                self.programs[name] = Program.from_dict(program_dict)
+            except (KeyError, TypeError) as e:
+                await self.fire_program_error(f"Syntax error in program {name}: {str(e)}")
+
+        await self._fire_event('config_changed', {
+            'sections': sorted(diff.sections),
+            'devices': {key: sorted(value) for key, value in diff.devices._asdict().items()},
+            'programs': {key: sorted(value) for key, value in diff.programs._asdict().items()}
+        })
+        await self.fire_control_changed_event()
+
+    async def _unload_device(self, name):
+        self.logger.info(f"AppCore: Unload device {name}.")
+        self.dev_instances.pop(name, None)
+        if self.worker_pool:
+            await asyncio.get_event_loop().run_in_executor(None, self.worker_pool.unload_device, name)
+        self.history.remove_device(name)
+        if self.status_board:
+            self.status_board.remove_device(name)
+        self.last_status.pop(name, None)
+
+    async def _add_device(self, name, dev_config):
+        self.logger.info(f"AppCore: Load device {name}.")
+        try:
+            dev = await asyncio.get_event_loop().run_in_executor(None, self._load_device, dev_config)
+            if dev is None:
+                raise ValueError(f"unknown device type {dev_config.get('dev_type')}")
+        except Exception as e:
+            await self.fire_program_error(f"Cannot load device {name}: {e}")
+            return
+
+        self.dev_instances[name] = dev
+        self.history.add_device(name)
+
+    def on_devices_released(self, program_name, devices):
+        """
+        Load the configurations that changed while a program used the devices, before queued
+        programs get them.
+        """
+        for name in devices:
+            if name not in self.pending_device_configs:
+                continue
+
+            holder = f"Reload of {name}"
+            self.program_manager.resources.hold(holder, [name])
+            task = asyncio.ensure_future(self._reload_device(holder, name, self.pending_device_configs.pop(name)))
+            self.reload_tasks[name] = task
+
+            def done(t, name=name):
+                if self.reload_tasks.get(name) is t:
+                    del self.reload_tasks[name]
+
+            task.add_done_callback(done)
+
+    async def _reload_device(self, holder, name, dev_config):
+        try:
+            self.logger.info(f"AppCore: Device {name} was released, loading its new configuration.")
+            await self._unload_device(name)
+            await self._add_device(name, dev_config)
+        except Exception as e:
+            self.logger.error(f"AppCore: Failed to reload device {name}:")
+            self.logger.exception(e)
+        finally:
+            self.program_manager.resources.release(holder)
+
+        await self.fire_control_changed_event()
 
     async def update_status_and_fire_event(self):
         status = await self.acquire_status()
         await self._fire_event('status_available', {'status': status})
 
-    async def fire_control_changed_event(self):
-        await self._fire_event('control_changed', {})
-
     async def acquire_status(self):
         name_list = []
         dev_list = []
@@ -225,7 +457,11 @@ class TemperatureAppCore:
             name_list.append(name)
             dev_list.append(dev)
 
-        device_status_list = await asyncio.gather(*[self.gather_dev_status(dev) for dev in dev_list])
+        if self.worker_pool:
+            # the readings are already in shared memory, no need for a thread per device
+            device_status_list = [self.read_dev_status(dev) for dev in dev_list]
+        else:
+            device_status_list = await asyncio.gather(*[self.gather_dev_status(dev) for dev in dev_list])
 
         status = {name: status for name, status in zip(name_list, device_status_list)}
         self.last_status = status
@@ -240,20 +476,11 @@ class TemperatureAppCore:
             status = await self.acquire_status()
         await self._return_ok(callback, {'status': status})
 
-    async def _return_error(self, callback, error_msg):
-        if callback:
-            await callback({"result": "error", "error_msg": error_msg})
-
-    async def _return_ok(self, callback, message=None):
-        if callback:
-            result = {"result": "ok"}
-            if message:
-                result.update(message)
-
-            await callback(result)
-
     @async_wrap
     def gather_dev_status(self, dev):
+        return self.read_dev_status(dev)
+
+    def read_dev_status(self, dev):
         current_action = self.program_manager.current_dev_action[dev.name].name \
             if dev.name in self.program_manager.current_dev_action else ""
 
@@ -261,13 +488,23 @@ class TemperatureAppCore:
             if dev.name in self.program_manager.current_dev_program else ""
 
         try:
+            if isinstance(dev, RemoteDevice):
+                reading = dev.reading()
+                temperature, acquired = reading.temperature, reading.time
+                control_enabled, setpoint = reading.control_enabled, reading.setpoint
+            else:
+                temperature, acquired = dev.temperature, time.time()
+                control_enabled, setpoint = dev.control_enabled, dev.setpoint
+
             return {
                 'name': dev.name,
-                'temperature': dev.temperature,
-                'control_enabled': dev.control_enabled,
+                'temperature': temperature,
+                'time': acquired,  # acquisition time of the temperature reading
+                'control_enabled': control_enabled,
                 'current_program': current_program,
                 'current_action': current_action,
-                'setpoint': dev.setpoint,
+                'setpoint': setpoint,
+                'settle_eta': self.program_manager.settle_eta(dev.name),  # seconds until a CHANGE settles
                 'status': 'ok'
             }
         except Exception as e:
@@ -293,10 +530,17 @@ class TemperatureAppCore:
         self.logger.debug(f"AppCore: Received event: run_predefined_program.")
         if event["program"] not in self.programs:
             await self._return_error(callback, "Unknown program.")
+            return
 
         program = self.programs[event["program"]]
+        try:
+            program.compile(self.dev_instances.keys())
+            self.program_manager.create_program_task(program, queue=bool(event.get('queue', False)),
+                                                     priority=int(event.get('priority', 0)))
+        except (ProgramCompileError, TemperatureProgramException, TypeError, ValueError) as e:
+            await self._return_error(callback, str(e))
+            return
 
-        self.program_manager.create_program_task(program)
         await self._return_ok(callback)
 
     async def on_abort_program_event(self, event, callback):
@@ -307,17 +551,34 @@ class TemperatureAppCore:
     async def on_current_programs_event(self, event, callback):
         self.logger.debug(f"AppCore: Received event: current_program.")
         programs = self.program_manager.current_programs
-        await self._return_ok(callback, {'current_programs':
-                                             [program.name for program in programs] })
+        queue = self.program_manager.resources.queue()
+        await self._return_ok(callback, {
+            'current_programs': list(programs.keys()),
+            'queued_programs': [
+                {'name': job.name, 'priority': job.priority, 'devices': list(job.devices)} for job in queue
+            ]
+        })
 
     async def on_list_program_event(self, event, callback):
         self.logger.debug(f"AppCore: Received event: list_program.")
-        await self._return_ok(callback, {'programs': [
-            {
+        temperatures = {name: status['temperature'] for name, status in self.last_status.items()
+                        if 'temperature' in status}
+
+        programs = []
+        for program in self.programs.values():
+            program_info = {
                 'name': program.name,
                 'description': program.description
-            } for program in self.programs.values()
-        ]})
+            }
+            try:
+                plan = program.compile(self.dev_instances.keys())
+                program_info['estimated_duration'] = plan.estimate_duration(temperatures)
+            except ProgramCompileError as e:
+                program_info['error'] = str(e)
+
+            programs.append(program_info)
+
+        await self._return_ok(callback, {'programs': programs})
 
     async def on_fetch_history_event(self, event, callback):
         self.logger.debug(f"AppCore: Received event: fetch_history.")
@@ -360,15 +621,61 @@ class TemperatureAppCore:
         try:
             program = Program.from_dict(event)
             self.logger.debug(f"AppCore: Program: {program.to_dict()}")
+            program.compile(self.dev_instances.keys())
         except (KeyError, TypeError) as e:
             await self._return_error(callback, f"Syntax error in program {event['name']}: {str(e)}")
             return
+        except ProgramCompileError as e:
+            await self._return_error(callback, str(e))
+            return
+
+        try:
+            self.program_manager.create_program_task(program, queue=bool(event.get('queue', False)),
+                                                     priority=int(event.get('priority', 0)))
+        except (TemperatureProgramException, TypeError, ValueError) as e:
+            await self._return_error(callback, str(e))
+            return
 
-        self.program_manager.create_program_task(program)
         await self._return_ok(callback, {'name': event['name']})
         await self.update_status_and_fire_event()
         await self.fire_control_changed_event()
 
+    async def on_simulate_program_event(self, event, callback):
+        self.logger.debug(f"AppCore: Received event: simulate_program.")
+
+        try:
+            if 'steps' in event:
+                program = Program.from_dict({
+                    'name': event.get('name', 'Simulation'),
+                    'description': event.get('description', ''),
+                    'steps': event['steps']
+                })
+            elif event.get('program') in self.programs:
+                program = self.programs[event['program']]
+            else:
+                await self._return_error(callback, "Unknown program.")
+                return
+
+            program.compile(self.dev_instances.keys())
+        except (KeyError, TypeError) as e:
+            await self._return_error(callback, f"Syntax error in program: {str(e)}")
+            return
+        except ProgramCompileError as e:
+            await self._return_error(callback, str(e))
+            return
+
+        temperatures = {name: status['temperature'] for name, status in self.last_status.items()
+                        if 'temperature' in status}
+
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(
+                None, partial(simulate_program, self.config, program, temperatures,
+                              sample_interval=event.get('sample_interval', None)))
+        except ValueError as e:
+            await self._return_error(callback, str(e))
+            return
+        await self._return_ok(callback, {'simulation': result})
+
     async def on_edit_program_event(self, event, callback):
         self.logger.debug(f"AppCore: Received event: edit_program.")
         if 'name' not in event:
@@ -379,22 +686,158 @@ class TemperatureAppCore:
             program = Program.from_dict(event)
             self.programs[program.name] = program
 
-            program_list = [program.to_dict() for program in self.programs]
+            program_list = [program.to_dict() for program in self.programs.values()]
             self.config.set('programs', value=program_list)
-            self.config.write()
+            self.config.schedule_write(self.on_config_write_error)
         except (KeyError, TypeError) as e:
             await self._return_error(callback, f"Syntax error in program {event['name']}: {str(e)}")
             return
 
+        await self._return_ok(callback)
+
+    async def recover_programs(self):
+        """
+        Deal with the programs that were running when the app stopped, according to `on_restart`:
+        `resume` them, run the `safe_state_program` (or put their devices into standby) for
+        `safe_state`, or keep them for the user to decide on (`ask`).
+        """
+        interrupted = list(self.checkpoint.interrupted.values())
+        if not interrupted:
+            return
+
+        names = ", ".join(state['name'] for state in interrupted)
+        on_restart = self.config.get('on_restart', default='ask')
+
+        if on_restart == 'resume':
+            for state in interrupted:
+                self.logger.warning(f"AppCore: Resuming program {state['name']} from step {state['step']}.")
+                self.checkpoint.interrupted.pop(state['name'])
+                try:
+                    self.program_manager.resume_program(state)
+                except TemperatureProgramException as e:
+                    await self.fire_program_error(e)
+        elif on_restart == 'safe_state':
+            self.logger.warning(f"AppCore: Programs {names} were interrupted, going to the safe state.")
+            devices = set()
+            for state in interrupted:
+                self.checkpoint.discard(state['name'])
+                devices.update(step['device'] for steps in state['definition']['steps'] for step in steps
+                               if step.get('device') in self.dev_instances)
+
+            safe_state_program = self.config.get('safe_state_program', default=None)
+            if safe_state_program in self.programs:
+                try:
+                    self.program_manager.create_program_task(self.programs[safe_state_program], queue=True)
+                except TemperatureProgramException as e:
+                    await self.fire_program_error(e)
+            else:
+                for dev in devices:
+                    await self.program_manager.set_device(self.dev_instances[dev], 'control_enabled', False)
+        else:
+            await self.fire_program_error(f"Programs {names} were interrupted by a restart. "
+                                          f"Resume or discard them.")
+
+    async def on_list_interrupted_programs_event(self, event, callback):
+        self.logger.debug(f"AppCore: Received event: list_interrupted_programs.")
+        await self._return_ok(callback, {'programs': [
+            {
+                'name': state['name'],
+                'step': state['step'],
+                'loops': state['loops'],
+                'ramps': state['ramps'],
+                'step_time': state['step_time'],
+                'time': state['time']
+            } for state in self.checkpoint.interrupted.values()
+        ]})
+
+    async def on_resume_program_event(self, event, callback):
+        self.logger.debug(f"AppCore: Received event: resume_program.")
+        state = self.checkpoint.interrupted.get(event.get('program'))
+        if not state:
+            await self._return_error(callback, "No interrupted program with this name.")
+            return
+
+        try:
+            Program.from_dict(state['definition']).compile(self.dev_instances.keys())
+        except (KeyError, TypeError, ProgramCompileError) as e:
+            await self._return_error(callback, f"Cannot resume program {state['name']}: {str(e)}")
+            return
+
+        try:
+            self.program_manager.resume_program(state)
+        except TemperatureProgramException as e:
+            await self._return_error(callback, str(e))
+            return
+
+        self.checkpoint.interrupted.pop(state['name'])
+        await self._return_ok(callback)
+
+    async def on_discard_checkpoint_event(self, event, callback):
+        self.logger.debug(f"AppCore: Received event: discard_checkpoint.")
+        if event.get('program') not in self.checkpoint.interrupted:
+            await self._return_error(callback, "No interrupted program with this name.")
+            return
+
+        self.checkpoint.discard(event['program'])
+        await self._return_ok(callback)
+
     async def on_standby_device_event(self, event, callback):
         self.logger.debug(f"AppCore: Received event: standby_device.")
         try:
             device = self.dev_instances[event['device']]
-            device.control_enabled = False
+            await self.program_manager.set_device(device, 'control_enabled', False)
             await self.update_status_and_fire_event()
             await self._return_ok(callback)
         except (KeyError, TypeError) as e:
             await self._return_error(callback, e)
 
+    @async_wrap
+    def _run_profiler(self, duration, interval, trace_memory):
+        return SamplingProfiler(interval, trace_memory).run(duration)
+
+    async def on_profile_event(self, event, callback):
+        self.logger.debug(f"AppCore: Received event: profile.")
+
+        admin_token = self.config.get('admin_token', default=None)
+        if not admin_token or not hmac.compare_digest(str(event.get('token', '')), str(admin_token)):
+            await self._return_error(callback, "Profiling is disabled or the admin token is invalid.")
+            return
+
+        if self.profiler_running:
+            await self._return_error(callback, "A profiling session is already running.")
+            return
 
+        try:
+            duration = float(event.get('duration', 10))
+            interval = float(event.get('interval', 0.005))
+            if not (math.isfinite(duration) and duration > 0):
+                raise ValueError(f"Invalid profile duration {duration}")
+            if not (math.isfinite(interval) and interval > 0):
+                raise ValueError(f"Invalid profile interval {interval}")
+            duration = min(duration, 300)
+            interval = max(interval, 0.001)
+            trace_memory = bool(event.get('trace_memory', False))
+            output_format = event.get('format', 'collapsed')
+            if output_format not in ['collapsed', 'speedscope']:
+                raise ValueError(f"Unknown profile format {output_format}")
+        except (TypeError, ValueError) as e:
+            await self._return_error(callback, str(e))
+            return
+
+        self.logger.warning(f"AppCore: Profiling the server for {duration} s.")
+        self.profiler_running = True
+        try:
+            profiler = await self._run_profiler(duration, interval, trace_memory)
+        finally:
+            self.profiler_running = False
+
+        result = {
+            'format': output_format,
+            'duration': profiler.duration,
+            'samples': profiler.sample_count,
+            'profile': profiler.collapsed() if output_format == 'collapsed' else profiler.speedscope()
+        }
+        if trace_memory:
+            result['memory'] = profiler.memory_diff
 
+        await self._return_ok(callback, result)
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from logging import Logger
+
+
+class CheckpointLog:
+    """
+    Append-only log of where each running program is, so that it can be resumed after a crash
+    or restart.
+
+    Every record is one JSON line: `start` (with the program definition), `step` (step index, loop
+    counters), `ramp` (last setpoint written by a ramp), `progress` (only the time, so that a soak
+    resumes for the time it had left) and `end`. Records are buffered and written
+    by a background job every `flush_interval` seconds with a single fsync. Once the log has more
+    than `compact_after` records, it is rewritten to one `state` record per running program.
+    """
+
+    def __init__(self, path, logger: Logger, flush_interval=1.0, compact_after=1000, clock=time.time):
+        self.path = path
+        self.logger = logger
+        self.clock = clock
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+
+        self.programs = {}
+        self.buffer = []
+        self.record_count = 0
+
+        self._flush_handle = None
+        self._flushing = False
+        self._file_lock = threading.Lock()
+
+        self.interrupted = self._load()
+        self.programs = dict(self.interrupted)
+
+    @staticmethod
+    def create_from_config(config, logger):
+        path = config.get('checkpoint_file', default=None)
+        if path is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(config.path)), "program_checkpoint.log")
+        return CheckpointLog(path, logger)
+
+    def _apply(self, record):
+        name = record['program']
+        kind = record['type']
+
+        if kind == 'start':
+            self.programs[name] = {
+                'name': name, 'definition': record['definition'], 'step': 0, 'loops': [],
+                'step_time': record['time'], 'ramps': {}, 'time': record['time']
+            }
+        elif kind == 'state':
+            self.programs[name] = record['state']
+        elif kind == 'end':
+            self.programs.pop(name, None)
+        elif name in self.programs:
+            state = self.programs[name]
+            state['time'] = record['time']
+            if kind == 'step':
+                state['step'] = record['step']
+                state['loops'] = record['loops']
+                state['step_time'] = record['time'] - record.get('elapsed', 0)  # resumed in the step
+                state['ramps'] = {}
+            elif kind == 'ramp':
+                state['ramps'][record['device']] = record['setpoint']
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    # a record cut off by a crash
+                    self.logger.warning(f"Checkpoint: Skipping malformed record in {self.path}.")
+
+        return self.programs
+
+    def _record(self, record, delay=None):
+        record['time'] = self.clock()
+        self._apply(record)
+        self.buffer.append(json.dumps(record))
+
+        delay = self.flush_interval if delay is None else delay
+        if self._flush_handle is not None and delay < self.flush_interval:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_handle is None and not self._flushing:
+            self._flush_handle = asyncio.get_event_loop().call_later(delay, self._start_flush)
+
+    def start(self, program_dict):
+        self._record({'type': 'start', 'program': program_dict['name'], 'definition': program_dict})
+
+    def step(self, program_name, step, loop_counters, elapsed=0):
+        record = {'type': 'step', 'program': program_name, 'step': step, 'loops': list(loop_counters)}
+        if elapsed:
+            record['elapsed'] = elapsed
+        self._record(record)
+
+    def progress(self, program_name):
+        self._record({'type': 'progress', 'program': program_name})
+
+    def ramp(self, program_name, device, setpoint):
+        self._record({'type': 'ramp', 'program': program_name, 'device': device, 'setpoint': setpoint})
+
+    def end(self, program_name):
+        self.interrupted.pop(program_name, None)
+        self._record({'type': 'end', 'program': program_name}, delay=0)
+
+    def discard(self, program_name):
+        if program_name in self.interrupted:
+            self.end(program_name)
+
+    def _write(self, lines, compact):
+        with self._file_lock:
+            if compact:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.writelines(line + "\n" for line in lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            else:
+                with open(self.path, "a") as f:
+                    f.writelines(line + "\n" for line in lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flushing = True
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        try:
+            lines, self.buffer = self.buffer, []
+            self.record_count += len(lines)
+            compact = self.record_count > self.compact_after
+            if compact:
+                lines = [json.dumps({'type': 'state', 'program': name, 'state': state, 'time': state['time']})
+                         for name, state in self.programs.items()]
+                self.record_count = len(lines)
+
+            if lines or compact:
+                await asyncio.get_event_loop().run_in_executor(None, self._write, lines, compact)
+        except OSError as e:
+            self.logger.error(f"Checkpoint: Failed to write {self.path}:")
+            self.logger.exception(e)
+        finally:
+            self._flushing = False
+            if self.buffer and self._flush_handle is None:
+                self._flush_handle = asyncio.get_event_loop().call_later(self.flush_interval, self._start_flush)
@@ -0,0 +1,171 @@
+"""
+Export of the temperature history over HTTP, see `export_handler`.
+
+The samples are read from the history a chunk at a time and encoded as they are sent, so the
+memory used doesn't depend on the size of the range. Parquet and Arrow need pyarrow.
+"""
+import io
+import csv
+import datetime
+from urllib.parse import urlsplit, parse_qs
+
+from temperature_web_control.server.app_core import TemperatureHistory
+
+CSV_CHUNK = 4096
+COLUMNAR_CHUNK = 65536  # rows per record batch / row group
+
+FORMATS = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportError(Exception):
+    pass
+
+
+def parse_time(value):
+    """
+    Unix time, or an ISO 8601 date/time (UTC unless it has an offset).
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"Invalid time {value}, expected a Unix time or an ISO 8601 date.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def iter_samples(history: TemperatureHistory, devices, start, end, chunk_size):
+    for device in devices:
+        for times, temperatures in history.iter_range(device, start, end, chunk_size):
+            yield device, times, temperatures
+
+
+def export_csv(history, devices, start, end):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['device', 'time', 'temperature'])
+    for device, times, temperatures in iter_samples(history, devices, start, end, CSV_CHUNK):
+        writer.writerows(zip([device] * len(times), times, ['' if t is None else t for t in temperatures]))
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _Pipe(io.RawIOBase):
+    """
+    Write-only file for the pyarrow writers, whose output is taken out after every write.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _record_batches(history, devices, start, end):
+    import pyarrow as pa
+
+    schema = pa.schema([('device', pa.string()),
+                        ('time', pa.timestamp('us', tz='UTC')),
+                        ('temperature', pa.float64())])
+    batches = (pa.record_batch([pa.array([device] * len(times), pa.string()),
+                                pa.array([round(t * 1e6) for t in times], pa.timestamp('us', tz='UTC')),
+                                pa.array(temperatures, pa.float64())], schema=schema)
+               for device, times, temperatures in iter_samples(history, devices, start, end, COLUMNAR_CHUNK))
+    return schema, batches
+
+
+def export_arrow(history, devices, start, end):
+    import pyarrow as pa
+
+    schema, batches = _record_batches(history, devices, start, end)
+    pipe = _Pipe()
+    with pa.ipc.new_stream(pipe, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield pipe.take()
+    yield pipe.take()
+
+
+def export_parquet(history, devices, start, end):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema, batches = _record_batches(history, devices, start, end)
+    pipe = _Pipe()
+    with pq.ParquetWriter(pipe, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_batches([batch]))
+            yield pipe.take()
+    yield pipe.take()
+
+
+EXPORTERS = {'csv': export_csv, 'arrow': export_arrow, 'parquet': export_parquet}
+
+
+def export_handler(get_history):
+    """
+    Handler of `GET /export?device=...&start=...&end=...&format=csv|parquet|arrow` for `serve_http`.
+
+    `device` can be repeated and defaults to all devices, `start` and `end` are Unix times or ISO
+    dates and default to the whole history. `get_history` returns the TemperatureHistory to read.
+    """
+
+    def handler(request):
+        query = parse_qs(urlsplit(request.path).query)
+        history = get_history()
+        try:
+            fmt = query.get('format', ['csv'])[0]
+            if fmt not in EXPORTERS:
+                raise ExportError(f"Unknown format {fmt}, expected one of {', '.join(EXPORTERS)}.")
+            if fmt != 'csv':
+                try:
+                    import pyarrow
+                except ImportError:
+                    raise ExportError(f"The {fmt} format needs pyarrow, which is not installed.")
+
+            devices = query.get('device', list(history.times))
+            unknown = [device for device in devices if device not in history.times]
+            if unknown:
+                raise ExportError(f"Unknown device {', '.join(unknown)}.")
+
+            start = parse_time(query.get('start', [None])[0])
+            end = parse_time(query.get('end', [None])[0])
+        except ExportError as e:
+            return 400, 'text/plain', str(e)
+
+        filename = f"temperature_history.{fmt}"
+        return 200, FORMATS[fmt], EXPORTERS[fmt](history, devices, start, end), \
+            {'Content-Disposition': f'attachment; filename="{filename}"'}
+
+    return handler
@@ -1,10 +1,23 @@
+import zlib
 from logging import Logger
-from socketserver import TCPServer
+from socketserver import ThreadingTCPServer
 from http.server import SimpleHTTPRequestHandler
+from urllib.parse import urlsplit
 
 
+class HTTPServer(ThreadingTCPServer):
+    # long downloads, like history exports, must not hold back the web app
+    daemon_threads = True
+    allow_reuse_address = True
+
 
 def serve_http(bind_addr, port, _directory, get_handler, logger: Logger):
+    """
+    Serve the web app from `_directory`, and `get_handler`, a dict from path to handler. A
+    handler is called with the request and returns (status code, content type, body[, headers]);
+    the body is either a string or an iterable of bytes, which is sent as it is produced, in
+    chunks, and gzip compressed if the client accepts it.
+    """
     get_request_handler = {}
 
     class HTTPRequestHandler(SimpleHTTPRequestHandler):
@@ -12,19 +25,72 @@ def serve_http(bind_addr, port, _directory, get_handler, logger: Logger):
             super().__init__(request, client_address, server, directory=_directory)
 
         def do_GET(self):
-            request_path = self.path
+            request_path = urlsplit(self.path).path
             if request_path in get_request_handler:
-                resp_code, type, resp = get_request_handler[request_path](self)
+                resp_code, type, resp, *headers = get_request_handler[request_path](self)
+                if not isinstance(resp, str):
+                    self.send_stream(resp_code, type, resp, headers[0] if headers else {})
+                    return
+
                 self.send_response(resp_code)
                 self.send_header('Content-type', type)
+                for key, value in (headers[0] if headers else {}).items():
+                    self.send_header(key, value)
                 self.end_headers()
                 self.wfile.write(resp.encode("utf-8"))
             else:
                 super().do_GET()
 
+        def send_stream(self, resp_code, type, parts, headers):
+            gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            chunked = self.request_version == 'HTTP/1.1'
+            if chunked:
+                self.protocol_version = 'HTTP/1.1'
+
+            self.send_response(resp_code)
+            self.send_header('Content-type', type)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            if gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            # without a length, HTTP/1.0 clients read until the connection is closed
+            self.send_header('Connection', 'close')
+            self.end_headers()
+
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+
+            def write(data):
+                if compressor:
+                    data = compressor.compress(data)
+                if not data:
+                    return
+                if chunked:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                else:
+                    self.wfile.write(data)
+
+            try:
+                for part in parts:
+                    write(part)
+                if compressor:
+                    data = compressor.flush()
+                    compressor = None
+                    write(data)
+                if chunked:
+                    self.wfile.write(b"0\r\n\r\n")
+            except OSError as e:
+                logger.info(f"HTTP server: Client {self.client_address[0]} left during a download: {e}")
+            finally:
+                close = getattr(parts, 'close', None)
+                if close:
+                    close()
+            self.close_connection = True
+
     if get_handler:
         get_request_handler = get_handler
-    with TCPServer((bind_addr, port), HTTPRequestHandler) as httpd:
+    with HTTPServer((bind_addr, port), HTTPRequestHandler) as httpd:
         logger.info(f"Start HTTP server at {bind_addr}:{port}.")
         try:
             httpd.serve_forever()
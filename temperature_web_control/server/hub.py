@@ -0,0 +1,270 @@
+import asyncio
+from logging import Logger
+
+from temperature_web_control.server.app_core import EventBus, TemperatureHistory
+from temperature_web_control.server.upstream import UpstreamConnection, UpstreamError
+from temperature_web_control.utils import Config
+
+
+def split_name(name):
+    """
+    Split a namespaced `instance/name` into its two parts.
+    """
+    if not isinstance(name, str) or '/' not in name:
+        raise ValueError(f"{name} is not of the form instance/name.")
+    instance, local_name = name.split('/', 1)
+    return instance, local_name
+
+
+class FederationHub(EventBus):
+    """
+    Merges several instances of the app into one. The hub keeps a single connection (and so a
+    single set of subscriptions) per instance, no matter how many clients it serves, and exposes
+    the devices and programs of the instances as `instance/name`.
+
+    Status updates of the instances are merged and broadcast at most once per `merge_delay`
+    seconds. Commands are sent to the instance owning the device or program they refer to.
+    """
+
+    def __init__(self, config: Config, logger: Logger, instances, merge_delay=0.5):
+        super().__init__(logger, ['status_available', 'control_changed', 'program_error'])
+        self.config = config
+        self.merge_delay = merge_delay
+
+        self.upstreams = {}
+        for instance in instances:
+            if '/' in instance['name']:
+                raise ValueError(f"Instance name {instance['name']} cannot contain '/'.")
+            self.upstreams[instance['name']] = UpstreamConnection(
+                instance['name'], instance['url'], logger, self.on_upstream_event,
+                self.on_upstream_connected, self.on_upstream_disconnected)
+
+        self.instance_status = {name: {} for name in self.upstreams}
+        self.last_status = {}
+        self.history = TemperatureHistory(config.get('history_length', default=1000), [])
+
+        self._broadcast_handle = None
+
+    @staticmethod
+    def create_from_config(config, logger):
+        return FederationHub(config, logger, config.get('instances', default=[]),
+                             config.get('hub_merge_delay', default=0.5))
+
+    def start(self):
+        for upstream in self.upstreams.values():
+            upstream.start()
+
+    async def close(self):
+        await asyncio.gather(*[upstream.close() for upstream in self.upstreams.values()])
+
+    def get_event_handlers(self):
+        return {
+            'request_status': self.on_request_status_event,
+            'fetch_history': self.on_fetch_history_event,
+            'list_actions': self.on_list_actions_event,
+            'list_programs': self.on_list_programs_event,
+            'current_programs': self.on_current_programs_event,
+            'list_interrupted_programs': self.on_list_interrupted_programs_event,
+            'run_predefined_program': self._forward_by('program'),
+            'abort_program': self._forward_by('program'),
+            'resume_program': self._forward_by('program'),
+            'discard_checkpoint': self._forward_by('program'),
+            'edit_program': self._forward_by('name'),
+            'standby_device': self._forward_by('device'),
+            'run_program': self.on_program_steps_event,
+            'simulate_program': self.on_program_steps_event,
+        }
+
+    # ==== Events from the instances ====
+
+    def on_upstream_event(self, upstream, message):
+        event = message.get('event')
+        if event == 'status_available':
+            self._update_status(upstream.name, message.get('status', {}))
+        elif event == 'control_changed':
+            asyncio.ensure_future(self.fire_control_changed_event())
+        elif event == 'program_error':
+            asyncio.ensure_future(self.fire_program_error(f"{upstream.name}: {message.get('error')}"))
+
+    async def on_upstream_connected(self, upstream):
+        try:
+            reply = await upstream.request({'event': 'fetch_history'})
+        except UpstreamError as e:
+            self.logger.warning(f"Hub: Cannot fetch the history of {upstream.name}: {e}")
+        else:
+            for dev, data in reply.get('data', {}).items():
+                self.history.load(f"{upstream.name}/{dev}", data['time'], data['temperature'])
+
+        await self.fire_control_changed_event()
+
+    async def on_upstream_disconnected(self, upstream):
+        self.instance_status[upstream.name] = {
+            name: {'name': name, 'status': 'error', 'error_msg': f"Lost connection to {upstream.name}."}
+            for name in self.instance_status[upstream.name]
+        }
+        self._schedule_broadcast()
+        await self.fire_control_changed_event()
+
+    def _update_status(self, instance, status):
+        namespaced = {}
+        for dev, dev_status in status.items():
+            name = f"{instance}/{dev}"
+            dev_status = dict(dev_status)
+            if 'name' in dev_status:
+                dev_status['name'] = name
+            if dev_status.get('current_program'):
+                dev_status['current_program'] = f"{instance}/{dev_status['current_program']}"
+            namespaced[name] = dev_status
+
+            if name not in self.history.times:
+                self.history.add_device(name)
+
+        self.instance_status[instance] = namespaced
+        asyncio.ensure_future(self.history.status_update_handler(None, {'status': namespaced}))
+        self._schedule_broadcast()
+
+    def _merged_status(self):
+        return {name: dev_status for status in self.instance_status.values() for name, dev_status in status.items()}
+
+    def _schedule_broadcast(self):
+        if self._broadcast_handle is None:
+            self._broadcast_handle = asyncio.get_event_loop().call_later(self.merge_delay, self._broadcast)
+
+    def _broadcast(self):
+        self._broadcast_handle = None
+        self.last_status = self._merged_status()
+        asyncio.ensure_future(self._fire_event('status_available', {'status': self.last_status}))
+
+    # ==== Requests of the clients ====
+
+    @staticmethod
+    def _message(event, **changes):
+        # drop the keys added by the websocket server, like the client connection
+        message = {key: value for key, value in event.items() if not key.startswith('_')}
+        message.update(changes)
+        return message
+
+    async def _request(self, instance, message):
+        if instance not in self.upstreams:
+            raise UpstreamError(f"Unknown instance {instance}.")
+
+        reply = await self.upstreams[instance].request(message)
+        reply.pop('event', None)
+        return reply
+
+    async def _request_all(self, event):
+        """
+        Send `event` to every connected instance, returns a dict from instance to its reply.
+        """
+        names = [name for name, upstream in self.upstreams.items() if upstream.connected]
+        replies = await asyncio.gather(*[self._request(name, {'event': event}) for name in names],
+                                       return_exceptions=True)
+        return {name: reply for name, reply in zip(names, replies)
+                if not isinstance(reply, Exception) and reply.get('result') == 'ok'}
+
+    async def _forward(self, instance, message, callback):
+        try:
+            reply = await self._request(instance, message)
+        except UpstreamError as e:
+            await self._return_error(callback, str(e))
+            return
+
+        if callback:
+            await callback(reply)
+
+    def _forward_by(self, key):
+        async def forward(event, callback):
+            try:
+                instance, name = split_name(event.get(key))
+            except ValueError as e:
+                await self._return_error(callback, str(e))
+                return
+
+            await self._forward(instance, self._message(event, **{key: name}), callback)
+
+        return forward
+
+    async def on_request_status_event(self, event, callback):
+        await self._return_ok(callback, {'status': self._merged_status()})
+
+    async def on_fetch_history_event(self, event, callback):
+        await self._return_ok(callback, {'data': self.history.dump_data()})
+
+    async def on_list_actions_event(self, event, callback):
+        # all instances run the same code, any of them can answer
+        for name, upstream in self.upstreams.items():
+            if upstream.connected:
+                await self._forward(name, self._message(event), callback)
+                return
+
+        await self._return_error(callback, "No instance is connected.")
+
+    async def on_list_programs_event(self, event, callback):
+        programs = []
+        for instance, reply in (await self._request_all('list_programs')).items():
+            for program in reply.get('programs', []):
+                programs.append(dict(program, name=f"{instance}/{program['name']}"))
+
+        await self._return_ok(callback, {'programs': programs})
+
+    async def on_current_programs_event(self, event, callback):
+        current, queued = [], []
+        for instance, reply in (await self._request_all('current_programs')).items():
+            current += [f"{instance}/{name}" for name in reply.get('current_programs', [])]
+            queued += [dict(job, name=f"{instance}/{job['name']}",
+                            devices=[f"{instance}/{dev}" for dev in job['devices']])
+                       for job in reply.get('queued_programs', [])]
+
+        await self._return_ok(callback, {'current_programs': current, 'queued_programs': queued})
+
+    async def on_list_interrupted_programs_event(self, event, callback):
+        programs = []
+        for instance, reply in (await self._request_all('list_interrupted_programs')).items():
+            programs += [dict(state, name=f"{instance}/{state['name']}") for state in reply.get('programs', [])]
+
+        await self._return_ok(callback, {'programs': programs})
+
+    async def on_program_steps_event(self, event, callback):
+        """
+        `run_program` and `simulate_program`: a stored program is forwarded by its name, and an
+        ad-hoc one to the instance owning all of its devices.
+        """
+        if 'steps' not in event:
+            await self._forward_by('program')(event, callback)
+            return
+
+        try:
+            instances = set()
+            steps = []
+            for step in event['steps']:
+                actions = []
+                for action in step:
+                    if 'device' in action:
+                        instance, device = split_name(action['device'])
+                        instances.add(instance)
+                        action = dict(action, device=device)
+                    actions.append(action)
+                steps.append(actions)
+        except (TypeError, ValueError) as e:
+            await self._return_error(callback, f"Malformed program: {e}")
+            return
+
+        if len(instances) != 1:
+            await self._return_error(callback, "A program has to use the devices of exactly one instance.")
+            return
+
+        instance = instances.pop()
+        changes = {'steps': steps}
+        if isinstance(event.get('name'), str) and event['name'].startswith(f"{instance}/"):
+            changes['name'] = event['name'][len(instance) + 1:]
+
+        try:
+            reply = await self._request(instance, self._message(event, **changes))
+        except UpstreamError as e:
+            await self._return_error(callback, str(e))
+            return
+
+        if 'name' in reply:
+            reply['name'] = f"{instance}/{reply['name']}"
+        if callback:
+            await callback(reply)
@@ -0,0 +1,411 @@
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+from logging import Logger
+
+from temperature_web_control.driver import load_driver
+from temperature_web_control.model.temperature_monitor import TemperatureMonitor
+from temperature_web_control.server.status_table import StatusTable
+
+SPARE_SLOTS = 16  # for devices added by a config reload
+CALL_TIMEOUT = 30  # seconds
+
+
+class WorkerError(Exception):
+    pass
+
+
+class WorkerTimeout(WorkerError):
+    pass
+
+
+# ==== Worker process ====
+
+def _describe(dev):
+    try:
+        other_options = list(dev.other_options)
+    except NotImplementedError:
+        other_options = []
+
+    return {
+        'name': dev.name,
+        'controllable': dev.controllable,
+        'supports_native_ramp': dev.supports_native_ramp,
+        'max_native_ramp_minutes': dev.max_native_ramp_minutes,
+        'bus': dev.bus,
+        'other_options': other_options
+    }
+
+
+def _poll(table, slot, dev):
+    try:
+        temperature = dev.temperature
+        control_enabled = dev.control_enabled
+        setpoint = dev.setpoint
+        table.write(slot, time.time(), temperature, setpoint, control_enabled)
+    except Exception as e:
+        table.write_error(slot, time.time(), str(e))
+
+
+def _handle(command, devices, table, logger):
+    kind = command[0]
+    if kind == 'load':
+        slot, config_dict = command[1:]
+        dev = load_driver(config_dict, logger)
+        if dev is None:
+            raise ValueError(f"unknown device type {config_dict.get('dev_type')}")
+        devices[dev.name] = slot, dev
+        _poll(table, slot, dev)
+        return _describe(dev)
+
+    if kind == 'unload':
+        slot, _ = devices.pop(command[1])
+        table.clear(slot)
+        return None
+
+    if kind == 'drop':
+        # the main process gave up on whatever is in this slot, e.g. a load that timed out
+        slot = command[1]
+        for name, (dev_slot, _) in list(devices.items()):
+            if dev_slot == slot:
+                del devices[name]
+        table.clear(slot)
+        return None
+
+    slot, dev = devices[command[1]]
+    if kind == 'set':
+        setattr(dev, command[2], command[3])
+        result = None
+    elif kind == 'call':
+        result = getattr(dev, command[2])(*command[3])
+    else:
+        raise ValueError(f"unknown command {kind}")
+
+    _poll(table, slot, dev)  # publish the effect right away
+    return result
+
+
+def worker_main(index, table_name, slots, conn, interval, log_level):
+    """
+    Entry point of a worker process: polls its devices every `interval` seconds into the status
+    table and serves the commands sent by the main process in between.
+    """
+    logger = logging.getLogger(f"temperature_app.worker{index}")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(f'[%(asctime)s %(levelname)s] Worker {index}: %(message)s',
+                                           "%b %d %H:%M:%S"))
+    logger.addHandler(handler)
+    logger.setLevel(log_level)
+
+    table = StatusTable.attach(table_name, slots)
+    devices = {}
+    next_poll = time.monotonic()
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= next_poll:
+                for slot, dev in devices.values():
+                    _poll(table, slot, dev)
+                next_poll = max(next_poll + interval, now)
+                continue
+
+            if not conn.poll(next_poll - now):
+                continue
+
+            try:
+                request_id, command = conn.recv()
+            except EOFError:
+                break  # the main process is gone
+            if command[0] == 'stop':
+                break
+
+            try:
+                conn.send((request_id, 'ok', _handle(command, devices, table, logger)))
+            except Exception as e:
+                conn.send((request_id, 'error', str(e)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        table.close()
+
+
+# ==== Main process ====
+
+class PollingWorker:
+    def __init__(self, index, context, table: StatusTable, interval, logger: Logger):
+        self.index = index
+        self.table = table
+        self.logger = logger
+        self.device_count = 0
+
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main, name=f"polling-worker-{index}", daemon=True,
+            args=(index, table.name, table.slots, child_conn, interval, logger.getEffectiveLevel()))
+        self.process.start()
+        child_conn.close()
+
+        self.lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self.replies = {}  # request id -> (result, value), received while waiting for another one
+        self.abandoned = set()  # ids of the requests that timed out
+
+    def _send(self, *command):
+        if not self.process.is_alive():
+            raise WorkerError(f"Polling worker {self.index} is not running.")
+
+        request_id = next(self._request_ids)
+        self.conn.send((request_id, command))
+        return request_id
+
+    def _collect(self, reply_id, result, value):
+        if reply_id in self.abandoned:
+            self.abandoned.discard(reply_id)  # the answer to a call that timed out
+        else:
+            self.replies[reply_id] = result, value
+
+    def _receive(self, request_id):
+        deadline = time.monotonic() + CALL_TIMEOUT
+        while request_id not in self.replies:
+            if not self.conn.poll(max(0, deadline - time.monotonic())):
+                self.abandoned.add(request_id)
+                raise WorkerTimeout(f"Polling worker {self.index} did not answer in {CALL_TIMEOUT} s.")
+
+            try:
+                self._collect(*self.conn.recv())
+            except EOFError:
+                raise WorkerError(f"Polling worker {self.index} exited.")
+
+        result, value = self.replies.pop(request_id)
+        if result == 'error':
+            raise WorkerError(value)
+        return value
+
+    def answered(self, request_id):
+        """
+        Whether the worker has answered request `request_id`, without waiting. The answer is
+        dropped.
+        """
+        with self.lock:
+            try:
+                while self.conn.poll(0):
+                    self._collect(*self.conn.recv())
+            except (EOFError, OSError):
+                return True  # the worker is gone, and so is the request
+            return self.replies.pop(request_id, None) is not None
+
+    def call(self, *command):
+        """
+        Run `command` in the worker and return its result. Blocks, so call it from an executor.
+        """
+        with self.lock:
+            return self._receive(self._send(*command))
+
+    def stop(self):
+        try:
+            with self.lock:
+                self._send('stop')
+        except (WorkerError, OSError):
+            pass
+
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class RemoteDevice(TemperatureMonitor):
+    """
+    Stands in for a device owned by a polling worker. Readings come from the status table, and
+    everything else is forwarded to the worker.
+    """
+
+    def __init__(self, worker: PollingWorker, slot, description, stale_after):
+        super().__init__(description['name'])
+        self.worker = worker
+        self.slot = slot
+        self.stale_after = stale_after
+        self._description = description
+
+    def reading(self):
+        reading = self.worker.table.read(self.slot)
+        if reading is None:
+            raise WorkerError(f"No reading from {self.name} yet.")
+        if reading.error is not None:
+            raise WorkerError(reading.error)
+        if time.time() - reading.time > self.stale_after:
+            raise WorkerError(f"No reading from {self.name} for {time.time() - reading.time:.0f} s.")
+        return reading
+
+    @property
+    def bus(self):
+        return self.worker.index, self._description['bus']
+
+    @property
+    def temperature(self) -> float:
+        return self.reading().temperature
+
+    @property
+    def controllable(self) -> bool:
+        return self._description['controllable']
+
+    @property
+    def control_enabled(self) -> bool:
+        return self.reading().control_enabled
+
+    @control_enabled.setter
+    def control_enabled(self, value):
+        self.worker.call('set', self.name, 'control_enabled', value)
+
+    @property
+    def setpoint(self):
+        return self.reading().setpoint
+
+    @setpoint.setter
+    def setpoint(self, value):
+        self.worker.call('set', self.name, 'setpoint', value)
+
+    @property
+    def supports_native_ramp(self) -> bool:
+        return self._description['supports_native_ramp']
+
+    @property
+    def max_native_ramp_minutes(self):
+        return self._description['max_native_ramp_minutes']
+
+    def upload_ramp(self, target, duration):
+        self.worker.call('call', self.name, 'upload_ramp', (target, duration))
+
+    def cancel_ramp(self, hold=True):
+        self.worker.call('call', self.name, 'cancel_ramp', (hold,))
+
+    @property
+    def other_options(self):
+        return self._description['other_options']
+
+
+class PollingWorkerPool:
+    """
+    Shards the devices across `workers` processes. Each worker opens the connections to its
+    devices and polls them, so that the protocol I/O of a large installation doesn't compete with
+    the event loop for the GIL. Devices that look like they share a link (same `addr`/`port`) go to
+    the same worker.
+    """
+
+    def __init__(self, workers, interval, logger: Logger, capacity):
+        self.interval = interval
+        self.logger = logger
+
+        context = multiprocessing.get_context('spawn')
+        self.table = StatusTable(capacity)
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.workers = [PollingWorker(i, context, self.table, interval, logger) for i in range(workers)]
+
+        self.links = {}    # link -> worker
+        self.devices = {}  # name -> RemoteDevice
+        self.quarantined = {}  # (worker, id of its drop request) -> slot, reused once the worker dropped it
+
+    @staticmethod
+    def create_from_config(config, logger):
+        workers = config.get('polling_workers', default=0)
+        if not workers:
+            return None
+
+        device_configs = config.get('devices', default=[])
+        pool = PollingWorkerPool(workers, config.get('update_interval', default=5), logger,
+                                 len(device_configs) + SPARE_SLOTS)
+        pool.load_devices(device_configs)
+        return pool
+
+    @staticmethod
+    def _link(config_dict):
+        if 'addr' in config_dict or 'port' in config_dict:
+            return config_dict.get('addr'), config_dict.get('port')
+        return config_dict['name']
+
+    def _assign(self, config_dict):
+        link = self._link(config_dict)
+        if link not in self.links:
+            self.links[link] = min(self.workers, key=lambda worker: worker.device_count)
+
+        worker = self.links[link]
+        worker.device_count += 1
+        return worker
+
+    def _take_slot(self):
+        for (worker, request_id), slot in list(self.quarantined.items()):
+            if not worker.process.is_alive() or worker.answered(request_id):
+                del self.quarantined[(worker, request_id)]
+                self.free_slots.append(slot)
+
+        if not self.free_slots:
+            raise WorkerError("The status table is full, restart the app to add more devices.")
+        return self.free_slots.pop()
+
+    def _add(self, worker, slot, description):
+        dev = RemoteDevice(worker, slot, description, stale_after=max(5 * self.interval, CALL_TIMEOUT))
+        self.devices[dev.name] = dev
+        return dev
+
+    def _release(self, worker, slot, timed_out=False):
+        worker.device_count -= 1
+        if not timed_out:
+            self.free_slots.append(slot)
+            return
+
+        # the worker may still finish the request and poll into the slot: until it confirms
+        # dropping the slot, the slot would have two writers if handed to another device
+        try:
+            with worker.lock:
+                self.quarantined[(worker, worker._send('drop', slot))] = slot
+        except (WorkerError, OSError):
+            self.free_slots.append(slot)  # the worker is gone
+
+    def load_devices(self, device_configs):
+        """
+        Load the devices in their workers, all workers in parallel. Devices that fail to load are
+        logged and left out.
+        """
+        requests = []
+        for config_dict in device_configs:
+            worker = self._assign(config_dict)
+            slot = self._take_slot()
+            with worker.lock:
+                requests.append((config_dict, worker, slot, worker._send('load', slot, config_dict)))
+
+        for config_dict, worker, slot, request_id in requests:
+            try:
+                with worker.lock:
+                    self._add(worker, slot, worker._receive(request_id))
+            except WorkerError as e:
+                self.logger.error(f"Polling workers: Cannot load device {config_dict['name']}: {e}")
+                self._release(worker, slot, timed_out=isinstance(e, WorkerTimeout))
+
+    def load_device(self, config_dict):
+        worker = self._assign(config_dict)
+        slot = self._take_slot()
+        try:
+            return self._add(worker, slot, worker.call('load', slot, config_dict))
+        except WorkerError as e:
+            self._release(worker, slot, timed_out=isinstance(e, WorkerTimeout))
+            raise
+
+    def unload_device(self, name):
+        dev = self.devices.pop(name, None)
+        if dev is None:
+            return
+
+        try:
+            dev.worker.call('unload', name)
+        except WorkerError as e:
+            self.logger.error(f"Polling workers: Cannot unload device {name}: {e}")
+            self._release(dev.worker, dev.slot, timed_out=isinstance(e, WorkerTimeout))
+            return
+        self._release(dev.worker, dev.slot)
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.devices.clear()
+        self.table.close()
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+
+
+class SamplingProfiler:
+    """
+    A minimal statistical profiler for the running process.
+
+    A background thread takes a snapshot of every thread's stack via `sys._current_frames()`
+    every `interval` seconds. The event loop keeps running while being sampled, so this can be
+    attached to a live server without restarting it.
+    """
+
+    def __init__(self, interval=0.005, trace_memory=False, memory_top=20):
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.memory_top = memory_top
+
+        self.samples = Counter()
+        self.sample_count = 0
+        self.duration = 0
+        self.memory_diff = []
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+
+    def _take_sample(self, thread_names, own_ident):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+
+            self.samples[(thread_names.get(ident, str(ident)), tuple(stack))] += 1
+
+    def run(self, duration):
+        """
+        Sample the process for `duration` seconds. Blocks the calling thread, so it should be
+        run in an executor when called from the event loop.
+        """
+        started_tracing = False
+        snapshot = None
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                started_tracing = True
+            snapshot = tracemalloc.take_snapshot()
+
+        own_ident = threading.get_ident()
+        start = time.perf_counter()
+        next_sample = start
+        try:
+            while True:
+                now = time.perf_counter()
+                if now - start >= duration:
+                    break
+
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                self._take_sample(thread_names, own_ident)
+                self.sample_count += 1
+
+                next_sample += self.interval
+                delay = next_sample - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_sample = time.perf_counter()  # fell behind, don't try to catch up
+
+            self.duration = time.perf_counter() - start
+
+            if snapshot is not None:
+                stats = tracemalloc.take_snapshot().compare_to(snapshot, 'traceback')
+                self.memory_diff = [
+                    {
+                        'size_diff': stat.size_diff,
+                        'count_diff': stat.count_diff,
+                        'size': stat.size,
+                        'traceback': [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+                    } for stat in stats[:self.memory_top]
+                ]
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+
+        return self
+
+    def collapsed(self):
+        """
+        Return the samples in the collapsed-stack format understood by flamegraph.pl,
+        speedscope and most other flame graph viewers.
+        """
+        lines = []
+        for (thread_name, stack), count in self.samples.most_common():
+            frames = [thread_name] + [f"{name} ({filename}:{line})" for name, filename, line in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+
+        return "\n".join(lines)
+
+    def speedscope(self, name="temperature-app"):
+        """
+        Return the samples as a speedscope "sampled" profile, one profile per thread.
+        See https://github.com/jlfwong/speedscope/wiki/Importing-from-custom-sources
+        """
+        frame_index = {}
+        frames = []
+        profiles = {}
+
+        for (thread_name, stack), count in self.samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                indices.append(frame_index[frame])
+
+            if thread_name not in profiles:
+                profiles[thread_name] = {
+                    'type': 'sampled',
+                    'name': thread_name,
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': self.duration,
+                    'samples': [],
+                    'weights': []
+                }
+
+            profiles[thread_name]['samples'].append(indices)
+            profiles[thread_name]['weights'].append(count * self.interval)
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'temperature-app',
+            'shared': {'frames': frames},
+            'profiles': list(profiles.values())
+        }
@@ -1,145 +1,195 @@
+import math
+import time
 import asyncio
-from collections import deque
+from functools import partial
 
-from temperature_web_control.model.program import Program
+from temperature_web_control.model.estimators import SettleDetector
+from temperature_web_control.model.program import Program, ProgramCompileError
 from temperature_web_control.model.temperature_monitor import TemperatureMonitor
+from temperature_web_control.server.checkpoint import CheckpointLog
+from temperature_web_control.server.resource_manager import ResourceManager
+from temperature_web_control.server.scheduler import TimerWheel
 from temperature_web_control.utils import Config
 
 
-def float_range(start, stop, step):
-  while start < stop:
-    yield float(start)
-    start += step
-
-
 class TemperatureProgramException(Exception):
     pass
 
 
 class ProgramManager:
-    def __init__(self, config: Config, device_instances, update_state_callback, error_callback, logger):
+    def __init__(self, config: Config, device_instances, update_state_callback, error_callback, logger,
+                 clock=time.time, checkpoint: CheckpointLog = None):
         self.logger = logger
         self.config = config
         self.dev_instances = device_instances
-        self.current_programs = []
+        self.current_programs = {}
         self.current_step = {}
+        self.current_step_index = {}
         self.current_dev_program = {}
         self.current_dev_action = {}
         self.current_program_task = {}
-        self.occupied_devices = []
+        self.resources = ResourceManager()
+        self.wheel = TimerWheel.create_from_config(config, logger)
+        self.settle_detectors = {}
+        self.clock = clock  # time base of the status readings
+        self.checkpoint = checkpoint
+        self.aborted_programs = set()
 
         self.update_state_callback = update_state_callback
         self.error_callback = error_callback
 
+        self.action_runners = {
+            "CHANGE": self.run_change,
+            "LINEAR_RAMP": self.run_linear_ramp,
+            "SOAK": self.run_soak,
+            "STANDBY": self.run_standby,
+        }
+
     def abort_program(self, program_name):
-        try:
-            program = next(filter(lambda p: p.name == program_name, self.current_programs))
-        except StopIteration as e:
+        if self.resources.cancel(program_name):
+            self.logger.info(f"Program: Removed program {program_name} from the queue.")
+            return
+
+        if program_name not in self.current_programs or program_name not in self.current_program_task:
             return
 
         if not self.current_program_task[program_name].cancelled():
+            self.aborted_programs.add(program_name)
             self.current_program_task[program_name].cancel()
             del self.current_program_task[program_name]
 
     def abort_all_programs(self):
-        for program in self.current_programs:
-            program_name = program.name
-            if not self.current_program_task[program_name].cancelled():
-                self.current_program_task[program_name].cancel()
-                del self.current_program_task[program_name]
-
-    def create_program_task(self, program: Program):
-        if program in self.current_programs:
+        for job in self.resources.queue():
+            self.resources.cancel(job.name)
+
+        for program_name in list(self.current_programs):
+            self.abort_program(program_name)
+
+    def _occupied_error(self, program, blocker):
+        dev, owner = blocker
+        if owner in self.resources.queued:
+            return TemperatureProgramException(
+                f"Program {program.name} requires device {dev}, but it is reserved by queued program {owner}.")
+        return TemperatureProgramException(
+            f"Program {program.name} requires device {dev}, but it is occupied by program {owner}.")
+
+    def create_program_task(self, program: Program, start_step=0, loop_counters=None, step_elapsed=0,
+                            queue=False, priority=0):
+        """
+        Start `program`. If one of its devices is busy, raise, or with `queue`, wait in line (by
+        `priority`, then first come first served) and start as soon as the devices are free.
+        """
+        if program.name in self.current_programs or program.name in self.resources.queued:
             raise TemperatureProgramException(f"Program {program.name} is running.")
 
-        self.current_program_task[program.name] = None
-        self.current_program_task[program.name] = asyncio.create_task(self.run_program(program))
-
-    async def run_program(self, program: Program):
         try:
-            if program in self.current_programs:
+            plan = program.compile(self.dev_instances.keys())
+        except ProgramCompileError as e:
+            raise TemperatureProgramException(str(e))
+
+        def start():
+            held = self.resources.running[program.name]
+
+            def release_if_never_run(_):
+                # a task cancelled before it ran never reaches the cleanup of run_program
+                if self.resources.running.get(program.name) is held and program.name not in self.current_programs:
+                    self.resources.release(program.name)
+
+            task = asyncio.create_task(self.run_program(program, start_step, loop_counters, step_elapsed))
+            task.add_done_callback(release_if_never_run)
+            self.current_program_task[program.name] = task
+
+        if queue:
+            self.resources.enqueue(program.name, plan.devices, priority, start)
+            if program.name in self.resources.queued:
+                self.logger.info(f"Program: Program {program.name} is queued.")
+        elif self.resources.acquire(program.name, plan.devices):
+            start()
+        else:
+            raise self._occupied_error(program, self.resources.blocker(plan.devices))
+
+    def resume_program(self, state):
+        """
+        Continue a program from a checkpoint, at the beginning of the step it was in. Ramps go on
+        from the current temperature, and a soak only for the time it had left.
+        """
+        program = Program.from_dict(state['definition'])
+        self.create_program_task(program, state['step'], state['loops'], state['time'] - state['step_time'])
+
+    async def run_program(self, program: Program, start_step=0, loop_counters=None, step_elapsed=0):
+        """
+        Run `program`, starting from step `start_step` with loop counters `loop_counters`. SOAK
+        actions of the first step are shortened by `step_elapsed` seconds.
+        """
+        try:
+            if program.name in self.current_programs:
                 raise TemperatureProgramException(f"Program {program.name} is running.")
 
-            if len(program.steps) == 0:
-                raise TemperatureProgramException(
-                    f"Program {program.name} is empty")
-
-            if not program.occupied_device:
-                raise TemperatureProgramException(f"No device specified.")
-
-            for dev in program.occupied_device:
-                if dev not in self.dev_instances:
-                    raise TemperatureProgramException(
-                        f"Device {dev} doesn't exist.")
-
-                if dev in self.occupied_devices:
-                    raise TemperatureProgramException(
-                        f"Program {program.name} requires device {dev}, but it is occupied by program "
-                        f"{self.current_dev_program[dev]}.")
-
-                self.occupied_devices.append(dev)
+            try:
+                plan = program.compile(self.dev_instances.keys())
+            except ProgramCompileError as e:
+                self.resources.release(program.name)
+                raise TemperatureProgramException(str(e))
+
+            if not 0 <= start_step < len(plan.steps) or \
+                    (loop_counters is not None and len(loop_counters) != plan.loop_count):
+                self.resources.release(program.name)
+                raise TemperatureProgramException(f"Cannot resume program {program.name} from step {start_step}.")
+
+            # programs started through create_program_task own their devices already
+            if program.name not in self.resources.running and \
+                    not self.resources.acquire(program.name, plan.devices):
+                raise self._occupied_error(program, self.resources.blocker(plan.devices))
+
+            for dev in plan.devices:
                 self.current_dev_program[dev] = program
 
-            self.current_programs.append(program)
+            self.current_programs[program.name] = program
+            self.aborted_programs.discard(program.name)
 
-            pointer = 0
+            pointer = start_step
             step_tasks = []
+            cancelled = False
+
+            if self.checkpoint:
+                self.checkpoint.start(program.to_dict())
 
             try:
-                loop_counters = {}
-                while pointer < len(program.steps):
-                    step = program.steps[pointer]
-                    self.current_step[program.name] = step
+                loop_counters = list(loop_counters) if loop_counters is not None else [0] * plan.loop_count
+                while pointer < len(plan.steps):
+                    step = plan.steps[pointer]
+                    self.current_step[program.name] = program.steps[pointer]
+                    self.current_step_index[program.name] = pointer
+                    if self.checkpoint:
+                        self.checkpoint.step(program.name, pointer, loop_counters, step_elapsed)
 
-                    occupied_device_in_step = []
                     coroutines = []
 
                     self.logger.info(f"Program: Running program {program.name}, step {pointer}.")
 
-                    for action in step:
+                    for action in step.actions:
                         device = None
                         if action.device:
-                            if action.device in occupied_device_in_step:
-                                raise TemperatureProgramException(
-                                    "Only one action can be performed on one device at each step.")
-
                             device = self.dev_instances[action.device]
-                            occupied_device_in_step.append(action.device)
                             self.current_dev_action[action.device] = action
 
                             self.logger.info(f"Program: To execute {action.name} to device {device.name}")
 
-                        if action.name == "CHANGE":
-                            coroutines.append(self.change_temperature(device,
-                                                               float(action.params['SETPOINT'])))
-
-                        if action.name == "LINEAR_RAMP":
-                            coroutines.append(self.linear_ramp(device,
-                                                               float(action.params['TARGET_TEMP']),
-                                                               float(action.params['RATE'])))
-
-                        elif action.name == "SOAK":
-                            coroutines.append(asyncio.sleep(float(action.params['TIME']) * 60))
-
-                        elif action.name == "LOOP":
-                            target_action = action.params['GOTO']
-
-                            if not (0 <= target_action < len(program.steps)):
-                                raise TemperatureProgramException(
-                                    "Loop target out range.")
+                        params = action.params
+                        if action.name == "SOAK" and step_elapsed:
+                            params = dict(params, TIME=max(params['TIME'] - step_elapsed / 60, 0))
 
-                            loop_times = int(action.params['TIMES'])
-                            if pointer not in loop_counters:
-                                loop_counters[pointer] = 0
+                        if action.name in self.action_runners:
+                            coroutines.append(self.action_runners[action.name](device, params))
 
-                            loop_counters[pointer] += 1
-                            if loop_counters[pointer] < loop_times:
-                                pointer = target_action - 1  # there a +1 at the end of the while body
-                            else:
-                                del loop_counters[pointer]
+                    step_elapsed = 0
 
-                        elif action.name == "STANDBY":
-                            device.control_enabled = False
+                    if step.loop:
+                        loop_counters[step.loop.counter] += 1
+                        if loop_counters[step.loop.counter] < step.loop.times:
+                            pointer = step.loop.goto - 1  # there a +1 at the end of the while body
+                        else:
+                            loop_counters[step.loop.counter] = 0
 
                     # let user know the program is running before doing time-consuming jobs
                     await self.update_state_callback()
@@ -148,11 +198,18 @@ class ProgramManager:
                     # https://stackoverflow.com/a/59074112/1584825
                     step_tasks = [asyncio.create_task(coro) for coro in coroutines]
                     self.logger.info(f"Program: Executing actions...")
-                    await asyncio.gather(*step_tasks)
+                    progress = self._record_progress(program.name) if self.checkpoint else None
+                    try:
+                        await asyncio.gather(*step_tasks)
+                    finally:
+                        if progress:
+                            progress['timer'].cancel()
 
                     pointer += 1
-
             except asyncio.CancelledError as e:
+                cancelled = True
+                if self.checkpoint and program.name not in self.aborted_programs:
+                    self.checkpoint.progress(program.name)  # how far the step got
                 self.logger.info("Program: Cancel occurs in program.")
                 self.logger.exception(e)
                 await self.update_state_callback()
@@ -160,13 +217,25 @@ class ProgramManager:
                 for t in step_tasks:
                     t.cancel()
 
-                self.current_programs.remove(program)
-                del self.current_step[program.name]
+                # only a program cancelled by a shutdown stays resumable: not one that finished, was
+                # aborted, or failed
+                if self.checkpoint and (not cancelled or program.name in self.aborted_programs):
+                    self.checkpoint.end(program.name)
+                self.aborted_programs.discard(program.name)
+
+                del self.current_programs[program.name]
+                self.current_step.pop(program.name, None)
+                self.current_step_index.pop(program.name, None)
+                if self.current_program_task.get(program.name) is asyncio.current_task():
+                    del self.current_program_task[program.name]
 
-                for dev in program.occupied_device:
-                    self.occupied_devices.remove(dev)
+                for dev in plan.devices:
                     del self.current_dev_program[dev]
-                    del self.current_dev_action[dev]
+                    if dev in self.current_dev_action:
+                        del self.current_dev_action[dev]
+
+                # may start queued programs
+                self.resources.release(program.name)
 
                 await self.update_state_callback()
         except Exception as e:
@@ -174,48 +243,181 @@ class ProgramManager:
             self.logger.exception(e)
             await self.error_callback(f"Encounter error when executing {program.name}: {str(e)}")
 
-    async def linear_ramp(self, device: TemperatureMonitor, target, rate):
-        try:
-            ramp_interval = self.config.get('ramp_interval', default=1)  # in minutes
-            last_temp = device.temperature
-            delta = target - last_temp
-            if delta < 0:
-                rate = -1 * abs(rate)
-            else:
-                rate = abs(rate)
+    def _record_progress(self, program_name):
+        """
+        Record the time in the checkpoint every `checkpoint_interval` seconds while a step runs, so
+        that a soak resumed after a crash only waits for the time it had left.
+        """
+        interval = self.config.get('checkpoint_interval', default=60)  # in seconds
 
-            ramp_time = delta / rate  # in minutes
-            device.control_enabled = True
+        def record():
+            self.checkpoint.progress(program_name)
+            state['timer'] = self.wheel.call_later(interval, record)
 
-            for i in float_range(0, ramp_time, ramp_interval):
-                await asyncio.sleep(0)  # A chance to stop the program
+        state = {'timer': self.wheel.call_later(interval, record)}
+        return state
 
-                next_temp = ramp_interval * rate + last_temp
+    async def run_change(self, device: TemperatureMonitor, params):
+        await self.change_temperature(device, params['SETPOINT'])
 
-                if (delta > 0 and next_temp > target) or (delta < 0 and next_temp < target):
-                    next_temp = target
+    async def run_linear_ramp(self, device: TemperatureMonitor, params):
+        await self.linear_ramp(device, params['TARGET_TEMP'], params['RATE'])
 
-                if int(next_temp * 10) != int(last_temp * 10):
-                    device.setpoint = next_temp
-                last_temp = next_temp
-                await asyncio.sleep(ramp_interval * 60)
+    async def run_soak(self, device: TemperatureMonitor, params):
+        await self.wheel.sleep(params['TIME'] * 60)
+
+    async def run_standby(self, device: TemperatureMonitor, params):
+        await self.set_device(device, 'control_enabled', False)
+
+    @staticmethod
+    async def set_device(device: TemperatureMonitor, attribute, value):
+        """
+        Set a property of the device from the executor, as writes wait for the device (or for
+        its polling worker) to answer.
+        """
+        await asyncio.get_event_loop().run_in_executor(None, setattr, device, attribute, value)
+
+    async def linear_ramp(self, device: TemperatureMonitor, target, rate):
+        """
+        Move the setpoint towards `target` in steps of `ramp_interval` minutes. Each step is a
+        timer on the wheel rather than a sleeping coroutine, and its setpoint write is batched with
+        the other writes of the same tick.
+        """
+        loop = asyncio.get_event_loop()
+        ramp_interval = self.config.get('ramp_interval', default=1) * 60  # in seconds
+        start_temp = device.temperature
+        delta = target - start_temp
+        rate = math.copysign(abs(rate), delta) / 60  # in degrees per second
+
+        ramp_time = delta / rate if delta else 0  # in seconds
+        max_minutes = device.max_native_ramp_minutes if device.supports_native_ramp else None
+        if device.supports_native_ramp and ramp_time >= 60 and \
+                (max_minutes is None or round(ramp_time / 60) <= max_minutes):
+            if await self.native_ramp(device, target, ramp_time / 60):
+                return
+
+        step_count = math.ceil(ramp_time / ramp_interval - 1e-9)
+        await self.set_device(device, 'control_enabled', True)
+
+        done = loop.create_future()
+        state = {'step': 0, 'last_temp': start_temp, 'timer': None}
+
+        def fail(e):
+            # ends the ramp, and the program with a program error
+            if not done.done():
+                done.set_exception(e)
+
+        def ramp_step():
+            if done.done():
+                return
+            if state['step'] >= step_count:
+                done.set_result(None)
+                return
+
+            state['step'] += 1
+            next_temp = start_temp + state['step'] * ramp_interval * rate
+            if (delta > 0 and next_temp > target) or (delta < 0 and next_temp < target):
+                next_temp = target
+
+            if int(next_temp * 10) != int(state['last_temp'] * 10):
+                self.wheel.write_setpoint(device, next_temp, on_error=fail)
+                if self.checkpoint and device.name in self.current_dev_program:
+                    self.checkpoint.ramp(self.current_dev_program[device.name].name, device.name, next_temp)
+            state['last_temp'] = next_temp
+            state['timer'] = self.wheel.call_later(ramp_interval, ramp_step)
+
+        ramp_step()
+        try:
+            await done
         except asyncio.CancelledError:
-            pass
+            state['timer'].cancel()
+            self.wheel.discard_writes(device)
+        except Exception:
+            state['timer'].cancel()
+            self.wheel.discard_writes(device)
+            raise
+
+    async def native_ramp(self, device: TemperatureMonitor, target, ramp_time):
+        """
+        Upload the ramp to the controller and wait for it, instead of stepping the setpoint.
+        Controllers take whole minutes, so the rate is adjusted slightly. Returns False if the
+        upload failed, so that the caller steps the setpoint itself.
+        """
+        loop = asyncio.get_event_loop()
+        duration = max(round(ramp_time), 1)  # in minutes
+
+        self.logger.info(f"Program: Uploading {duration} min ramp to {target} to device {device.name}.")
+        self.wheel.discard_writes(device)
+        await self.set_device(device, 'control_enabled', True)
+        try:
+            await loop.run_in_executor(None, device.upload_ramp, target, duration)
+        except Exception as e:
+            self.logger.warning(f"Program: Cannot upload the ramp to device {device.name}, "
+                                f"ramping the setpoint instead: {e}")
+            try:
+                # the upload may have stopped halfway, with the ramp mode already on
+                await loop.run_in_executor(None, partial(device.cancel_ramp, hold=False))
+            except Exception:
+                pass
+            return False
 
-    async def change_temperature(self, device: TemperatureMonitor, target):
-        tolerance = self.config.get('temperature_tolerance', default=1)  # in degrees
+        try:
+            await self.wheel.sleep(duration * 60)
+        except asyncio.CancelledError:
+            await loop.run_in_executor(None, device.cancel_ramp)
+            return True
 
-        device.control_enabled = True
-        device.setpoint = target
+        await loop.run_in_executor(None, partial(device.cancel_ramp, hold=False))
+        return True
 
-        average_length = 12
-        average_deque = deque(maxlen=average_length)
+    async def status_update_handler(self, subscribers, status_dict):
+        for name, status in status_dict['status'].items():
+            if name in self.settle_detectors and 'temperature' in status:
+                self._feed_settle_detector(name, status.get('time', self.clock()), status['temperature'])
 
-        while True:
-            await asyncio.sleep(5)
-            average_deque.append(device.temperature)
+    def _feed_settle_detector(self, name, t, temperature):
+        detector, settled = self.settle_detectors[name]
+        detector.add(t, temperature)
+        if detector.settled and not settled.done():
+            settled.set_result(None)
 
-            avg = sum(average_deque) / len(average_deque)
+    def settle_eta(self, name):
+        if name not in self.settle_detectors:
+            return None
+        return self.settle_detectors[name][0].eta
 
-            if target - tolerance < avg < target + tolerance:
-                break
+    async def change_temperature(self, device: TemperatureMonitor, target):
+        """
+        Change the setpoint and wait until the temperature settles, judged from the readings of
+        the status monitor. The device is only read directly if the monitor stops delivering.
+        """
+        loop = asyncio.get_event_loop()
+        update_interval = self.config.get('update_interval', default=5)  # in seconds
+
+        await self.set_device(device, 'control_enabled', True)
+        await self.set_device(device, 'setpoint', target)
+
+        detector = SettleDetector.create_from_config(self.config, target, self.clock())
+        settled = loop.create_future()
+        self.settle_detectors[device.name] = (detector, settled)
+        state = {'timer': None}
+
+        def watchdog():
+            last_time = detector.last_time
+            if last_time is None or self.clock() - last_time > 2 * update_interval:
+                try:
+                    self._feed_settle_detector(device.name, self.clock(), device.temperature)
+                except Exception as e:
+                    self.logger.error(f"Program: Failed to read temperature of {device.name}:")
+                    self.logger.exception(e)
+
+            if not settled.done():
+                state['timer'] = self.wheel.call_later(update_interval, watchdog)
+
+        state['timer'] = self.wheel.call_later(update_interval, watchdog)
+        try:
+            await settled
+        finally:
+            state['timer'].cancel()
+            if self.settle_detectors.get(device.name, (None, None))[1] is settled:
+                del self.settle_detectors[device.name]
@@ -0,0 +1,126 @@
+import asyncio
+from logging import Logger
+
+from temperature_web_control.server.app_core import EventBus, TemperatureHistory
+from temperature_web_control.server.upstream import UpstreamConnection, UpstreamError
+from temperature_web_control.utils import Config
+
+# answered from a copy that is refreshed whenever the primary reports a control change
+CACHED_EVENTS = ['list_actions', 'list_programs', 'current_programs', 'list_interrupted_programs']
+
+CONTROL_EVENTS = ['run_predefined_program', 'run_program', 'abort_program', 'edit_program',
+                  'standby_device', 'resume_program', 'discard_checkpoint', 'simulate_program', 'profile']
+
+
+class ReplicaCore(EventBus):
+    """
+    Read-only copy of a primary instance for dashboards. It holds a single connection to the
+    primary, keeps its own history from the status stream and answers all of its clients from
+    it, so the load on the primary doesn't grow with the audience. Control events are rejected.
+    """
+
+    def __init__(self, config: Config, logger: Logger, primary_url):
+        super().__init__(logger, ['status_available', 'control_changed', 'program_error'])
+        self.config = config
+        self.last_status = {}
+        self.cache = {}
+
+        self.history = TemperatureHistory(config.get('history_length', default=1000), [])
+        self.subscribe_to('status_available', self.history, self.history.status_update_handler)
+
+        self.upstream = UpstreamConnection('primary', primary_url, logger, self.on_upstream_event,
+                                           self.on_upstream_connected, self.on_upstream_disconnected)
+        self._refresh_task = None
+        self._cache_stale = False
+
+    @staticmethod
+    def create_from_config(config, logger):
+        return ReplicaCore(config, logger, config.get('replica_of'))
+
+    def start(self):
+        self.upstream.start()
+
+    async def close(self):
+        await self.upstream.close()
+
+    def get_event_handlers(self):
+        event_handlers = {
+            'request_status': self.on_request_status_event,
+            'fetch_history': self.on_fetch_history_event,
+        }
+        for event in CACHED_EVENTS:
+            event_handlers[event] = self.on_cached_event
+        for event in CONTROL_EVENTS:
+            event_handlers[event] = self.on_control_event
+        return event_handlers
+
+    # ==== Events from the primary ====
+
+    def on_upstream_event(self, upstream, message):
+        event = message.get('event')
+        if event == 'status_available':
+            self.last_status = message.get('status', {})
+            for dev in self.last_status:
+                if dev not in self.history.times:
+                    self.history.add_device(dev)
+            asyncio.ensure_future(self._fire_event('status_available', {'status': self.last_status}))
+        elif event == 'control_changed':
+            self._schedule_refresh()
+        elif event == 'program_error':
+            asyncio.ensure_future(self._fire_event('program_error', {'error': message.get('error')}))
+
+    async def on_upstream_connected(self, upstream):
+        try:
+            reply = await upstream.request({'event': 'fetch_history'})
+        except UpstreamError as e:
+            self.logger.warning(f"Replica: Cannot fetch the history of the primary: {e}")
+        else:
+            for dev, data in reply.get('data', {}).items():
+                self.history.load(dev, data['time'], data['temperature'])
+
+        self._schedule_refresh()
+
+    async def on_upstream_disconnected(self, upstream):
+        self.last_status = {
+            name: {'name': name, 'status': 'error', 'error_msg': "Lost connection to the primary."}
+            for name in self.last_status
+        }
+        await self._fire_event('status_available', {'status': self.last_status})
+
+    def _schedule_refresh(self):
+        # changes reported while a refresh is running lead to one more refresh, not one each
+        self._cache_stale = True
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+
+    async def _refresh(self):
+        while self._cache_stale:
+            self._cache_stale = False
+            replies = await asyncio.gather(*[self.upstream.request({'event': event}) for event in CACHED_EVENTS],
+                                           return_exceptions=True)
+            for event, reply in zip(CACHED_EVENTS, replies):
+                if isinstance(reply, Exception):
+                    self.logger.warning(f"Replica: Cannot refresh {event}: {reply}")
+                    continue
+                reply.pop('event', None)
+                self.cache[event] = reply
+
+        await self.fire_control_changed_event()
+
+    # ==== Requests of the clients ====
+
+    async def on_request_status_event(self, event, callback):
+        await self._return_ok(callback, {'status': self.last_status})
+
+    async def on_fetch_history_event(self, event, callback):
+        await self._return_ok(callback, {'data': self.history.dump_data()})
+
+    async def on_cached_event(self, event, callback):
+        name = event['event']
+        if name not in self.cache:
+            await self._return_error(callback, "Not synchronized with the primary yet.")
+        elif callback:
+            await callback(dict(self.cache[name]))
+
+    async def on_control_event(self, event, callback):
+        await self._return_error(callback, "This is a read-only replica, use the primary instance to control devices.")
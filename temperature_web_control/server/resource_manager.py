@@ -0,0 +1,139 @@
+import heapq
+import itertools
+
+
+class QueuedJob:
+    __slots__ = ['name', 'devices', 'priority', 'seq', 'start', 'cancelled']
+
+    def __init__(self, name, devices, priority, seq, start):
+        self.name = name
+        self.devices = devices
+        self.priority = priority
+        self.seq = seq
+        self.start = start
+        self.cancelled = False
+
+    def __lt__(self, other):
+        # higher priority first, first come first served within a priority
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class ResourceManager:
+    """
+    Keeps track of which program owns which device, and of the programs queued for devices.
+
+    Every device has a heap of the jobs waiting for it. A job starts once each of its devices is
+    free and the job is at the head of each of their heaps, so a program needing many devices is
+    not starved by smaller ones queued after it. Acquiring, releasing and queueing cost
+    O(devices * log(queue length)); cancelled jobs are dropped lazily when they reach a head.
+    """
+
+    def __init__(self):
+        self.owners = {}   # device -> name of the program owning it
+        self.running = {}  # program name -> its devices
+        self.queued = {}   # program name -> QueuedJob
+        self.waiting = {}  # device -> heap of QueuedJob
+        self._seq = itertools.count()
+
+        # on_release(name, devices) is called when a program releases its devices, before the
+        # queued jobs get them
+        self.on_release = None
+
+    def owner(self, device):
+        return self.owners.get(device)
+
+    def _head(self, device):
+        heap = self.waiting.get(device)
+        while heap and heap[0].cancelled:
+            heapq.heappop(heap)
+        if not heap:
+            self.waiting.pop(device, None)
+            return None
+        return heap[0]
+
+    def blocker(self, devices):
+        """
+        The first device of `devices` that can't be taken right now and the program holding it
+        (running or queued), or None if all of them are available.
+        """
+        for dev in devices:
+            if dev in self.owners:
+                return dev, self.owners[dev]
+            head = self._head(dev)
+            if head is not None:
+                return dev, head.name
+        return None
+
+    def acquire(self, name, devices):
+        if self.blocker(devices) is not None:
+            return False
+
+        self._assign(name, devices)
+        return True
+
+    def _assign(self, name, devices):
+        self.running[name] = tuple(devices)
+        for dev in devices:
+            self.owners[dev] = name
+
+    def hold(self, name, devices):
+        """
+        Take free `devices` ahead of the queued jobs, which wait until `release(name)`.
+        """
+        assert not any(dev in self.owners for dev in devices), "Devices are in use"
+        self._assign(name, devices)
+
+    def _try_start(self, job: QueuedJob):
+        for dev in job.devices:
+            if dev in self.owners or self._head(dev) is not job:
+                return False
+
+        for dev in job.devices:
+            heapq.heappop(self.waiting[dev])
+            if not self.waiting[dev]:
+                del self.waiting[dev]
+        del self.queued[job.name]
+
+        self._assign(job.name, job.devices)
+        job.start()
+        return True
+
+    def _wake(self, devices):
+        for dev in devices:
+            head = self._head(dev)
+            if head is not None:
+                self._try_start(head)
+
+    def enqueue(self, name, devices, priority, start):
+        """
+        Queue a program for `devices`; `start()` is called as soon as it owns them, possibly right
+        away.
+        """
+        job = QueuedJob(name, tuple(devices), priority, next(self._seq), start)
+        self.queued[name] = job
+        for dev in job.devices:
+            heapq.heappush(self.waiting.setdefault(dev, []), job)
+
+        self._try_start(job)
+        return job
+
+    def cancel(self, name):
+        job = self.queued.pop(name, None)
+        if job is None:
+            return False
+
+        job.cancelled = True
+        self._wake(job.devices)  # it may have been blocking the jobs behind it
+        return True
+
+    def release(self, name):
+        devices = self.running.pop(name, ())
+        for dev in devices:
+            del self.owners[dev]
+
+        if devices and self.on_release is not None:
+            self.on_release(name, devices)
+        self._wake(devices)
+
+    def queue(self):
+        return sorted(self.queued.values())
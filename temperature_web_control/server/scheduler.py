@@ -0,0 +1,238 @@
+import math
+import asyncio
+import itertools
+from logging import Logger
+
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+
+
+class Timer:
+    __slots__ = ['expiry', 'callback', 'args', 'cancelled']
+
+    def __init__(self, expiry, callback, args):
+        self.expiry = expiry
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel driving the timers of all running programs from a single task.
+
+    Time is divided into ticks of `tick` seconds. Level 0 has one slot per tick for the next 64
+    ticks, level 1 one slot per 64 ticks, and so on; timers move down a level when their slot
+    comes up. The driver task only wakes up for ticks that have something to do, and exits when
+    the wheel is empty.
+
+    Setpoint writes requested through `write_setpoint` are collected and, after the due timers
+    of a tick have run, dispatched in one executor job per device bus. Several writes to the same
+    device within a tick collapse into the last one. A failed write is passed to the `on_error`
+    callback of the write, on the event loop.
+    """
+
+    def __init__(self, tick=1.0, logger: Logger = None, levels=4):
+        self.tick = tick
+        self.logger = logger
+        self.levels = levels
+        self.wheels = [[[] for _ in range(SLOTS)] for _ in range(levels)]
+
+        self.origin = None
+        self.current_tick = 0
+        self.pending_writes = {}
+
+        self._driver = None
+        self._wakeup = None
+        self._planned_tick = None
+
+    @staticmethod
+    def create_from_config(config, logger):
+        return TimerWheel(config.get('scheduler_tick', default=1), logger)
+
+    def _tick_time(self, tick):
+        return self.origin + tick * self.tick
+
+    def _insert(self, timer: Timer):
+        for level in range(self.levels):
+            shift = level * SLOT_BITS
+            if (timer.expiry >> shift) - (self.current_tick >> shift) < SLOTS:
+                self.wheels[level][(timer.expiry >> shift) % SLOTS].append(timer)
+                return
+
+        # further out than the wheel reaches: park it in the last slot, it is re-filed on cascade
+        shift = (self.levels - 1) * SLOT_BITS
+        self.wheels[-1][((self.current_tick >> shift) + SLOTS - 1) % SLOTS].append(timer)
+
+    def _next_tick(self):
+        """
+        The earliest tick at which a timer fires or has to move down a level, or None if the
+        wheel is empty.
+        """
+        best = None
+        for level, wheel in enumerate(self.wheels):
+            shift = level * SLOT_BITS
+            base = self.current_tick >> shift
+            if best is not None and (base + 1) << shift >= best:
+                break
+
+            for offset in range(1, SLOTS):
+                slot = wheel[(base + offset) % SLOTS]
+                if slot:
+                    slot[:] = [timer for timer in slot if not timer.cancelled]
+                if slot:
+                    candidate = (base + offset) << shift
+                    if best is None or candidate < best:
+                        best = candidate
+                    break
+
+        return best
+
+    def _process(self, tick):
+        self.current_tick = tick
+
+        for level in range(self.levels - 1, 0, -1):
+            shift = level * SLOT_BITS
+            if tick % (1 << shift) == 0:
+                slot = self.wheels[level][(tick >> shift) % SLOTS]
+                timers = slot[:]
+                slot.clear()
+                for timer in timers:
+                    if not timer.cancelled:
+                        self._insert(timer)
+
+        slot = self.wheels[0][tick % SLOTS]
+        timers = slot[:]
+        slot.clear()
+        for timer in timers:
+            if timer.cancelled:
+                continue
+            if timer.expiry > tick:
+                self._insert(timer)
+                continue
+
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error("Scheduler: Error in timer callback:")
+                    self.logger.exception(e)
+
+    def _write_bus(self, writes):
+        """
+        Returns the (on_error, exception) of the writes that failed.
+        """
+        failed = []
+        for device, (value, on_error) in writes.items():
+            try:
+                device.setpoint = value
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Scheduler: Failed to set setpoint of {device.name}:")
+                    self.logger.exception(e)
+                if on_error is not None:
+                    failed.append((on_error, e))
+        return failed
+
+    async def _flush_writes(self):
+        if not self.pending_writes:
+            return
+
+        writes, self.pending_writes = self.pending_writes, {}
+        loop = asyncio.get_event_loop()
+        results = await asyncio.gather(*[loop.run_in_executor(None, self._write_bus, bus_writes)
+                                         for bus_writes in writes.values()])
+        for on_error, e in itertools.chain.from_iterable(results):
+            on_error(e)
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                next_tick = self._next_tick()
+                while next_tick is not None and self._tick_time(next_tick) <= loop.time():
+                    self._process(next_tick)
+                    next_tick = self._next_tick()
+
+                await self._flush_writes()
+
+                if next_tick is None and not self.pending_writes:
+                    break
+
+                self._planned_tick = next_tick
+                self._wakeup = loop.create_future()
+                handle = None
+                if next_tick is not None:
+                    handle = loop.call_at(self._tick_time(next_tick), self._wake)
+                try:
+                    await self._wakeup
+                finally:
+                    if handle:
+                        handle.cancel()
+                    self._wakeup = None
+        finally:
+            self._driver = None
+
+    def _wake(self):
+        if self._wakeup and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def _ensure_driver(self):
+        if self._driver is None:
+            self._driver = asyncio.ensure_future(self._run())
+
+    def call_later(self, delay, callback, *args) -> Timer:
+        """
+        Run `callback(*args)` on the first tick at least `delay` seconds from now.
+        """
+        now = asyncio.get_event_loop().time()
+        if self.origin is None:
+            self.origin = now
+
+        expiry = max(self.current_tick + 1, math.ceil((now + delay - self.origin) / self.tick - 1e-9))
+        timer = Timer(expiry, callback, args)
+        self._insert(timer)
+
+        if self._driver is None:
+            self._ensure_driver()
+        elif self._planned_tick is None or expiry < self._planned_tick:
+            self._wake()
+
+        return timer
+
+    async def sleep(self, delay):
+        future = asyncio.get_event_loop().create_future()
+        timer = self.call_later(delay, lambda: future.done() or future.set_result(None))
+        try:
+            await future
+        finally:
+            timer.cancel()
+
+    def close(self):
+        for wheel in self.wheels:
+            for slot in wheel:
+                slot.clear()
+        self.pending_writes.clear()
+        if self._driver is not None:
+            self._driver.cancel()
+
+    def write_setpoint(self, device, value, on_error=None):
+        """
+        Queue a setpoint write, dispatched together with the other writes to the same bus.
+        `on_error(exception)` is called if the write fails.
+        """
+        self.pending_writes.setdefault(device.bus, {})[device] = value, on_error
+        if self._driver is None:
+            self._ensure_driver()
+        else:
+            self._wake()
+
+    def discard_writes(self, device):
+        bus_writes = self.pending_writes.get(device.bus)
+        if bus_writes and device in bus_writes:
+            del bus_writes[device]
+            if not bus_writes:
+                del self.pending_writes[device.bus]
@@ -0,0 +1,283 @@
+import math
+import asyncio
+import logging
+import selectors
+from logging import Logger
+
+from temperature_web_control.model.program import Program
+from temperature_web_control.model.temperature_monitor import TemperatureMonitor
+from temperature_web_control.server.program_manager import ProgramManager
+from temperature_web_control.utils import Config
+
+MIN_SAMPLE_INTERVAL = 0.1  # seconds
+MAX_SAMPLES = 5000  # per device
+
+
+class SimulationStalled(Exception):
+    pass
+
+
+class _VirtualSelector:
+    """
+    Wraps the selector of a `VirtualClockEventLoop`. Instead of blocking until the next timer is
+    due, `select` moves the virtual clock forward to it.
+    """
+
+    def __init__(self, selector: selectors.BaseSelector, loop):
+        self._selector = selector
+        self._loop = loop
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+    def select(self, timeout=None):
+        if self._loop.executor_jobs:
+            # a worker thread is running, wait for it in real time rather than skipping ahead
+            return self._selector.select(0.001 if timeout is None else min(timeout, 0.001))
+
+        events = self._selector.select(0)
+        if events or (timeout is not None and timeout <= 0):
+            return events
+
+        if timeout is None:
+            raise SimulationStalled("Every task is waiting, but nothing is scheduled.")
+
+        self._loop.virtual_time += timeout
+        return events
+
+
+class VirtualClockEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop running on a virtual clock: whenever every task is sleeping, the clock jumps to the
+    next timer. Code using `asyncio.sleep`, `loop.call_later` and `loop.time()` runs unchanged, but
+    takes no real time to wait.
+    """
+
+    def __init__(self, start_time=0.0):
+        super().__init__()
+        self.virtual_time = start_time
+        self.executor_jobs = 0
+        self._selector = _VirtualSelector(self._selector, self)
+
+    def time(self):
+        return self.virtual_time
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.executor_jobs += 1
+
+        def done(_):
+            self.executor_jobs -= 1
+
+        future.add_done_callback(done)
+        return future
+
+
+class SimulatedDevice(TemperatureMonitor):
+    """
+    First order thermal model: the temperature approaches the setpoint (or `ambient` in standby)
+    exponentially with `time_constant` seconds, optionally limited to `max_rate` degrees/min.
+    """
+
+    def __init__(self, name, clock, temperature, time_constant=60, max_rate=None, ambient=20, native_ramp=False):
+        super().__init__(name)
+        self.clock = clock
+        self.time_constant = time_constant
+        self.max_rate = max_rate
+        self.ambient = ambient
+        self.native_ramp = native_ramp
+
+        self._temperature = temperature
+        self._setpoint = temperature
+        self._ramp = None  # (start time, start setpoint, duration in seconds)
+        self._last_update = clock()
+        self.run = False
+
+    def _current_setpoint(self, now):
+        if self._ramp is None:
+            return self._setpoint
+
+        start_time, start_setpoint, duration = self._ramp
+        progress = min(max((now - start_time) / duration, 0), 1)
+        return start_setpoint + (self._setpoint - start_setpoint) * progress
+
+    def _advance(self):
+        now = self.clock()
+        dt = now - self._last_update
+        self._last_update = now
+        if dt <= 0:
+            return
+
+        target = self._current_setpoint(now) if self.run else self.ambient
+        new_temperature = target + (self._temperature - target) * math.exp(-dt / self.time_constant)
+
+        if self.max_rate:
+            max_change = self.max_rate * dt / 60
+            new_temperature = min(max(new_temperature, self._temperature - max_change),
+                                  self._temperature + max_change)
+
+        self._temperature = new_temperature
+
+    @property
+    def temperature(self) -> float:
+        self._advance()
+        return self._temperature
+
+    @property
+    def controllable(self) -> bool:
+        return True
+
+    @property
+    def control_enabled(self) -> bool:
+        return self.run
+
+    @control_enabled.setter
+    def control_enabled(self, value):
+        self._advance()
+        self.run = value
+
+    @property
+    def setpoint(self):
+        return self._current_setpoint(self.clock())
+
+    @setpoint.setter
+    def setpoint(self, value):
+        self._advance()
+        if self._ramp is not None:
+            self._ramp = (self.clock(), self.temperature, self._ramp[2])
+        self._setpoint = value
+
+    @property
+    def supports_native_ramp(self):
+        return self.native_ramp
+
+    def upload_ramp(self, target, duration):
+        self._ramp = (self.clock(), self.temperature, duration * 60)
+        self.setpoint = target
+
+    def cancel_ramp(self, hold=True):
+        self._advance()
+        if hold:
+            self._setpoint = self._current_setpoint(self.clock())
+        self._ramp = None
+
+    @property
+    def other_options(self):
+        return []
+
+
+async def _simulate(config: Config, program: Program, initial_temperatures, logger, sample_interval, max_duration):
+    loop = asyncio.get_event_loop()
+    plan = program.compile()
+
+    time_constant = config.get('simulation', 'time_constant', default=60)
+    max_rate = config.get('simulation', 'max_rate', default=None)
+    ambient = config.get('simulation', 'ambient', default=20)
+    native_ramp = config.get('simulation', 'native_ramp', default=False)
+
+    devices = {
+        name: SimulatedDevice(name, loop.time, initial_temperatures.get(name, ambient), time_constant, max_rate,
+                              ambient, native_ramp)
+        for name in plan.devices
+    }
+
+    start_time = loop.time()
+    trace = {name: {'time': [], 'setpoint': [], 'temperature': []} for name in devices}
+    steps = []
+    errors = []
+
+    async def update_state():
+        index = manager.current_step_index.get(program.name)
+        current_time = loop.time() - start_time
+
+        if steps and steps[-1]['end'] is None and (index is None or steps[-1]['step'] != index):
+            steps[-1]['end'] = current_time
+        if index is not None and (not steps or steps[-1]['end'] is not None):
+            steps.append({'step': index, 'start': current_time, 'end': None})
+
+    async def on_error(error):
+        errors.append(str(error))
+
+    manager = ProgramManager(config, devices, update_state, on_error, logger, clock=loop.time)
+
+    async def sample():
+        interval = sample_interval
+        while True:
+            if devices and len(next(iter(trace.values()))['time']) >= MAX_SAMPLES:
+                # long programs keep every other sample, so the trace stays bounded
+                for series in trace.values():
+                    for key in series:
+                        series[key] = series[key][::2]
+                interval *= 2
+
+            for name, device in devices.items():
+                trace[name]['time'].append(loop.time() - start_time)
+                trace[name]['setpoint'].append(device.setpoint)
+                trace[name]['temperature'].append(device.temperature)
+            await asyncio.sleep(interval)
+
+    async def monitor():
+        # stands in for the status monitor of the app core
+        while True:
+            await asyncio.sleep(update_interval)
+            status = {name: {'name': name, 'temperature': device.temperature, 'time': loop.time()}
+                      for name, device in devices.items()}
+            await manager.status_update_handler(None, {'status': status})
+
+    update_interval = config.get('update_interval', default=5)
+    samplers = [asyncio.create_task(sample()), asyncio.create_task(monitor())]
+    completed = True
+    try:
+        await asyncio.wait_for(manager.run_program(program), max_duration)
+    except asyncio.TimeoutError:
+        completed = False
+        errors.append(f"Program did not finish within {max_duration} s.")
+    finally:
+        for sampler in samplers:
+            sampler.cancel()
+        manager.wheel.close()
+        await asyncio.gather(*samplers, return_exceptions=True)
+
+    return {
+        'program': program.name,
+        'completed': completed and not errors,
+        'duration': loop.time() - start_time,
+        'estimated_duration': plan.estimate_duration(initial_temperatures),
+        'steps': steps,
+        'trace': trace,
+        'errors': errors
+    }
+
+
+def simulate_program(config: Config, program: Program, initial_temperatures=None, logger: Logger = None,
+                     sample_interval=None, max_duration=7 * 24 * 3600):
+    """
+    Dry-run `program` through `ProgramManager` against simulated devices on a virtual clock.
+
+    Blocks until the simulation is done, which usually takes a fraction of a second even for
+    programs running for hours. Returns the predicted setpoint and temperature trace of each device,
+    sampled every `sample_interval` seconds, and the start and end time of each executed step.
+    The trace holds at most MAX_SAMPLES samples per device: past that, the samples are thinned
+    and the interval doubled.
+
+    :raise ProgramCompileError: if the program is invalid.
+    :raise ValueError: if `sample_interval` isn't a positive number.
+    """
+    if logger is None:
+        logger = logging.getLogger("temperature_app.simulator")
+        logger.setLevel(logging.WARNING)
+
+    if sample_interval is None:
+        sample_interval = config.get('update_interval', default=5)
+    if isinstance(sample_interval, bool) or not isinstance(sample_interval, (int, float)) or not sample_interval > 0:
+        raise ValueError(f"Invalid sample interval {sample_interval!r}, expected a positive number of seconds.")
+    sample_interval = max(sample_interval, MIN_SAMPLE_INTERVAL)
+
+    program.compile()  # fail early, before spinning up a loop
+
+    loop = VirtualClockEventLoop()
+    try:
+        return loop.run_until_complete(
+            _simulate(config, program, initial_temperatures or {}, logger, sample_interval, max_duration))
+    finally:
+        loop.close()
@@ -0,0 +1,97 @@
+import os
+import mmap
+import time
+import struct
+from logging import Logger
+
+from temperature_web_control.client.status_board import MAGIC, HEADER, NAME_SIZE, GENERATION_OFFSET, board_size
+from temperature_web_control.server.status_table import SlotArray, SLOT_SIZE
+
+SPARE_SLOTS = 16  # for devices added by a config reload
+
+
+class StatusBoard:
+    """
+    Publishes the latest status of every device into a memory-mapped file, for other programs on
+    the same machine to read with `client.status_board.StatusBoardReader` at any rate, without
+    talking to the app.
+
+    The file is created next to its final path and moved there, so readers never see it half
+    initialized; a reader of the previous file can tell by `replaced()`.
+    """
+
+    def __init__(self, path, slots, logger: Logger):
+        self.path = path
+        self.logger = logger
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(board_size(slots))
+        self._file = open(tmp_path, "r+b")
+        self.map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self.map, 0, MAGIC, slots, SLOT_SIZE, NAME_SIZE, 0)
+        os.replace(tmp_path, path)
+
+        self.slots = SlotArray(self.map, slots, HEADER.size + slots * NAME_SIZE)
+        self.index = {}  # device name -> slot
+        self.free_slots = list(range(slots - 1, -1, -1))
+        self._full_warned = False
+
+    @staticmethod
+    def create_from_config(config, logger):
+        path = config.get('status_board_path', default=None)
+        if not path:
+            return None
+
+        return StatusBoard(path, len(config.get('devices', default=[])) + SPARE_SLOTS, logger)
+
+    def _set_name(self, slot, name):
+        generation = struct.unpack_from("<Q", self.map, GENERATION_OFFSET)[0]
+        struct.pack_into("<Q", self.map, GENERATION_OFFSET, generation + 1)
+        offset = HEADER.size + slot * NAME_SIZE
+        self.map[offset:offset + NAME_SIZE] = name.encode("utf-8")[:NAME_SIZE].ljust(NAME_SIZE, b"\0")
+        struct.pack_into("<Q", self.map, GENERATION_OFFSET, generation + 2)
+
+    def _slot(self, name):
+        if name in self.index:
+            return self.index[name]
+
+        if not self.free_slots:
+            if not self._full_warned:
+                self.logger.warning(f"Status board: No slot left for {name}, restart the app to add more.")
+                self._full_warned = True
+            return None
+
+        slot = self.free_slots.pop()
+        self.slots.clear(slot)
+        self._set_name(slot, name)
+        self.index[name] = slot
+        return slot
+
+    def remove_device(self, name):
+        slot = self.index.pop(name, None)
+        if slot is not None:
+            self._set_name(slot, "")
+            self.slots.clear(slot)
+            self.free_slots.append(slot)
+
+    def publish(self, status):
+        for name, dev_status in status.items():
+            slot = self._slot(name)
+            if slot is None:
+                continue
+
+            acquired = dev_status.get('time', time.time())
+            if dev_status.get('status') == 'ok':
+                self.slots.write(slot, acquired, dev_status.get('temperature'), dev_status.get('setpoint'),
+                                 dev_status.get('control_enabled'))
+            else:
+                self.slots.write_error(slot, acquired, str(dev_status.get('error_msg', 'unknown error')))
+
+    async def status_update_handler(self, subscribers, status_dict):
+        self.publish(status_dict['status'])
+
+    def close(self):
+        self.slots = None
+        self.map.close()
+        self._file.close()
@@ -0,0 +1,149 @@
+import math
+import time
+import struct
+from collections import namedtuple
+
+ERROR_SIZE = 88
+
+# seq, then acquisition time, temperature, setpoint, control enabled, error flag, error message
+SEQ = struct.Struct("<Q")
+DATA = struct.Struct(f"<dddBB6x{ERROR_SIZE}s")
+SLOT_SIZE = SEQ.size + DATA.size  # 128 bytes
+
+Reading = namedtuple("Reading", ["seq", "time", "temperature", "setpoint", "control_enabled", "error"])
+
+# a write takes about a microsecond: a counter still odd after this many retries was left so by
+# a writer that died halfway through
+READ_RETRIES = 1000
+ABORT_CHECK_INTERVAL = 100  # retries
+
+
+class SlotBusyError(Exception):
+    pass
+
+
+def seqlock_read(buf, offset, read, retries=READ_RETRIES, abort=None):
+    """
+    Call `read()` until it ran while the sequence counter at `offset` of `buf` was even and
+    unchanged; returns (counter, result). Gives up with SlotBusyError after `retries` attempts,
+    or as soon as `abort()`, checked every ABORT_CHECK_INTERVAL attempts, returns true.
+    """
+    for attempt in range(retries):
+        if attempt and attempt % ABORT_CHECK_INTERVAL == 0 and abort is not None and abort():
+            break
+
+        seq = SEQ.unpack_from(buf, offset)[0]
+        if seq & 1:
+            time.sleep(0)  # the writer is halfway through
+            continue
+
+        result = read()
+        if SEQ.unpack_from(buf, offset)[0] == seq:
+            return seq, result
+
+    raise SlotBusyError("The data is being written for too long, its writer probably died halfway through.")
+
+
+class SlotArray:
+    """
+    Array of fixed-size slots holding the latest reading of a device each, in a buffer shared with
+    other processes.
+
+    Every slot has a single writer and is guarded by a sequence lock: the writer makes the counter
+    odd, writes the data and makes it even again, and a reader retries if the counter was odd or
+    changed while it was reading. Readers never block the writer and unpack the values straight
+    from the shared buffer.
+    """
+
+    def __init__(self, buf, slots, offset=0):
+        self.buf = buf
+        self.slots = slots
+        self.offset = offset
+
+    def _check(self, slot):
+        if not 0 <= slot < self.slots:
+            raise IndexError(f"status table slot {slot} out of range")
+        return self.offset + slot * SLOT_SIZE
+
+    def _write(self, slot, values):
+        offset = self._check(slot)
+        seq = SEQ.unpack_from(self.buf, offset)[0]
+        seq += seq & 1  # left odd by a writer that died, e.g. a polling worker that was restarted
+        SEQ.pack_into(self.buf, offset, seq + 1)
+        DATA.pack_into(self.buf, offset + SEQ.size, *values)
+        SEQ.pack_into(self.buf, offset, seq + 2)
+
+    def write(self, slot, acquired, temperature, setpoint, control_enabled):
+        self._write(slot, (
+            acquired,
+            math.nan if temperature is None else temperature,
+            math.nan if setpoint is None else setpoint,
+            bool(control_enabled), False, b""
+        ))
+
+    def write_error(self, slot, acquired, error_msg):
+        self._write(slot, (acquired, math.nan, math.nan, False, True,
+                           error_msg.encode("utf-8", "replace")[:ERROR_SIZE]))
+
+    def clear(self, slot):
+        offset = self._check(slot)
+        self.buf[offset:offset + SLOT_SIZE] = bytes(SLOT_SIZE)
+
+    def read(self, slot, abort=None):
+        """
+        The last reading in `slot`, or None if nothing was written to it yet.
+
+        :raise SlotBusyError: if the slot stays locked by its writer, or `abort()` returned true
+            while waiting for it (see `seqlock_read`).
+        """
+        offset = self._check(slot)
+        seq, (acquired, temperature, setpoint, control_enabled, failed, error) = \
+            seqlock_read(self.buf, offset, lambda: DATA.unpack_from(self.buf, offset + SEQ.size), abort=abort)
+
+        if seq == 0:
+            return None
+
+        return Reading(
+            seq, acquired,
+            None if math.isnan(temperature) else temperature,
+            None if math.isnan(setpoint) else setpoint,
+            bool(control_enabled),
+            error.rstrip(b"\0").decode("utf-8", "replace") if failed else None
+        )
+
+
+class StatusTable(SlotArray):
+    """
+    Slots in a block of shared memory, written by the polling workers and read by the main
+    process.
+    """
+
+    def __init__(self, slots, name=None):
+        try:
+            # only needed, and only available from Python 3.8, with polling workers
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise RuntimeError("Polling workers need Python 3.8 or later.")
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * SLOT_SIZE)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        super().__init__(self.shm.buf, slots)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @staticmethod
+    def attach(name, slots):
+        return StatusTable(slots, name)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,100 @@
+import os
+import asyncio
+from logging import Logger
+
+from temperature_web_control.client.protocol import encode_frame, read_frame, ProtocolError
+
+PUSH_ID = 0
+MAX_BACKLOG = 4 * 1024 * 1024  # bytes of pending events after which a client that doesn't read is dropped
+
+
+class UnixSocketServer:
+    """
+    Serves the event handlers of the app core on a Unix domain socket, for scripts on the same
+    machine. See `client/protocol.py` for the framing: requests are answered by id and handled
+    concurrently, so a client can pipeline them, and statuses travel in a binary encoding.
+    """
+
+    def __init__(self, path, app_core, logger: Logger):
+        self.path = path
+        self.app_core = app_core
+        self.logger = logger
+        self.event_handlers = app_core.get_event_handlers()
+        self.clients = set()
+
+    @staticmethod
+    def create_from_config(config, app_core, logger):
+        path = config.get('unix_socket_path', default=None)
+        if not path:
+            return None
+        return UnixSocketServer(path, app_core, logger)
+
+    async def serve_until_exit(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over by a previous run
+
+        server = await asyncio.start_unix_server(self.handler, self.path)
+        self.logger.info(f"UnixServer: Listening on {self.path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def broadcast(self, clients, message):
+        frame = encode_frame(PUSH_ID, message)
+        for writer in clients:
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_BACKLOG:
+                self.logger.warning("UnixServer: Dropping a client that doesn't keep up with the events.")
+                writer.close()
+                continue
+            writer.write(frame)
+
+    def _reply(self, writer, request_id):
+        async def callback(message):
+            if not writer.is_closing():
+                writer.write(encode_frame(request_id, message))
+                await writer.drain()
+        return callback
+
+    async def _handle_request(self, writer, request_id, event):
+        reply = self._reply(writer, request_id)
+        try:
+            event_type = event['event']
+            if event_type == 'subscribe':
+                self.app_core.subscribe_to(event['subscribe_to'], writer, self.broadcast, self)
+                await reply({'result': 'ok'})
+            elif event_type in self.event_handlers:
+                event['_client'] = writer
+                await self.event_handlers[event_type](event, reply)
+            else:
+                await reply({'result': 'error', 'error_msg': f"Unknown event {event_type}."})
+        except Exception as e:
+            self.logger.error("UnixServer: Error handling a request:")
+            self.logger.exception(e)
+            await reply({'result': 'error', 'error_msg': str(e)})
+
+    async def handler(self, reader, writer):
+        self.logger.info("UnixServer: New connection.")
+        self.clients.add(writer)
+        tasks = set()
+        try:
+            while True:
+                request_id, event = await read_frame(reader)
+                task = asyncio.create_task(self._handle_request(writer, request_id, event))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ProtocolError, ValueError) as e:
+            self.logger.warning(f"UnixServer: Closing a connection after a malformed frame: {e}")
+        finally:
+            self.logger.info("UnixServer: Connection closed.")
+            self.clients.discard(writer)
+            self.app_core.unsubscribe_to_all(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
@@ -0,0 +1,118 @@
+import json
+import asyncio
+from logging import Logger
+
+import websockets
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamConnection:
+    """
+    Websocket client connection to another instance of the app.
+
+    Keeps a single connection, subscribed once to each of `subscribe_events`, and reconnects with
+    an exponential backoff when it drops. Events pushed by the instance are passed to
+    `on_event(connection, message)` in the order they arrive. The protocol has no request ids and
+    replies carry the name of the request's event, so only one request per event is in flight.
+    """
+
+    def __init__(self, name, url, logger: Logger, on_event, on_connected=None, on_disconnected=None,
+                 subscribe_events=('status_available', 'control_changed', 'program_error'),
+                 reconnect_delay=1, max_reconnect_delay=60, request_timeout=30):
+        self.name = name
+        self.url = url
+        self.logger = logger
+        self.on_event = on_event
+        self.on_connected = on_connected
+        self.on_disconnected = on_disconnected
+        self.subscribe_events = subscribe_events
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.request_timeout = request_timeout
+
+        self.websocket = None
+        self.connected = False
+        self.pending = {}  # event -> future of the reply
+        self.locks = {}    # event -> lock
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=5, ping_timeout=20, max_size=None) as ws:
+                    for event in self.subscribe_events:
+                        await ws.send(json.dumps({'event': 'subscribe', 'subscribe_to': event}))
+
+                    self.websocket = ws
+                    self.connected = True
+                    delay = self.reconnect_delay
+                    self.logger.info(f"Upstream {self.name}: Connected to {self.url}.")
+                    if self.on_connected:
+                        # it may send requests, whose replies are read by the loop below
+                        asyncio.ensure_future(self.on_connected(self))
+
+                    async for message in ws:
+                        self._dispatch(json.loads(message))
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException, ValueError) as e:
+                self.logger.warning(f"Upstream {self.name}: Connection to {self.url} failed: {e}")
+            finally:
+                was_connected = self.connected
+                self.websocket = None
+                self.connected = False
+                for future in self.pending.values():
+                    if not future.done():
+                        future.set_exception(UpstreamError(f"Lost connection to {self.name}."))
+                self.pending.clear()
+
+            if was_connected and self.on_disconnected:
+                await self.on_disconnected(self)
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _dispatch(self, message):
+        event = message.get('event')
+        future = self.pending.get(event)
+        if future is not None and 'result' in message:
+            del self.pending[event]
+            if not future.done():
+                future.set_result(message)
+            return
+
+        self.on_event(self, message)
+
+    async def request(self, message):
+        """
+        Send a request and return the reply of the instance.
+        """
+        event = message['event']
+        async with self.locks.setdefault(event, asyncio.Lock()):
+            if not self.connected:
+                raise UpstreamError(f"{self.name} is not connected.")
+
+            future = asyncio.get_event_loop().create_future()
+            self.pending[event] = future
+            try:
+                await self.websocket.send(json.dumps(message))
+                return await asyncio.wait_for(future, self.request_timeout)
+            except asyncio.TimeoutError:
+                raise UpstreamError(f"{self.name} did not answer {event} in {self.request_timeout} s.")
+            except websockets.ConnectionClosed:
+                raise UpstreamError(f"Lost connection to {self.name}.")
+            finally:
+                if self.pending.get(event) is future:
+                    del self.pending[event]
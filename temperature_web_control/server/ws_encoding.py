@@ -0,0 +1,139 @@
+"""
+Binary websocket frames, for the clients that ask for them with the `set_encoding` event.
+
+Only the bulky messages are sent this way: the status (`request_status` replies and
+`status_available` events) and `fetch_history` replies. Everything else stays JSON text.
+
+A frame (little endian) is:
+    format (uint8, 1), flags (uint8, bit 0: body compressed with zlib), kind (uint8, KIND_*),
+    event name length (uint8), event name (ASCII), padding to a multiple of 8, body
+
+History body, laid out so that the arrays can be viewed as typed arrays without copying:
+    device count (uint32), padding (uint32), then for every device:
+    point count n (uint32), name length (uint16), name (UTF-8), padding to a multiple of 8,
+    first timestamp (float64, Unix time), n - 1 timestamp deltas (float32, seconds),
+    padding to a multiple of 4, n temperatures (float32, NaN if unknown), padding to a multiple of 8
+
+Status body: the same as the status frames of the Unix socket API (see `client/protocol.py`).
+"""
+import math
+import zlib
+import struct
+from array import array
+
+from temperature_web_control.client.protocol import encode_status, decode_status, is_status_message
+
+FORMAT = 1
+FLAG_COMPRESSED = 1
+
+KIND_STATUS = 1
+KIND_HISTORY = 2
+
+HEADER = struct.Struct("<BBBB")
+COMPRESS_ABOVE = 1024  # bytes
+
+
+def _pad(parts, size, alignment):
+    padding = -size % alignment
+    if padding:
+        parts.append(bytes(padding))
+    return size + padding
+
+
+def _time_deltas(times):
+    """
+    float32 deltas between the timestamps. Each delta is taken from the value the decoder will
+    have reconstructed, so rounding errors don't add up along the series.
+    """
+    deltas = array('f')
+    current = times[0]
+    for t in times[1:]:
+        deltas.append(t - current)
+        current += deltas[-1]
+    return deltas
+
+
+def encode_history(data):
+    parts = [struct.pack("<II", len(data), 0)]
+    size = 8
+    for name, series in data.items():
+        times = series['time']
+        name_bytes = name.encode("utf-8")
+        parts.append(struct.pack("<IH", len(times), len(name_bytes)) + name_bytes)
+        size = _pad(parts, size + 6 + len(name_bytes), 8)
+
+        deltas = _time_deltas(times) if times else array('f')
+        temperatures = array('f', [math.nan if value is None else value for value in series['temperature']])
+        parts += [struct.pack("<d", times[0] if times else 0), deltas.tobytes()]
+        size = _pad(parts, size + 8 + len(deltas) * 4, 4)
+        parts.append(temperatures.tobytes())
+        size = _pad(parts, size + len(temperatures) * 4, 8)
+
+    return b"".join(parts)
+
+
+def decode_history(body):
+    view = memoryview(body)
+    count = struct.unpack_from("<I", view, 0)[0]
+    offset = 8
+    data = {}
+    for _ in range(count):
+        n, name_length = struct.unpack_from("<IH", view, offset)
+        offset += 6
+        name = bytes(view[offset:offset + name_length]).decode("utf-8")
+        offset += name_length
+        offset += -offset % 8
+
+        current = struct.unpack_from("<d", view, offset)[0]
+        offset += 8
+        deltas = array('f')
+        deltas.frombytes(view[offset:offset + max(n - 1, 0) * 4])
+        offset += len(deltas) * 4
+        offset += -offset % 4
+        temperatures = array('f')
+        temperatures.frombytes(view[offset:offset + n * 4])
+        offset += n * 4
+        offset += -offset % 8
+
+        times = [current] if n else []
+        for delta in deltas:
+            current += delta
+            times.append(current)
+        data[name] = {'time': times,
+                      'temperature': [None if math.isnan(value) else value for value in temperatures]}
+
+    return data
+
+
+def encode_message(event, message, compress=False):
+    """
+    The binary frame for `message`, or None if it is sent as JSON.
+    """
+    if event == 'fetch_history' and message.get('result') == 'ok' and 'data' in message:
+        kind, body = KIND_HISTORY, encode_history(message['data'])
+    elif is_status_message(message):
+        kind, body = KIND_STATUS, encode_status(message['status'])
+    else:
+        return None
+
+    flags = 0
+    if compress and len(body) > COMPRESS_ABOVE:
+        body = zlib.compress(body, 6)
+        flags |= FLAG_COMPRESSED
+
+    name = event.encode("ascii")
+    header = HEADER.pack(FORMAT, flags, kind, len(name)) + name
+    return header + bytes(-len(header) % 8) + body
+
+
+def decode_message(frame):
+    fmt, flags, kind, name_length = HEADER.unpack_from(frame, 0)
+    event = frame[HEADER.size:HEADER.size + name_length].decode("ascii")
+    start = HEADER.size + name_length
+    body = frame[start + -start % 8:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+
+    if kind == KIND_HISTORY:
+        return {'event': event, 'result': 'ok', 'data': decode_history(body)}
+    return {'event': event, 'result': 'ok', 'status': decode_status(body)}
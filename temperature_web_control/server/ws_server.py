@@ -6,6 +6,8 @@ from logging import Logger
 
 import websockets
 
+from temperature_web_control.server.ws_encoding import encode_message
+
 
 class WebSocketServer:
     def __init__(self, bind_addr, port, logger):
@@ -13,8 +15,11 @@ class WebSocketServer:
         self.port = port
         self.active_ws = []
         self.event_handlers = {}
+        self.encodings = {}  # websocket -> {'compress': bool}, for the clients using binary frames
         self.logger: Logger = logger
 
+        self.register_event_handler('set_encoding', self.on_set_encoding_event)
+
     def register_event_handler(self, event, handler):
         if event not in self.event_handlers:
             self.event_handlers[event] = [handler]
@@ -45,6 +50,7 @@ class WebSocketServer:
             self.logger.info(f"WSServer: Remove client "
                              f"{websocket.remote_address[0]}:{websocket.remote_address[1]} from the broadcast list.")
             self.active_ws.remove(websocket)
+            self.encodings.pop(websocket, None)
             if 'disconnected' in self.event_handlers:
                 event = {
                     'event': 'disconnected',
@@ -53,6 +59,23 @@ class WebSocketServer:
 
                 await asyncio.gather(*[handler(event, None) for handler in self.event_handlers['disconnected']])
 
+    async def on_set_encoding_event(self, event, callback):
+        """
+        Switch the client between JSON text frames ('json', the default) and binary frames for the
+        status and history messages ('binary', see `ws_encoding`), optionally zlib compressed.
+        """
+        websocket = event['_client_ws']
+        encoding = event.get('encoding', 'json')
+        if encoding == 'binary':
+            self.encodings[websocket] = {'compress': bool(event.get('compress', False))}
+        elif encoding == 'json':
+            self.encodings.pop(websocket, None)
+        else:
+            await callback({'result': 'error', 'error_msg': f"Unknown encoding {encoding}."})
+            return
+
+        await callback({'result': 'ok', 'encoding': encoding})
+
     async def send(self, websocket, message_dict):
         try:
             self.logger.debug(f"Send to : {websocket}" + json.dumps(message_dict))
@@ -63,14 +86,39 @@ class WebSocketServer:
     async def send_event(self, websocket, event, message_dict):
         try:
             message_dict.update({ 'event': event })
-            self.logger.debug(f"WSServer: Send to : {websocket}" + json.dumps(message_dict))
-            await websocket.send(json.dumps(message_dict))
+            frame = None
+            if websocket in self.encodings:
+                frame = encode_message(event, message_dict, self.encodings[websocket]['compress'])
+
+            if frame is not None:
+                self.logger.debug(f"WSServer: Send to : {websocket} binary {event}, {len(frame)} bytes")
+                await websocket.send(frame)
+            else:
+                self.logger.debug(f"WSServer: Send to : {websocket}" + json.dumps(message_dict))
+                await websocket.send(json.dumps(message_dict))
         except websockets.ConnectionClosed:
             pass
 
     async def broadcast(self, websocket_clients, message_dict):
         self.logger.debug("Broadcast: " + json.dumps(message_dict))
-        websockets.broadcast(websocket_clients, json.dumps(message_dict))
+        text_clients = []
+        binary_clients = {}  # compress -> clients
+        for websocket in websocket_clients:
+            if websocket in self.encodings:
+                binary_clients.setdefault(self.encodings[websocket]['compress'], []).append(websocket)
+            else:
+                text_clients.append(websocket)
+
+        # every encoding of the message is made once, whatever the number of clients using it
+        for compress, clients in binary_clients.items():
+            frame = encode_message(message_dict.get('event', ''), message_dict, compress)
+            if frame is not None:
+                websockets.broadcast(clients, frame)
+            else:
+                text_clients += clients
+
+        if text_clients:
+            websockets.broadcast(text_clients, json.dumps(message_dict))
 
     async def serve_until_exit(self):
         self.logger.info(f"WSServer: Websocket server running at ws://{self.bind_addr}:{self.port}")
@@ -0,0 +1,69 @@
+import pytest
+
+from temperature_web_control.model.estimators import SlopeEstimator
+from temperature_web_control.plugin.alert_expression import RuleSetCompiler, AlertExpressionError
+
+
+class TestRuleSetCompiler:
+    def test_evaluate(self):
+        compiler = RuleSetCompiler()
+        combined = compiler.add_rule("T1 > 250 and T2 < 100")
+        quoted = compiler.add_rule("`SodiumCup(T1)` - T2 >= 50")
+        chained = compiler.add_rule("20 < abs(T2) <= 30 or max(T1, T2) / 2 > 1000")
+        rule_set = compiler.build()
+
+        assert rule_set.rule_devices[quoted] == ["SodiumCup(T1)", "T2"]
+
+        status = {
+            'T1': {'temperature': 260},
+            'T2': {'temperature': 25},
+            'SodiumCup(T1)': {'temperature': 60}
+        }
+        assert rule_set.evaluate(status) == (True, False, True)
+
+        status['T2']['temperature'] = 5
+        assert rule_set.evaluate(status) == (True, True, False)
+
+    def test_missing_readings(self):
+        compiler = RuleSetCompiler()
+        compiler.add_rule("not T1 > 250")
+        compiler.add_rule("rate(T1) > 5")
+        rule_set = compiler.build()
+
+        assert rule_set.evaluate({'T1': {'status': 'error'}}) == (False, False)
+
+        estimator = SlopeEstimator(window=60)
+        for t in range(4):
+            estimator.add(t * 10, 20 + t * 2)  # 12 degrees/min
+        assert rule_set.evaluate({'T1': {'temperature': 26}}, {'T1': estimator}) == (True, True)
+
+    def test_unknown_results(self):
+        compiler = RuleSetCompiler()
+        compiler.add_rule("not (T1 / 0 > 1)")
+        compiler.add_rule("not (T1 / T2 > 1 or T1 > 100)")
+        compiler.add_rule("T1 / T2 > 1 or T1 > 10")
+        compiler.add_rule("not T1 > 100")
+        rule_set = compiler.build()
+
+        # a division by zero is unknown, negating it doesn't make the rule fire
+        assert rule_set.evaluate({'T1': {'temperature': 20}, 'T2': {'temperature': 0}}) == (False, False, True, True)
+        assert rule_set.evaluate({'T1': {'temperature': 20}, 'T2': {'temperature': 40}}) == (False, True, True, True)
+
+    def test_common_subexpressions(self):
+        compiler = RuleSetCompiler()
+        compiler.add_rule("T1 - T2 > 10")
+        compiler.add_rule("T1 - T2 > 10 and T3 < 0")
+        rule_set = compiler.build()
+
+        assert rule_set.source.count("(v0 - v1)") == 1
+        assert rule_set.source.count("(v2 > v3)") == 1
+
+    def test_errors(self):
+        with pytest.raises(AlertExpressionError):
+            RuleSetCompiler().add_rule("T1 >")
+
+        with pytest.raises(AlertExpressionError):
+            RuleSetCompiler().add_rule("__import__('os')")
+
+        with pytest.raises(AlertExpressionError):
+            RuleSetCompiler(known_devices=["T1"]).add_rule("T2 > 0")
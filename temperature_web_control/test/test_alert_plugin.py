@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import socketserver
+import threading
+
+from temperature_web_control.model.estimators import SlopeEstimator
+from temperature_web_control.plugin.alert_plugin import StatusAlertEngine, HighTemperatureStatusAlertCondition, \
+    LowTemperatureStatusAlertCondition, TemperatureDifferencesTooLargeStatusAlertCondition, \
+    TemperatureRisingTooFastAlertMonitor, TemperatureDroppingTooFastAlertMonitor, EmailDigestSender, AlertPluginState
+
+logger = logging.getLogger("test")
+
+
+def make_status(**temperatures):
+    return {dev: {'name': dev, 'temperature': t} for dev, t in temperatures.items()}
+
+
+class TestStatusAlertEngine:
+    def test_threshold_conditions(self):
+        high_100 = HighTemperatureStatusAlertCondition("T1", 100, 0, logger)
+        high_200 = HighTemperatureStatusAlertCondition("T1", 200, 0, logger)
+        low_10 = LowTemperatureStatusAlertCondition("T1", 10, 0, logger)
+        high_t2 = HighTemperatureStatusAlertCondition("T2", 100, 0, logger)
+
+        engine = StatusAlertEngine([high_100, high_200, low_10, high_t2])
+
+        assert engine.evaluate(make_status(T1=50, T2=50), 0) == []
+        assert engine.evaluate(make_status(T1=150, T2=50), 5) == [high_100]
+        assert set(engine.evaluate(make_status(T1=250, T2=150), 10)) == {high_200, high_t2}
+        assert engine.evaluate(make_status(T1=250, T2=150), 15) == []  # already alerting
+        assert engine.evaluate(make_status(T1=5, T2=150), 20) == [low_10]
+        assert engine.active == {low_10, high_t2}
+        assert engine.evaluate(make_status(T1=150, T2=150), 25) == [high_100]
+
+    def test_last_for(self):
+        high = HighTemperatureStatusAlertCondition("T1", 100, 60, logger)
+        diff = TemperatureDifferencesTooLargeStatusAlertCondition(["T1", "T2"], 50, 60, logger)
+        engine = StatusAlertEngine([high, diff])
+
+        assert engine.evaluate(make_status(T1=150, T2=20), 1000) == []
+        # unchanged readings still let pending conditions reach `last_for`
+        assert engine.evaluate(make_status(T1=150, T2=20), 1030) == []
+        assert set(engine.evaluate(make_status(T1=150, T2=20), 1060)) == {high, diff}
+
+        assert engine.evaluate(make_status(T1=50, T2=20), 1065) == []
+        assert engine.active == set()
+        assert engine.evaluate(make_status(T1=150, T2=20), 1070) == []
+
+    def test_rate_conditions_share_estimator(self):
+        rising = TemperatureRisingTooFastAlertMonitor("T1", 5, 0, logger)
+        dropping = TemperatureDroppingTooFastAlertMonitor("T1", 5, 0, logger)
+        engine = StatusAlertEngine([rising, dropping], rate_window=20)
+
+        assert rising.estimator is dropping.estimator
+
+        fired = []
+        for i in range(10):
+            # 6 degrees/min, sampled with jitter in the acquisition times
+            t = 1000 + i * 5 + (0.5 if i % 2 else 0)
+            status = {'T1': {'name': 'T1', 'temperature': 20 + (t - 1000) / 10, 'time': t}}
+            fired += engine.evaluate(status, t)
+
+        assert fired == [rising]
+
+
+class FakeConfig:
+    def __init__(self, config):
+        self.config = config
+
+    def get(self, *args, default=None):
+        return self.config.get(args[0], default)
+
+
+class FakeAppCore:
+    def __init__(self):
+        self.dev_instances = {'T1': None, 'T2': None}
+        self.programs = {}
+
+    def subscribe_to(self, *args):
+        pass
+
+
+class TestAlertPluginReload:
+    def test_active_alert_survives_reload(self):
+        high = {'high_temperature': {'device': 'T1', 'temperature_threshold': 100, 'actions': ['display_alert']}}
+        expression = {'expression': {'rule': "T1 - T2 > 50", 'actions': ['display_alert']}}
+        config = FakeConfig({'alerts': [high, expression]})
+        plugin = AlertPluginState(config, FakeAppCore(), logger)
+
+        async def status(**temperatures):
+            await plugin.on_status_available_event(None, {'status': {
+                dev: {'name': dev, 'temperature': t, 'time': 100} for dev, t in temperatures.items()}})
+
+        async def main():
+            await status(T1=150, T2=20)
+            assert plugin.action_queue.queue.qsize() == 2
+
+            # an unrelated rule is added
+            low = {'low_temperature': {'device': 'T2', 'temperature_threshold': 0, 'actions': ['display_alert']}}
+            config.config['alerts'] = [high, expression, low]
+            await plugin.on_config_changed_event(None, {'sections': ['alerts'],
+                                                        'devices': {'added': [], 'removed': [], 'changed': []}})
+            await status(T1=150, T2=20)
+            assert plugin.action_queue.queue.qsize() == 2  # no duplicates
+
+            await status(T1=150, T2=-10)
+            assert plugin.action_queue.queue.qsize() == 3  # the new rule works
+
+            # a changed rule starts over
+            config.config['alerts'] = [dict(high, high_temperature=dict(high['high_temperature'],
+                                                                         temperature_threshold=120)),
+                                       expression, low]
+            await plugin.on_config_changed_event(None, {'sections': ['alerts'],
+                                                        'devices': {'added': [], 'removed': [], 'changed': []}})
+            await status(T1=150, T2=-10)
+            assert plugin.action_queue.queue.qsize() == 4
+
+        asyncio.run(main())
+
+
+class TestSlopeEstimator:
+    def test_sliding_window(self):
+        estimator = SlopeEstimator(window=10)
+        assert estimator.slope is None
+
+        for t in range(20):
+            estimator.add(1000 + t, 2 * t)
+        assert len(estimator) == 11
+        assert abs(estimator.rate - 120) < 1e-9
+
+        # the old slope leaves the window completely
+        for t in range(20, 40):
+            estimator.add(1000 + t, 40 - (t - 20))
+        assert abs(estimator.slope + 1) < 1e-9
+
+        estimator.add(1039, 100)  # repeated timestamp is ignored
+        assert abs(estimator.slope + 1) < 1e-9
+
+    def test_rebase(self):
+        estimator = SlopeEstimator(window=60)
+        for t in range(0, 8000, 5):
+            estimator.add(1.7e9 + t, 0.5 * t)
+
+        assert estimator.t0 > 1.7e9
+        assert abs(estimator.slope - 0.5) < 1e-9
+
+
+class SMTPStub:
+    def __init__(self):
+        self.connections = 0
+        self.messages = []
+
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                stub.connections += 1
+                self.reply("220 stub")
+                for line in self.rfile:
+                    command = line.decode("ascii").strip().upper()
+                    if command.startswith("DATA"):
+                        self.reply("354 go ahead")
+                        data = b""
+                        for data_line in self.rfile:
+                            if data_line == b".\r\n":
+                                break
+                            data += data_line
+                        stub.messages.append(data.decode("utf-8"))
+                        self.reply("250 queued")
+                    elif command.startswith("QUIT"):
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("250 ok")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class TestEmailDigestSender:
+    def test_digest_and_connection_reuse(self):
+        stub = SMTPStub()
+
+        async def run():
+            sender = EmailDigestSender(smtp_host="127.0.0.1", smtp_port=stub.port, ssl=False, ssl_verify=True,
+                                       sender="lab@example.com", password=None, recipients=["me@example.com"],
+                                       digest_window=0.1, logger=logger)
+            for i in range(3):
+                sender.add(f"Alert {i}", f"Device {i} too hot")
+            await asyncio.sleep(0.5)
+
+            sender.add("Alert 3", "Device 3 too hot")
+            await asyncio.sleep(0.5)
+            sender.close()
+
+        asyncio.run(run())
+
+        assert stub.connections == 1
+        assert len(stub.messages) == 2
+        assert "Subject: TEMPERATURE ALERT: 3 alerts" in stub.messages[0]
+        assert all(f"Device {i} too hot" in stub.messages[0] for i in range(3))
+        assert "Subject: Alert 3" in stub.messages[1]
+
+    def test_failed_flush_is_logged(self, caplog):
+        async def run():
+            sender = EmailDigestSender(smtp_host="127.0.0.1", smtp_port=0, ssl=False, ssl_verify=True,
+                                       sender="lab@example.com", password=None, recipients=["me@example.com"],
+                                       digest_window=0.01, logger=logger)
+
+            def build_message(entries):
+                raise ValueError("bad header")
+
+            sender.build_message = build_message
+            sender.add("Alert", "Device too hot")
+            await asyncio.sleep(0.1)
+            return sender
+
+        sender = asyncio.run(run())
+
+        assert sender.flush_task.done()
+        assert "Failed to send email digest" in caplog.text
+        assert "bad header" in caplog.text
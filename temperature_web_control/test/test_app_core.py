@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+import yaml
+
+from temperature_web_control.model.program import Program
+from temperature_web_control.server.app_core import TemperatureAppCore
+from temperature_web_control.utils import Config
+
+
+def write_config(path, fluctuation):
+    path.write_text(yaml.safe_dump({
+        'config_reload_interval': 0,
+        'devices': [{'name': 'T1', 'dev_type': 'Dummy', 'fluctuation': fluctuation},
+                    {'name': 'T2', 'dev_type': 'Dummy', 'fluctuation': fluctuation}],
+        'programs': [],
+    }))
+
+
+class TestConfigReload:
+    def test_device_in_use_is_reloaded_after_the_program(self, tmp_path):
+        path = tmp_path / "config.yml"
+        write_config(path, 0)
+        app_core = TemperatureAppCore(Config(str(path)), logging.getLogger("test"))
+        started = []
+
+        async def main():
+            soak = Program.from_dict({'name': 'Soak', 'description': '', 'steps': [
+                [{'action': 'SOAK', 'device': 'T1', 'params': {'TIME': 0.01}}],
+            ]})
+            queued = Program.from_dict({'name': 'Next', 'description': '', 'steps': [
+                [{'action': 'STANDBY', 'device': 'T1'}],
+            ]})
+            manager = app_core.program_manager
+            manager.create_program_task(soak)
+            manager.create_program_task(queued, queue=True)
+            await asyncio.sleep(0)
+
+            old_t1, old_t2 = app_core.dev_instances['T1'], app_core.dev_instances['T2']
+            write_config(path, 1)
+            await app_core.apply_config_diff(app_core.config.reload())
+
+            assert app_core.dev_instances['T1'] is old_t1  # in use, kept until the program ends
+            assert app_core.dev_instances['T2'] is not old_t2
+            assert app_core.dev_instances['T2'].dummy_fluctuation == 1
+
+            # the queued program starts on the reloaded device
+            real_run_program = manager.run_program
+
+            async def run_program(program, *args):
+                started.append((program.name, app_core.dev_instances['T1'].dummy_fluctuation))
+                await real_run_program(program, *args)
+
+            manager.run_program = run_program
+            while manager.resources.running or manager.resources.queued or app_core.reload_tasks:
+                await asyncio.sleep(0.05)
+
+            assert app_core.dev_instances['T1'] is not old_t1
+            assert app_core.dev_instances['T1'].dummy_fluctuation == 1
+            assert not app_core.pending_device_configs
+            manager.wheel.close()
+
+        asyncio.run(main())
+        assert started == [('Next', 1)]
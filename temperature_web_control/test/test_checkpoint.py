@@ -0,0 +1,169 @@
+import asyncio
+import logging
+
+from temperature_web_control.model.program import Program
+from temperature_web_control.server.checkpoint import CheckpointLog
+from temperature_web_control.server.program_manager import ProgramManager
+from temperature_web_control.server.simulator import VirtualClockEventLoop, SimulatedDevice
+
+logger = logging.getLogger("test")
+
+
+class Config:
+    def get(self, *args, default=None):
+        return default
+
+
+def make_program():
+    return Program.from_dict({'name': 'Test', 'description': '', 'steps': [
+        [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 30, 'RATE': 5}}],
+        [{'action': 'SOAK', 'device': 'T1', 'params': {'TIME': 10}}],
+        [{'action': 'LOOP', 'params': {'GOTO': 0, 'TIMES': 2}}],
+        [{'action': 'STANDBY', 'device': 'T1'}],
+    ]})
+
+
+async def noop(*args):
+    pass
+
+
+class BrokenDevice(SimulatedDevice):
+    @SimulatedDevice.setpoint.setter
+    def setpoint(self, value):
+        raise OSError("no answer")
+
+
+def run_manager(path, coro_factory, device_class=SimulatedDevice):
+    loop = VirtualClockEventLoop()
+    try:
+        async def main():
+            checkpoint = CheckpointLog(str(path), logger, flush_interval=0.1, clock=loop.time)
+            devices = {'T1': device_class('T1', loop.time, 20)}
+            manager = ProgramManager(Config(), devices, noop, noop, logger, clock=loop.time, checkpoint=checkpoint)
+            await coro_factory(manager, checkpoint)
+            await checkpoint.flush()
+            manager.wheel.close()
+            return checkpoint
+
+        return loop.run_until_complete(main())
+    finally:
+        loop.close()
+
+
+class TestCheckpoint:
+    def test_interrupted_program_is_resumable(self, tmp_path):
+        path = tmp_path / "checkpoint.log"
+
+        async def interrupt(manager, checkpoint):
+            manager.create_program_task(make_program())
+            await asyncio.sleep(3 * 60)  # in the soak of the first loop
+            task = manager.current_program_task['Test']
+            task.cancel()  # like a shutdown
+            await asyncio.gather(task, return_exceptions=True)
+
+        run_manager(path, interrupt)
+
+        interrupted = CheckpointLog(str(path), logger).interrupted
+        assert interrupted['Test']['step'] == 1
+        assert interrupted['Test']['loops'] == [0]
+        assert interrupted['Test']['ramps'] == {}
+
+        steps = []
+
+        async def resume(manager, checkpoint):
+            state = checkpoint.interrupted.pop('Test')
+            manager.resume_program(state)
+            await asyncio.sleep(0)
+            steps.append(manager.current_step_index['Test'])
+            await manager.current_program_task['Test']
+
+        checkpoint = run_manager(path, resume)
+        assert steps == [1]
+        assert checkpoint.programs == {}
+        assert CheckpointLog(str(path), logger).interrupted == {}
+
+    def test_soak_resumes_for_the_time_left(self, tmp_path):
+        path = tmp_path / "checkpoint.log"
+
+        async def interrupt(manager, checkpoint):
+            manager.create_program_task(make_program())
+            await asyncio.sleep(5 * 60)  # ramp of 2 min, then 3 min into the soak of 10 min
+            state = checkpoint.programs['Test']
+            assert state['time'] - state['step_time'] >= 2 * 60  # recorded while soaking, in case of a crash
+
+            task = manager.current_program_task['Test']
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        run_manager(path, interrupt)
+        state = CheckpointLog(str(path), logger).interrupted['Test']
+        assert state['step'] == 1
+        assert state['time'] - state['step_time'] == 3 * 60
+
+        async def resume_and_interrupt(manager, checkpoint):
+            manager.resume_program(checkpoint.interrupted.pop('Test'))
+            await asyncio.sleep(2 * 60)
+            task = manager.current_program_task['Test']
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        run_manager(path, resume_and_interrupt)
+        state = CheckpointLog(str(path), logger).interrupted['Test']
+        assert state['time'] - state['step_time'] == 5 * 60  # 3 min before, 2 min after the first resume
+
+        durations = []
+
+        async def resume(manager, checkpoint):
+            start = asyncio.get_event_loop().time()
+            manager.resume_program(checkpoint.interrupted.pop('Test'))
+            await asyncio.sleep(0)
+            while manager.current_step_index['Test'] == 1:
+                await asyncio.sleep(1)
+            durations.append(asyncio.get_event_loop().time() - start)
+
+            task = manager.current_program_task['Test']
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        run_manager(path, resume)
+        assert 5 * 60 <= durations[0] <= 5 * 60 + 2
+
+    def test_aborted_program_is_not_resumable(self, tmp_path):
+        path = tmp_path / "checkpoint.log"
+
+        async def abort(manager, checkpoint):
+            manager.create_program_task(make_program())
+            await asyncio.sleep(60)
+            assert checkpoint.programs['Test']['ramps']['T1'] > 20
+            task = manager.current_program_task['Test']
+            manager.abort_program('Test')
+            await asyncio.gather(task, return_exceptions=True)
+
+        run_manager(path, abort)
+        assert CheckpointLog(str(path), logger).interrupted == {}
+
+    def test_failed_program_is_not_resumable(self, tmp_path):
+        path = tmp_path / "checkpoint.log"
+
+        async def fail(manager, checkpoint):
+            manager.create_program_task(make_program())
+            await asyncio.sleep(60)  # the first setpoint write of the ramp fails
+            assert 'Test' not in manager.current_programs
+
+        run_manager(path, fail, BrokenDevice)
+        assert CheckpointLog(str(path), logger).interrupted == {}
+
+    def test_compaction(self, tmp_path):
+        path = tmp_path / "checkpoint.log"
+
+        async def write(manager, checkpoint):
+            checkpoint.compact_after = 10
+            checkpoint.start(make_program().to_dict())
+            for i in range(30):
+                checkpoint.ramp('Test', 'T1', i)
+            await checkpoint.flush()
+
+        run_manager(path, write)
+
+        assert len(path.read_text().splitlines()) == 1
+        assert CheckpointLog(str(path), logger).interrupted['Test']['ramps'] == {'T1': 29}
@@ -0,0 +1,103 @@
+import asyncio
+
+import yaml
+
+from temperature_web_control.utils import Config
+
+
+class TestConfig:
+    def test_programs_file(self, tmp_path):
+        config_path = tmp_path / "config.yml"
+        config_path.write_text(yaml.dump({'devices': [{'name': 'T1'}], 'programs_file': 'programs.yml'}))
+        (tmp_path / "programs.yml").write_text(yaml.dump([{'name': 'P1', 'steps': []}]))
+
+        config = Config(str(config_path))
+        assert config.get('programs') == [{'name': 'P1', 'steps': []}]
+
+        config_mtime = config_path.stat().st_mtime_ns
+        config.set('programs', value=[{'name': 'P2', 'steps': []}])
+        config.write()
+
+        assert yaml.safe_load((tmp_path / "programs.yml").read_text()) == [{'name': 'P2', 'steps': []}]
+        assert config_path.stat().st_mtime_ns == config_mtime  # untouched
+        assert not list(tmp_path.glob("*.tmp"))
+
+        config.set('history_length', value=10)
+        config.write()
+        assert yaml.safe_load(config_path.read_text()) == \
+               {'devices': [{'name': 'T1'}], 'programs_file': 'programs.yml', 'history_length': 10}
+
+    def test_schedule_write_coalesces(self, tmp_path, monkeypatch):
+        config_path = tmp_path / "config.yml"
+        config_path.write_text(yaml.dump({'programs': []}))
+        config = Config(str(config_path), write_delay=0.05)
+
+        writes = []
+        original = Config._atomic_dump
+        monkeypatch.setattr(Config, "_atomic_dump", staticmethod(lambda path, data: (writes.append(data),
+                                                                                      original(path, data))))
+
+        async def main():
+            for i in range(10):
+                config.set('programs', value=[{'name': f"P{i}"}])
+                config.schedule_write()
+                await asyncio.sleep(0.01)
+            await config.flush()
+
+        asyncio.run(main())
+
+        assert len(writes) == 1
+        assert yaml.safe_load(config_path.read_text()) == {'programs': [{'name': 'P9'}]}
+
+    def test_failed_write(self, tmp_path, monkeypatch):
+        config_path = tmp_path / "config.yml"
+        config_path.write_text(yaml.dump({'programs': []}))
+        config = Config(str(config_path), write_delay=0.01)
+
+        def full_disk(path, data):
+            raise OSError("No space left on device")
+
+        errors = []
+
+        async def error_callback(e):
+            errors.append(str(e))
+
+        async def main():
+            monkeypatch.setattr(Config, "_atomic_dump", staticmethod(full_disk))
+            config.set('programs', value=[{'name': "P"}])
+            config.schedule_write(error_callback)
+            await asyncio.sleep(0.1)
+            assert errors == ["No space left on device"]
+            assert config.dirty == {'programs'}  # not lost
+
+            monkeypatch.undo()
+            await config.flush()  # like on shutdown
+
+        asyncio.run(main())
+
+        assert not config.dirty
+        assert yaml.safe_load(config_path.read_text()) == {'programs': [{'name': 'P'}]}
+
+    def test_reload_diff(self, tmp_path):
+        config_path = tmp_path / "config.yml"
+        config_path.write_text(yaml.dump({
+            'devices': [{'name': 'T1', 'dev_type': 'Dummy'}, {'name': 'T2', 'dev_type': 'Dummy'}],
+            'programs': [{'name': 'P1', 'steps': []}],
+            'update_interval': 5
+        }))
+        config = Config(str(config_path))
+        assert not config.changed_on_disk()
+
+        config_path.write_text(yaml.dump({
+            'devices': [{'name': 'T1', 'dev_type': 'Dummy', 'fluctuation': 2}, {'name': 'T3', 'dev_type': 'Dummy'}],
+            'programs': [{'name': 'P1', 'steps': []}],
+            'update_interval': 10
+        }))
+        diff = config.reload()
+
+        assert list(diff.devices.added) == ['T3']
+        assert list(diff.devices.removed) == ['T2']
+        assert list(diff.devices.changed) == ['T1']
+        assert not diff.programs.added and not diff.programs.removed and not diff.programs.changed
+        assert 'update_interval' in diff.sections and 'programs' not in diff.sections
+        assert config.get('update_interval') == 10
@@ -0,0 +1,115 @@
+import io
+import csv
+import gzip
+import time
+import socket
+import asyncio
+import logging
+import threading
+import urllib.request
+import urllib.error
+
+import pytest
+
+from temperature_web_control.server.app_core import TemperatureHistory
+from temperature_web_control.server.export import export_csv, export_handler, parse_time
+from temperature_web_control.server.http_server import serve_http
+
+
+def make_history(length=100, samples=150):
+    history = TemperatureHistory(length, ['T1', 'T2'])
+
+    async def record():
+        for i in range(samples):
+            status = {'T1': {'time': 1000.0 + i, 'temperature': 20.0 + i},
+                      'T2': {'time': 1000.0 + i, 'temperature': None}}
+            await history.status_update_handler(None, {'status': status})
+
+    asyncio.run(record())
+    return history
+
+
+class TestExport:
+    def test_iter_range(self):
+        history = make_history()
+        chunks = list(history.iter_range('T1', 1060, 1120.5, chunk_size=16))
+        assert all(len(times) <= 16 for times, _ in chunks)
+        times = [t for chunk, _ in chunks for t in chunk]
+        assert times == [1000.0 + i for i in range(60, 121)]
+        assert [t for _, chunk in chunks for t in chunk] == [20.0 + i for i in range(60, 121)]
+
+    def test_iter_range_while_recording(self):
+        history = make_history()
+        exported = []
+        for times, _ in history.iter_range('T1', chunk_size=10):
+            exported += times
+            # samples pushed out of the history in between are skipped, none is repeated
+            status = {'T1': {'time': 2000.0 + len(exported), 'temperature': 0}}
+            asyncio.run(history.status_update_handler(None, {'status': status}))
+
+        assert exported == sorted(set(exported))
+        assert exported[0] == 1050.0
+        assert exported[-1] == 1149.0
+
+    def test_csv(self):
+        data = b"".join(export_csv(make_history(), ['T1', 'T2'], 1100, None)).decode()
+        rows = list(csv.DictReader(io.StringIO(data)))
+        assert len(rows) == 100
+        assert rows[0] == {'device': 'T1', 'time': '1100.0', 'temperature': '120.0'}
+        assert rows[-1] == {'device': 'T2', 'time': '1149.0', 'temperature': ''}
+
+    def test_columnar(self):
+        pa = pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+
+        handler = export_handler(lambda: make_history())
+
+        class Request:
+            path = "/export?device=T1&format=parquet&start=1970-01-01T00:18:30"
+
+        _, _, parts, _ = handler(Request)
+        table = pq.read_table(io.BytesIO(b"".join(parts)))
+        assert table.num_rows == 40
+        assert table.column('temperature').to_pylist()[0] == 130.0
+
+        Request.path = "/export?format=arrow"
+        _, _, parts, _ = handler(Request)
+        table = pa.ipc.open_stream(b"".join(parts)).read_all()
+        assert table.num_rows == 200
+        assert table.column('temperature').null_count == 100
+
+    def test_errors(self):
+        handler = export_handler(lambda: make_history())
+
+        class Request:
+            path = "/export?device=T3"
+
+        assert handler(Request)[0] == 400
+        Request.path = "/export?format=xlsx"
+        assert handler(Request)[0] == 400
+        with pytest.raises(Exception):
+            parse_time("yesterday")
+
+    def test_http(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        history = make_history(length=100000, samples=20000)
+        threading.Thread(target=serve_http, daemon=True, args=(
+            "127.0.0.1", port, ".", {'/export': export_handler(lambda: history)},
+            logging.getLogger("test"))).start()
+
+        for _ in range(50):
+            try:
+                request = urllib.request.Request(f"http://127.0.0.1:{port}/export?device=T1",
+                                                 headers={'Accept-Encoding': 'gzip'})
+                with urllib.request.urlopen(request) as response:
+                    assert response.headers['Content-Encoding'] == 'gzip'
+                    assert response.headers['Transfer-Encoding'] == 'chunked'
+                    data = gzip.decompress(response.read()).decode()
+                break
+            except urllib.error.URLError:
+                time.sleep(0.05)
+
+        assert len(data.splitlines()) == 20001
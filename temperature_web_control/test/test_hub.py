@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+from temperature_web_control.server.hub import FederationHub
+
+
+class FakeConfig:
+    def get(self, *args, default=None):
+        return default
+
+
+class FakeUpstream:
+    def __init__(self, name):
+        self.name = name
+        self.connected = True
+        self.requests = []
+
+    async def request(self, message):
+        self.requests.append(message)
+        return {'event': message['event'], 'result': 'ok', 'name': message.get('name', 'generated')}
+
+
+class TestFederationHub:
+    def make_hub(self):
+        hub = FederationHub(FakeConfig(), logging.getLogger("test"),
+                            [{'name': 'lab1', 'url': 'ws://lab1'}, {'name': 'lab2', 'url': 'ws://lab2'}],
+                            merge_delay=0.01)
+        hub.upstreams = {name: FakeUpstream(name) for name in hub.upstreams}
+        return hub
+
+    def test_merge_status(self):
+        hub = self.make_hub()
+        broadcasts = []
+
+        async def handler(subscribers, message):
+            broadcasts.append(message['status'])
+
+        async def main():
+            hub.subscribe_to('status_available', 'client', handler)
+            hub.on_upstream_event(hub.upstreams['lab1'], {'event': 'status_available', 'status': {
+                'T1': {'name': 'T1', 'temperature': 20, 'current_program': 'Bake', 'status': 'ok'}}})
+            hub.on_upstream_event(hub.upstreams['lab2'], {'event': 'status_available', 'status': {
+                'T1': {'name': 'T1', 'temperature': 30, 'current_program': '', 'status': 'ok'}}})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+        assert len(broadcasts) == 1  # both updates merged into one broadcast
+        assert broadcasts[0]['lab1/T1']['current_program'] == 'lab1/Bake'
+        assert broadcasts[0]['lab2/T1']['temperature'] == 30
+        assert list(hub.history.temperatures['lab1/T1']) == [20]
+
+    def test_forward_commands(self):
+        hub = self.make_hub()
+        replies = []
+
+        async def callback(message):
+            replies.append(message)
+
+        async def main():
+            handlers = hub.get_event_handlers()
+            await handlers['standby_device']({'event': 'standby_device', 'device': 'lab2/T1',
+                                              '_client_ws': object()}, callback)
+            await handlers['run_program']({'event': 'run_program', 'name': 'lab1/P', 'steps': [
+                [{'action': 'SET_TEMPERATURE', 'device': 'lab1/T1', 'temperature': 20}]]}, callback)
+            await handlers['run_program']({'event': 'run_program', 'steps': [
+                [{'action': 'SET_TEMPERATURE', 'device': 'lab1/T1'}, {'action': 'STANDBY', 'device': 'lab2/T1'}]]},
+                callback)
+
+        asyncio.run(main())
+
+        assert hub.upstreams['lab2'].requests == [{'event': 'standby_device', 'device': 'T1'}]
+        assert hub.upstreams['lab1'].requests[0]['name'] == 'P'
+        assert hub.upstreams['lab1'].requests[0]['steps'][0][0]['device'] == 'T1'
+        assert replies[1]['name'] == 'lab1/P'
+        assert replies[2]['result'] == 'error'
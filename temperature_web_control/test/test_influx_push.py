@@ -0,0 +1,89 @@
+import os
+import gzip
+import asyncio
+import logging
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from temperature_web_control.plugin.influx_push_plugin import InfluxWriter, WindowAggregate
+
+
+class InfluxStub:
+    def __init__(self):
+        self.status = 204
+        self.requests = []
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                stub.requests.append((self.path, self.headers['Content-Encoding'], gzip.decompress(body)))
+
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def lines(self):
+        return [line for _, _, body in self.requests for line in body.decode("utf-8").split("\n")]
+
+
+class TestInfluxWriter:
+    def test_batched_write(self, tmp_path):
+        stub = InfluxStub()
+
+        async def run():
+            writer = InfluxWriter(stub.url, "db", None, logging.getLogger("test"), batch_size=2,
+                                  spool_dir=str(tmp_path))
+            writer.write(["m a=1 1", "m a=2 2", "m a=3 3"])
+            await writer.flush()
+
+        asyncio.run(run())
+
+        assert [r[0] for r in stub.requests] == ["/write?db=db", "/write?db=db"]
+        assert all(r[1] == "gzip" for r in stub.requests)
+        assert stub.lines() == ["m a=1 1", "m a=2 2", "m a=3 3"]
+
+    def test_spool_and_replay(self, tmp_path):
+        stub = InfluxStub()
+        stub.status = 503
+
+        async def run():
+            writer = InfluxWriter(stub.url, "db", None, logging.getLogger("test"), max_retries=1, backoff=0,
+                                  spool_dir=str(tmp_path))
+            writer.write(["m a=1 1"])
+            await writer.flush()
+            assert len(os.listdir(tmp_path)) == 1
+
+            stub.status = 204
+            stub.requests.clear()
+            writer.write(["m a=2 2"])
+            await writer.flush()
+
+        asyncio.run(run())
+
+        assert os.listdir(tmp_path) == []
+        assert sorted(stub.lines()) == ["m a=1 1", "m a=2 2"]
+
+
+class TestWindowAggregate:
+    def test_aggregate(self):
+        aggregate = WindowAggregate()
+        for value in [20, 25, 15, 30, 10]:
+            aggregate.add(value)
+
+        assert aggregate.to_fields("T1") == 'T1_mean=20.000,T1_min=10.0,T1_max=30.0,T1_last=10.0,T1_count=5i,' \
+                                           'T1_units="C"'
+
+        aggregate.reset()
+        aggregate.add(-5)
+        assert (aggregate.mean, aggregate.minimum, aggregate.maximum, aggregate.count) == (-5, -5, -5, 1)
@@ -0,0 +1,29 @@
+import sys
+
+from temperature_web_control.utils import ModuleRegistry
+
+
+class TestModuleRegistry:
+    def test_lazy_lookup(self, tmp_path, monkeypatch):
+        package = tmp_path / "fake_drivers"
+        package.mkdir()
+        (package / "__init__.py").write_text("")
+        (package / "a_driver.py").write_text("def dev_types():\n    return ['A']\n")
+        (package / "b_driver.py").write_text("def dev_types():\n    return ['B1', 'B2']\n")
+        (package / "helper.py").write_text("raise ImportError\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+
+        registry = ModuleRegistry("fake_drivers", r"(.*)_driver$", {'A': 'a_driver'},
+                                  "temperature_web_control.test.none", lambda m: m.dev_types())
+
+        assert registry.get('A').dev_types() == ['A']
+        assert "fake_drivers.b_driver" not in sys.modules
+
+        # not builtin: found by importing the other matching modules
+        assert registry.get('B2').dev_types() == ['B1', 'B2']
+        assert registry.get('C') is None
+        assert set(registry.import_times) == {"fake_drivers.a_driver", "fake_drivers.b_driver"}
+
+        for name in list(sys.modules):
+            if name.startswith("fake_drivers"):
+                del sys.modules[name]
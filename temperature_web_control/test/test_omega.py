@@ -1,3 +1,7 @@
+import logging
+
+import pytest
+
 from temperature_web_control.driver.io_device import IODevice
 from temperature_web_control.driver.omega_driver import OmegaISeries
 
@@ -83,3 +87,50 @@ class TestOmega:
 
 
 
+
+
+class RecordingIODevice(IODevice):
+    """
+    IO device answering queries from a table, with the echo disabled, and recording every command.
+    """
+
+    def __init__(self, responses):
+        super().__init__()
+        self.responses = responses
+        self.sent = []
+
+    def send(self, data: bytes):
+        self.sent.append(data)
+
+    def recv(self, max_len=-1):
+        return self.responses.get(self.sent[-1], b"")
+
+    def reset(self, wait=0.5):
+        pass
+
+
+class TestOmegaNativeRamp:
+    def make_omega(self):
+        io_dev = RecordingIODevice({b"*R1F\r": b"00\r", b"*R08\r": b"00\r", b"*R0C\r": b"01\r"})
+        omega = OmegaISeries("T1", io_dev, 1, logging.getLogger("test"), native_ramp=True)
+        io_dev.sent.clear()
+        return omega, io_dev
+
+    def test_upload_ramp(self):
+        # ramp time: hours * 100 + minutes, sent as 4 hex digits
+        for duration, ramp_time in [(5, b"0005"), (90, b"0082"), (59.9, b"003B"), (5999, b"26E7")]:
+            omega, io_dev = self.make_omega()
+            omega.upload_ramp(50, duration)
+            assert io_dev.sent == [b"*W1D" + ramp_time,
+                                   b"*R0C\r",
+                                   b"*W0C41",  # ramp enabled, soak disabled
+                                   b"*W012001F4"]  # setpoint 50.0
+
+    def test_ramp_too_long(self):
+        omega, io_dev = self.make_omega()
+        resets = []
+        omega.reset = lambda wait=0.5: resets.append(wait)
+        assert omega.max_native_ramp_minutes == 5999
+        with pytest.raises(ValueError):
+            omega.upload_ramp(50, 6000)
+        assert io_dev.sent == [] and resets == []  # rejected before any I/O, not retried
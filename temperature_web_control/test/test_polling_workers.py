@@ -0,0 +1,164 @@
+import time
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from temperature_web_control.server.status_table import StatusTable, SlotBusyError, SEQ
+from temperature_web_control.server import polling_workers
+from temperature_web_control.server.polling_workers import PollingWorkerPool, RemoteDevice, WorkerError
+from temperature_web_control.server.program_manager import ProgramManager
+
+
+class Config:
+    def get(self, *args, default=None):
+        return default
+
+
+class TestStatusTable:
+    def test_read_write(self):
+        table = StatusTable(4)
+        try:
+            assert table.read(0) is None
+
+            table.write(1, 100.0, 25.5, None, True)
+            reading = table.read(1)
+            assert (reading.time, reading.temperature, reading.setpoint, reading.control_enabled, reading.error) == \
+                   (100.0, 25.5, None, True, None)
+
+            table.write_error(1, 101.0, "timeout")
+            assert table.read(1).error == "timeout"
+
+            table.clear(1)
+            assert table.read(1) is None
+        finally:
+            table.close()
+
+    def test_dead_writer(self):
+        table = StatusTable(1)
+        try:
+            table.write(0, 100.0, 25.5, None, True)
+            # a writer killed between the two counter updates leaves the counter odd
+            seq = SEQ.unpack_from(table.buf, 0)[0]
+            SEQ.pack_into(table.buf, 0, seq + 1)
+
+            start = time.monotonic()
+            with pytest.raises(SlotBusyError):
+                table.read(0)
+            assert time.monotonic() - start < 1
+
+            # the next write (by a restarted writer) unlocks it
+            table.write(0, 101.0, 26.5, None, True)
+            assert table.read(0).temperature == 26.5
+        finally:
+            table.close()
+
+    def test_consistent_reads(self):
+        table = StatusTable(1)
+        reader = StatusTable.attach(table.name, 1)
+        stop = False
+
+        def writer():
+            i = 0
+            while not stop:
+                i += 1
+                table.write(0, i, i, i, i % 2)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(20000):
+                reading = reader.read(0)
+                if reading is not None:
+                    assert reading.time == reading.temperature == reading.setpoint
+                    assert reading.control_enabled == bool(int(reading.time) % 2)
+        finally:
+            stop = True
+            thread.join()
+            reader.close()
+            table.close()
+
+
+class TestPollingWorkerPool:
+    def test_remote_devices(self):
+        logger = logging.getLogger("test")
+        pool = PollingWorkerPool(2, 0.1, logger, capacity=4)
+        try:
+            pool.load_devices([
+                {'name': 'T1', 'dev_type': 'Dummy', 'fluctuation': 0},
+                {'name': 'T2', 'dev_type': 'Dummy', 'fluctuation': 0},
+                {'name': 'T3', 'dev_type': 'Unknown'}
+            ])
+            assert sorted(pool.devices) == ['T1', 'T2']
+            assert {dev.worker.index for dev in pool.devices.values()} == {0, 1}
+
+            dev = pool.devices['T1']
+            assert isinstance(dev, RemoteDevice)
+            assert dev.temperature == 10
+
+            dev.setpoint = 30
+            assert dev.setpoint == 30
+            assert dev.temperature == 30
+
+            before = dev.reading().time
+            time.sleep(0.3)
+            assert dev.reading().time > before  # polled in the background
+
+            pool.unload_device('T2')
+            assert pool.load_device({'name': 'T4', 'dev_type': 'Dummy'}).slot in range(4)
+        finally:
+            pool.close()
+
+    def test_slot_of_a_timed_out_load(self, monkeypatch):
+        logger = logging.getLogger("test")
+        pool = PollingWorkerPool(1, 0.05, logger, capacity=1)
+        try:
+            with monkeypatch.context() as patch:
+                patch.setattr(polling_workers, 'CALL_TIMEOUT', 0)
+                with pytest.raises(WorkerError):
+                    pool.load_device({'name': 'T1', 'dev_type': 'Dummy', 'fluctuation': 0})
+
+            # the worker still loads T1 into the slot, which mustn't be handed out meanwhile
+            assert list(pool.quarantined.values()) == [0]
+            assert not pool.free_slots
+
+            # answered in order: once this returns, the worker has dropped the slot
+            with pytest.raises(WorkerError):
+                pool.workers[0].call('unload', 'T1')
+
+            dev = pool.load_device({'name': 'T2', 'dev_type': 'Dummy', 'fluctuation': 0})
+            assert dev.slot == 0 and not pool.quarantined
+            dev.setpoint = 30
+            time.sleep(0.3)
+            assert dev.reading().temperature == 30  # T1 no longer polls into the slot
+        finally:
+            pool.close()
+
+    def test_program_writes_leave_the_event_loop(self):
+        logger = logging.getLogger("test")
+        pool = PollingWorkerPool(1, 0.1, logger, capacity=1)
+        try:
+            pool.load_devices([{'name': 'T1', 'dev_type': 'Dummy', 'fluctuation': 0}])
+            dev = pool.devices['T1']
+
+            # the worker answers calls up to CALL_TIMEOUT later, they mustn't hold up the event loop
+            threads = []
+            call = dev.worker.call
+
+            def recording_call(*command):
+                threads.append(threading.current_thread())
+                return call(*command)
+
+            dev.worker.call = recording_call
+
+            async def main():
+                manager = ProgramManager(Config(), pool.devices, None, None, logger)
+                await manager.run_standby(dev, {})
+                manager.wheel.close()
+
+            asyncio.run(main())
+            assert threads and threading.main_thread() not in threads
+            assert dev.control_enabled is False
+        finally:
+            pool.close()
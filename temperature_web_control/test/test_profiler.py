@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+import yaml
+
+from temperature_web_control.server.app_core import TemperatureAppCore
+from temperature_web_control.utils import Config
+
+
+def make_app_core(tmp_path, **settings):
+    config = {
+        'config_reload_interval': 0,
+        'devices': [{'name': 'T1', 'dev_type': 'Dummy'}],
+        'programs': [],
+    }
+    config.update(settings)
+    path = tmp_path / "config.yml"
+    path.write_text(yaml.safe_dump(config))
+    return TemperatureAppCore(Config(str(path)), logging.getLogger("test"))
+
+
+def profile(app_core, **event):
+    replies = []
+
+    async def callback(reply):
+        replies.append(reply)
+
+    async def main():
+        await app_core.on_profile_event(event, callback)
+
+    asyncio.run(main())
+    return replies[0]
+
+
+class TestProfileEvent:
+    def test_admin_token(self, tmp_path):
+        reply = profile(make_app_core(tmp_path), duration=0.05)
+        assert reply['result'] == 'error'  # disabled without an admin token
+
+        app_core = make_app_core(tmp_path, admin_token="secret")
+        assert profile(app_core, duration=0.05)['result'] == 'error'
+        assert profile(app_core, duration=0.05, token="wrong")['result'] == 'error'
+        assert profile(app_core, duration=0.05, token="secret")['result'] == 'ok'
+
+    def test_one_session_at_a_time(self, tmp_path):
+        app_core = make_app_core(tmp_path, admin_token="secret")
+        replies = []
+
+        async def callback(reply):
+            replies.append(reply)
+
+        async def main():
+            first = asyncio.ensure_future(app_core.on_profile_event({'token': "secret", 'duration': 0.2}, callback))
+            await asyncio.sleep(0.05)
+            await app_core.on_profile_event({'token': "secret", 'duration': 0.2}, callback)
+            await first
+
+        asyncio.run(main())
+        assert [reply['result'] for reply in replies] == ['error', 'ok']
+        assert "already running" in replies[0]['error_msg']
+        assert not app_core.profiler_running
+
+    def test_collapsed(self, tmp_path):
+        app_core = make_app_core(tmp_path, admin_token="secret")
+        reply = profile(app_core, token="secret", duration=0.1, interval=0.01)
+        assert reply['format'] == 'collapsed'
+        assert reply['samples'] > 0
+
+        lines = reply['profile'].splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+            assert stack.split(";")[0]  # the thread name comes first
+        assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) >= reply['samples']
+
+    def test_speedscope(self, tmp_path):
+        app_core = make_app_core(tmp_path, admin_token="secret")
+        reply = profile(app_core, token="secret", duration=0.1, interval=0.01, format='speedscope')
+        speedscope = reply['profile']
+        frames = speedscope['shared']['frames']
+        assert speedscope['profiles']
+
+        for thread in speedscope['profiles']:
+            assert thread['type'] == 'sampled'
+            assert len(thread['samples']) == len(thread['weights'])
+            for stack in thread['samples']:
+                assert all(0 <= index < len(frames) for index in stack)
+
+        assert profile(app_core, token="secret", duration=0.05, format='svg')['result'] == 'error'
+
+    def test_invalid_duration_and_interval(self, tmp_path):
+        app_core = make_app_core(tmp_path, admin_token="secret")
+        for event in [{'duration': "nan"}, {'duration': "inf"}, {'duration': 0}, {'duration': -1},
+                      {'interval': "nan"}, {'interval': 0}, {'interval': -0.01}]:
+            assert profile(app_core, token="secret", **event)['result'] == 'error'
+        assert not app_core.profiler_running
@@ -0,0 +1,46 @@
+import pytest
+
+from temperature_web_control.model.program import Program, ProgramCompileError
+
+
+def make_program(steps):
+    return Program.from_dict({'name': 'Test', 'description': '', 'steps': steps})
+
+
+class TestProgramCompile:
+    def test_compile(self):
+        program = make_program([
+            [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': '50', 'RATE': 2}},
+             {'action': 'SOAK', 'device': 'T2', 'params': {'TIME': 1}}],
+            [{'action': 'CHANGE', 'device': 'T1', 'params': {'SETPOINT': 20}}],
+            [{'action': 'LOOP', 'params': {'GOTO': 0, 'TIMES': '3'}}],
+            [{'action': 'STANDBY', 'device': 'T1'}],
+        ])
+
+        plan = program.compile(["T1", "T2"])
+        assert plan is program.compile(["T2", "T1"])  # cached
+        assert plan.devices == ("T1", "T2")
+        assert plan.steps[0].actions[0].params == {'TARGET_TEMP': 50.0, 'RATE': 2.0}
+        assert plan.steps[2].loop == (0, 3, 0)
+        assert plan.loop_count == 1
+
+        # ramp 20 -> 50 at 2 degrees/min, three times
+        assert plan.estimate_duration({'T1': 20}) == 3 * 15 * 60
+        # unknown start: the first ramp doesn't count
+        assert plan.estimate_duration() == 2 * 15 * 60 + 60
+
+    @pytest.mark.parametrize("steps", [
+        [],
+        [[{'action': 'LOOP', 'params': {'GOTO': 0, 'TIMES': 1}}]],
+        [[{'action': 'BAKE', 'device': 'T1'}]],
+        [[{'action': 'CHANGE', 'device': 'T3', 'params': {'SETPOINT': 1}}]],
+        [[{'action': 'CHANGE', 'device': 'T1', 'params': {}}]],
+        [[{'action': 'CHANGE', 'device': 'T1', 'params': {'SETPOINT': 'hot'}}]],
+        [[{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 1, 'RATE': 0}}]],
+        [[{'action': 'CHANGE', 'device': 'T1', 'params': {'SETPOINT': 1}},
+          {'action': 'STANDBY', 'device': 'T1'}]],
+        [[{'action': 'STANDBY', 'device': 'T1'}], [{'action': 'LOOP', 'params': {'GOTO': 2, 'TIMES': 1}}]],
+    ])
+    def test_invalid(self, steps):
+        with pytest.raises(ProgramCompileError):
+            make_program(steps).compile(["T1", "T2"])
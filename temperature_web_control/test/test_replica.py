@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+from temperature_web_control.server.replica import ReplicaCore
+
+
+class FakeConfig:
+    def get(self, *args, default=None):
+        return default
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.requests = []
+
+    async def request(self, message):
+        self.requests.append(message['event'])
+        if message['event'] == 'fetch_history':
+            return {'event': 'fetch_history', 'result': 'ok', 'data': {'T1': {'time': [1, 2], 'temperature': [20, 21]}}}
+        return {'event': message['event'], 'result': 'ok', 'programs': ['P1']}
+
+
+class TestReplica:
+    def test_read_only(self):
+        replica = ReplicaCore(FakeConfig(), logging.getLogger("test"), 'ws://primary')
+        replica.upstream = FakeUpstream()
+        replies = []
+
+        async def callback(message):
+            replies.append(message)
+
+        async def main():
+            await replica.on_upstream_connected(replica.upstream)
+            await asyncio.sleep(0.01)
+            for _ in range(3):
+                replica.on_upstream_event(replica.upstream, {'event': 'control_changed'})
+            replica.on_upstream_event(replica.upstream, {'event': 'status_available', 'status': {
+                'T1': {'name': 'T1', 'temperature': 22, 'time': 3, 'status': 'ok'}}})
+            await asyncio.sleep(0.01)
+
+            handlers = replica.get_event_handlers()
+            await handlers['list_programs']({'event': 'list_programs'}, callback)
+            await handlers['fetch_history']({'event': 'fetch_history'}, callback)
+            await handlers['abort_program']({'event': 'abort_program', 'program': 'P1'}, callback)
+
+        asyncio.run(main())
+
+        # the refresh on connect, and a single one for the burst of changes
+        assert replica.upstream.requests.count('list_programs') == 2
+        assert replies[0]['programs'] == ['P1']
+        assert replies[1]['data']['T1'] == {'time': [1, 2, 3], 'temperature': [20, 21, 22]}
+        assert replies[2]['result'] == 'error'
@@ -0,0 +1,84 @@
+import random
+
+from temperature_web_control.server.resource_manager import ResourceManager
+
+
+class TestResourceManager:
+    def test_queue_order(self):
+        resources = ResourceManager()
+        started = []
+
+        def enqueue(name, devices, priority=0):
+            resources.enqueue(name, devices, priority, lambda: started.append(name))
+
+        assert resources.acquire("running", ["T1", "T2"])
+        assert not resources.acquire("other", ["T2"])
+        assert resources.owner("T1") == "running"
+
+        enqueue("low", ["T1"])
+        enqueue("both", ["T1", "T2"])
+        enqueue("high", ["T2"], priority=5)
+        enqueue("free", ["T3"])
+        assert started == ["free"]
+
+        # nothing may jump ahead of queued programs
+        assert resources.blocker(["T1"]) == ("T1", "running")
+        resources.release("running")
+        assert started == ["free", "low", "high"]
+        assert resources.blocker(["T1"]) == ("T1", "low")
+
+        resources.release("low")
+        assert started == ["free", "low", "high"]  # "both" waits for T2
+        resources.release("high")
+        assert started == ["free", "low", "high", "both"]
+
+    def test_cancel_unblocks(self):
+        resources = ResourceManager()
+        started = []
+        resources.acquire("running", ["T1"])
+        resources.enqueue("big", ["T1", "T2"], 0, lambda: started.append("big"))
+        resources.enqueue("small", ["T2"], 0, lambda: started.append("small"))
+        assert started == []
+
+        assert resources.cancel("big")
+        assert started == ["small"]
+        assert not resources.cancel("big")
+
+    def test_hold_on_release(self):
+        resources = ResourceManager()
+        started = []
+
+        def on_release(name, devices):
+            if name == "running":
+                resources.hold("maintenance", devices)
+
+        resources.on_release = on_release
+        resources.acquire("running", ["T1"])
+        resources.enqueue("next", ["T1"], 0, lambda: started.append("next"))
+
+        resources.release("running")
+        assert started == []  # held before the queue got it
+        assert resources.owner("T1") == "maintenance"
+
+        resources.release("maintenance")
+        assert started == ["next"]
+
+    def test_many_jobs(self):
+        resources = ResourceManager()
+        rng = random.Random(3)
+        devices = [f"T{i}" for i in range(50)]
+        started = []
+
+        for i in range(500):
+            name = f"job{i}"
+            resources.enqueue(name, rng.sample(devices, 3), rng.randint(0, 3), lambda n=name: started.append(n))
+
+        while len(started) < 500:
+            running = list(resources.running)
+            assert running
+            for name in running:
+                # no device is ever owned twice
+                assert all(resources.owner(dev) == name for dev in resources.running[name])
+            resources.release(rng.choice(running))
+
+        assert not resources.queued and not resources.waiting
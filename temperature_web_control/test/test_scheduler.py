@@ -0,0 +1,179 @@
+import random
+import asyncio
+import logging
+
+from temperature_web_control.model.program import Program
+from temperature_web_control.server.program_manager import ProgramManager
+from temperature_web_control.server.scheduler import TimerWheel
+from temperature_web_control.server.simulator import VirtualClockEventLoop, SimulatedDevice
+
+
+class Config:
+    def get(self, *args, default=None):
+        return default
+
+
+class Device:
+    def __init__(self, name, bus):
+        self.name = name
+        self.bus = bus
+        self.writes = []
+
+    @property
+    def setpoint(self):
+        return self.writes[-1] if self.writes else None
+
+    @setpoint.setter
+    def setpoint(self, value):
+        self.writes.append(value)
+
+
+class FailingDevice(Device):
+    @property
+    def setpoint(self):
+        return None
+
+    @setpoint.setter
+    def setpoint(self, value):
+        raise IOError(f"no answer from {self.name}")
+
+
+class TestTimerWheel:
+    def test_timers_fire_in_order(self):
+        loop = VirtualClockEventLoop()
+        wheel = TimerWheel(tick=0.5)
+        fired = []
+
+        async def main():
+            rng = random.Random(1)
+            delays = [rng.uniform(0, 50000) for _ in range(200)]
+            timers = [wheel.call_later(delay, lambda d=delay: fired.append((d, loop.time())))
+                      for delay in delays]
+            for timer in timers[::10]:
+                timer.cancel()
+            await wheel.sleep(60000)
+            return delays[:]
+
+        delays = loop.run_until_complete(main())
+        loop.close()
+
+        expected = sorted(delay for i, delay in enumerate(delays) if i % 10)
+        assert [delay for delay, _ in fired] == expected
+        for delay, fire_time in fired:
+            assert delay <= fire_time < delay + 0.5 + 1e-6
+
+    def test_writes_are_batched_per_bus(self):
+        loop = VirtualClockEventLoop()
+        wheel = TimerWheel(tick=1)
+        devices = [Device("T1", "bus1"), Device("T2", "bus1"), Device("T3", "bus2")]
+
+        def ramp(device, value):
+            wheel.write_setpoint(device, value)
+            wheel.write_setpoint(device, value + 1)  # the last write wins
+
+        async def main():
+            for i, device in enumerate(devices):
+                wheel.call_later(10, ramp, device, i * 10)
+            await wheel.sleep(20)
+
+        loop.run_until_complete(main())
+        loop.close()
+
+        assert [device.writes for device in devices] == [[1], [11], [21]]
+
+    def test_failed_writes_are_reported(self):
+        loop = VirtualClockEventLoop()
+        wheel = TimerWheel(tick=1)
+        good, bad = Device("T1", "bus1"), FailingDevice("T2", "bus1")
+        errors = []
+
+        async def main():
+            wheel.call_later(10, lambda: (wheel.write_setpoint(good, 1, on_error=errors.append),
+                                          wheel.write_setpoint(bad, 2, on_error=errors.append)))
+            await wheel.sleep(20)
+
+        loop.run_until_complete(main())
+        loop.close()
+
+        assert good.writes == [1]
+        assert [str(e) for e in errors] == ["no answer from T2"]
+
+    def test_failed_ramp_write_ends_the_program(self):
+        loop = VirtualClockEventLoop()
+        errors = []
+
+        class BrokenDevice(SimulatedDevice):
+            @SimulatedDevice.setpoint.setter
+            def setpoint(self, value):
+                raise IOError("no answer")
+
+        async def error_callback(message):
+            errors.append(message)
+
+        async def noop():
+            pass
+
+        async def main():
+            devices = {'T1': BrokenDevice('T1', loop.time, 20)}
+            manager = ProgramManager(Config(), devices, noop, error_callback, logging.getLogger("test"),
+                                     clock=loop.time)
+            manager.create_program_task(Program.from_dict({'name': 'Ramp', 'description': '', 'steps': [
+                [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 30, 'RATE': 1}}],
+            ]}))
+            await asyncio.sleep(5 * 60)
+            assert not manager.current_programs
+            manager.wheel.close()
+
+        loop.run_until_complete(main())
+        loop.close()
+
+        assert len(errors) == 1 and "no answer" in errors[0]
+
+
+class TestNativeRampFallback:
+    def run_ramp(self, device_class):
+        loop = VirtualClockEventLoop()
+        errors = []
+        device = device_class('T1', loop.time, 20, native_ramp=True)
+
+        async def error_callback(message):
+            errors.append(message)
+
+        async def noop():
+            pass
+
+        async def main():
+            manager = ProgramManager(Config(), {'T1': device}, noop, error_callback, logging.getLogger("test"),
+                                     clock=loop.time)
+            manager.create_program_task(Program.from_dict({'name': 'Ramp', 'description': '', 'steps': [
+                [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 35, 'RATE': 1}}],
+            ]}))
+            await asyncio.sleep(20 * 60)
+            assert not manager.current_programs
+            manager.wheel.close()
+
+        loop.run_until_complete(main())
+        loop.close()
+        return device, errors
+
+    def test_ramp_longer_than_the_controller_supports(self):
+        class ShortRampDevice(SimulatedDevice):
+            uploads = []
+            max_native_ramp_minutes = 10
+
+            def upload_ramp(self, target, duration):
+                self.uploads.append(duration)
+
+        device, errors = self.run_ramp(ShortRampDevice)
+        assert errors == []
+        assert device.uploads == []  # 15 min, stepped instead
+        assert device.setpoint == 35
+
+    def test_failed_upload(self):
+        class BrokenRampDevice(SimulatedDevice):
+            def upload_ramp(self, target, duration):
+                raise IOError("no answer")
+
+        device, errors = self.run_ramp(BrokenRampDevice)
+        assert errors == []
+        assert device.setpoint == 35
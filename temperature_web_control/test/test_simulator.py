@@ -0,0 +1,99 @@
+import math
+
+import pytest
+
+from temperature_web_control.model.estimators import SettleDetector
+from temperature_web_control.model.program import Program
+from temperature_web_control.server.simulator import simulate_program, MAX_SAMPLES
+from temperature_web_control.utils import Config
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "config.yml"
+    path.write_text("update_interval: 5\nsimulation:\n  time_constant: 30\n")
+    return Config(str(path))
+
+
+class TestSimulator:
+    def test_ramp_and_soak(self, config):
+        program = Program.from_dict({'name': 'Test', 'description': '', 'steps': [
+            [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 50, 'RATE': 2}}],
+            [{'action': 'SOAK', 'device': 'T1', 'params': {'TIME': 10}}],
+            [{'action': 'STANDBY', 'device': 'T1'}],
+        ]})
+
+        result = simulate_program(config, program, {'T1': 20})
+
+        assert result['completed'], result['errors']
+        assert [step['step'] for step in result['steps']] == [0, 1, 2]
+        assert result['steps'][1]['start'] == pytest.approx(15 * 60, abs=60)
+        assert result['duration'] == pytest.approx(result['estimated_duration'], abs=60)
+
+        trace = result['trace']['T1']
+        assert max(trace['setpoint']) == 50
+        assert trace['temperature'][-1] > 45
+
+    def test_native_ramp(self, tmp_path):
+        path = tmp_path / "config.yml"
+        path.write_text("simulation:\n  time_constant: 30\n  native_ramp: true\n")
+        program = Program.from_dict({'name': 'Test', 'description': '', 'steps': [
+            [{'action': 'LINEAR_RAMP', 'device': 'T1', 'params': {'TARGET_TEMP': 50, 'RATE': 2.1}}],
+        ]})
+
+        result = simulate_program(Config(str(path)), program, {'T1': 20}, sample_interval=60)
+
+        assert result['completed'], result['errors']
+        assert result['duration'] == 14 * 60  # rounded to whole minutes
+        assert result['trace']['T1']['setpoint'][:3] == pytest.approx([20, 20 + 30 / 14, 20 + 60 / 14])
+
+    def test_sample_interval(self, config):
+        program = Program.from_dict({'name': 'Test', 'description': '', 'steps': [
+            [{'action': 'SOAK', 'device': 'T1', 'params': {'TIME': 60 * 24}}],
+        ]})
+
+        for invalid in [0, -1, "1", True]:
+            with pytest.raises(ValueError):
+                simulate_program(config, program, {'T1': 20}, sample_interval=invalid)
+
+        # a day sampled every millisecond stays bounded
+        result = simulate_program(config, program, {'T1': 20}, sample_interval=0.001)
+        times = result['trace']['T1']['time']
+        assert len(times) <= MAX_SAMPLES
+        assert times[-1] > 23 * 3600
+
+
+class TestSettleDetector:
+    def test_overshoot_is_not_settled(self):
+        detector = SettleDetector(target=100, tolerance=1, window=60, max_rate=0.5, max_std=0.5, start_time=0)
+
+        # rushing through the band doesn't count, even for a full window
+        for t in range(5, 70, 5):
+            detector.add(t, 99.1 + (t - 5) * 0.03)
+        assert not detector.settled
+
+        # flat within the band for a window
+        for t in range(70, 145, 5):
+            detector.add(t, 100.2)
+        assert detector.settled
+        assert detector.eta == 0
+
+    def test_eta(self):
+        detector = SettleDetector(target=100, tolerance=1, window=60, max_rate=0.5, max_std=0.5, start_time=0)
+        detector.add(-5, 0)  # before the setpoint change
+        assert detector.eta is None
+
+        for t in range(5, 35, 5):
+            detector.add(t, 50 + t)  # one degree per second
+        assert detector.eta == pytest.approx(49 - 30 + 60)
+
+    def test_change_step(self, config):
+        program = Program.from_dict({'name': 'Test', 'description': '', 'steps': [
+            [{'action': 'CHANGE', 'device': 'T1', 'params': {'SETPOINT': 100}}],
+        ]})
+
+        result = simulate_program(config, program, {'T1': 20})
+
+        assert result['completed'], result['errors']
+        # within 1 degree after 30 * ln(80) s, then a one minute settle window
+        assert result['duration'] == pytest.approx(30 * math.log(80) + 60, abs=15)
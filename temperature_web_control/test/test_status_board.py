@@ -0,0 +1,66 @@
+import logging
+
+import pytest
+
+from temperature_web_control.client.status_board import StatusBoardReader, SlotBusyError, HEADER, NAME_SIZE, \
+    GENERATION_OFFSET
+from temperature_web_control.server.status_table import SEQ
+from temperature_web_control.server.status_board import StatusBoard
+
+
+class TestStatusBoard:
+    def test_publish_and_read(self, tmp_path):
+        path = str(tmp_path / "board")
+        board = StatusBoard(path, 2, logging.getLogger("test"))
+        reader = StatusBoardReader(path)
+        try:
+            assert reader.devices() == []
+
+            board.publish({
+                'T1': {'name': 'T1', 'temperature': 25.0, 'setpoint': 30.0, 'control_enabled': True,
+                       'time': 100.0, 'status': 'ok'},
+                'T2': {'status': 'error', 'error_msg': 'no response'}
+            })
+            assert sorted(reader.devices()) == ['T1', 'T2']
+
+            reading = reader.read('T1')
+            assert (reading.temperature, reading.setpoint, reading.control_enabled, reading.time, reading.error) == \
+                   (25.0, 30.0, True, 100.0, None)
+            assert reader.read('T2').error == 'no response'
+
+            board.remove_device('T2')
+            board.publish({'T3': {'temperature': 1.0, 'status': 'ok'}})
+            assert sorted(reader.devices()) == ['T1', 'T3']
+            assert reader.read('T2') is None
+            assert not reader.replaced()
+
+            StatusBoard(path, 2, logging.getLogger("test")).close()
+            assert reader.replaced()
+        finally:
+            reader.close()
+            board.close()
+
+    def test_interrupted_write(self, tmp_path):
+        path = str(tmp_path / "board")
+        board = StatusBoard(path, 1, logging.getLogger("test"))
+        reader = StatusBoardReader(path)
+        try:
+            board.publish({'T1': {'temperature': 1.0, 'status': 'ok'}})
+            assert reader.read('T1').temperature == 1.0
+
+            # the app died halfway through writing the slot
+            with open(path, "r+b") as f:
+                f.seek(HEADER.size + NAME_SIZE)
+                f.write(SEQ.pack(1))
+            with pytest.raises(SlotBusyError):
+                reader.read('T1')
+
+            # or halfway through adding a device
+            with open(path, "r+b") as f:
+                f.seek(GENERATION_OFFSET)
+                f.write(SEQ.pack(3))
+            with pytest.raises(SlotBusyError):
+                reader.devices()
+        finally:
+            reader.close()
+            board.close()
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+from temperature_web_control.client.protocol import encode_status, decode_status
+from temperature_web_control.client.unix_client import UnixSocketClient
+from temperature_web_control.server.app_core import EventBus
+from temperature_web_control.server.unix_server import UnixSocketServer
+
+
+class FakeCore(EventBus):
+    def __init__(self):
+        super().__init__(logging.getLogger("test"), ['status_available'])
+        self.status = {
+            'T1': {'name': 'T1', 'temperature': 20.5, 'time': 100.0, 'control_enabled': True, 'current_program': 'P',
+                   'current_action': 'Soak', 'setpoint': 21.0, 'settle_eta': None, 'status': 'ok'},
+            'T2': {'status': 'error', 'error_msg': 'timeout'}
+        }
+
+    def get_event_handlers(self):
+        return {'request_status': self.on_request_status_event, 'slow': self.on_slow_event}
+
+    async def on_request_status_event(self, event, callback):
+        await self._return_ok(callback, {'status': self.status})
+
+    async def on_slow_event(self, event, callback):
+        await asyncio.sleep(event['delay'])
+        await self._return_ok(callback, {'delay': event['delay']})
+
+
+class TestUnixServer:
+    def test_status_encoding(self):
+        status = FakeCore().status
+        assert decode_status(encode_status(status)) == status
+
+    def test_pipelined_requests(self, tmp_path):
+        path = str(tmp_path / "app.sock")
+        core = FakeCore()
+        server = UnixSocketServer(path, core, logging.getLogger("test"))
+        pushed = []
+
+        async def main():
+            serve_task = asyncio.create_task(server.serve_until_exit())
+            await asyncio.sleep(0.05)
+
+            client = await UnixSocketClient.connect(path)
+            order = []
+
+            async def slow(delay):
+                reply = await client.request('slow', delay=delay)
+                order.append(reply['delay'])
+
+            await asyncio.gather(slow(0.1), slow(0.01), slow(0.05))
+            status = await client.request('request_status')
+            unknown = await client.request('nope')
+
+            await client.subscribe('status_available', pushed.append)
+            await core._fire_event('status_available', {'status': core.status})
+            await asyncio.sleep(0.05)
+
+            await client.close()
+            serve_task.cancel()
+            await asyncio.gather(serve_task, return_exceptions=True)
+            return order, status, unknown
+
+        order, status, unknown = asyncio.run(main())
+
+        assert order == [0.01, 0.05, 0.1]  # answered as they finish, not in order
+        assert status['status'] == core.status
+        assert unknown['result'] == 'error'
+        assert pushed[0]['status']['T1']['temperature'] == 20.5
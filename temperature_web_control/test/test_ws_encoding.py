@@ -0,0 +1,90 @@
+import json
+import asyncio
+import logging
+
+import websockets
+
+from temperature_web_control.server.ws_encoding import encode_message, decode_message, COMPRESS_ABOVE
+from temperature_web_control.server.ws_server import WebSocketServer
+
+
+def make_history(n):
+    return {
+        'T1': {'time': [1700000000.123456 + 1.0003 * i for i in range(n)],
+               'temperature': [20 + 0.01 * i if i % 7 else None for i in range(n)]},
+        'Oven 2': {'time': [], 'temperature': []},
+        'T3': {'time': [1700000000.5], 'temperature': [25.25]},
+    }
+
+
+class TestWSEncoding:
+    def test_history_round_trip(self):
+        data = make_history(5000)
+        frame = encode_message('fetch_history', {'result': 'ok', 'data': data, 'event': 'fetch_history'})
+        decoded = decode_message(frame)
+        assert decoded['event'] == 'fetch_history'
+        assert list(decoded['data']) == list(data)
+
+        for dev, series in data.items():
+            times = decoded['data'][dev]['time']
+            assert len(times) == len(series['time'])
+            # the deltas don't accumulate rounding errors
+            assert all(abs(a - b) < 1e-3 for a, b in zip(times, series['time']))
+            for a, b in zip(decoded['data'][dev]['temperature'], series['temperature']):
+                assert (a is None and b is None) or abs(a - b) < 1e-5
+
+        assert len(frame) < len(json.dumps(data)) / 3
+
+    def test_compression(self):
+        message = {'result': 'ok', 'data': make_history(1000)}
+        plain = encode_message('fetch_history', message)
+        compressed = encode_message('fetch_history', message, compress=True)
+        assert len(compressed) < len(plain)
+        assert decode_message(compressed) == decode_message(plain)
+
+        small = {'result': 'ok', 'status': {'T1': {'status': 'error', 'error_msg': 'timeout'}}}
+        frame = encode_message('status_available', small, compress=True)
+        assert len(frame) < COMPRESS_ABOVE
+        assert decode_message(frame)['status'] == small['status']
+
+    def test_other_messages_stay_json(self):
+        assert encode_message('list_programs', {'result': 'ok', 'programs': []}) is None
+        assert encode_message('fetch_history', {'result': 'error', 'error_msg': 'no'}) is None
+
+    def test_negotiation(self):
+        server = WebSocketServer("127.0.0.1", 0, logging.getLogger("test"))
+        status = {'T1': {'name': 'T1', 'temperature': 20.5, 'time': 100.0, 'control_enabled': False,
+                         'current_program': '', 'current_action': '', 'setpoint': None, 'settle_eta': None,
+                         'status': 'ok'}}
+
+        async def fetch_history(event, callback):
+            await callback({'result': 'ok', 'data': make_history(10)})
+
+        server.register_event_handler('fetch_history', fetch_history)
+
+        async def main():
+            async with websockets.serve(server.handler, "127.0.0.1", 0) as ws_server:
+                port = ws_server.sockets[0].getsockname()[1]
+                async with websockets.connect(f"ws://127.0.0.1:{port}") as binary, \
+                        websockets.connect(f"ws://127.0.0.1:{port}") as text:
+                    await binary.send(json.dumps({'event': 'set_encoding', 'encoding': 'binary', 'compress': True}))
+                    assert json.loads(await binary.recv()) == {'result': 'ok', 'encoding': 'binary',
+                                                              'event': 'set_encoding'}
+
+                    await binary.send(json.dumps({'event': 'fetch_history'}))
+                    reply = await binary.recv()
+                    assert isinstance(reply, bytes)
+                    assert decode_message(reply)['data']['T3']['temperature'] == [25.25]
+
+                    await text.send(json.dumps({'event': 'fetch_history'}))
+                    assert isinstance(await text.recv(), str)
+
+                    await server.broadcast(server.active_ws, {'event': 'status_available', 'status': status})
+                    assert decode_message(await binary.recv())['status'] == status
+                    assert json.loads(await text.recv())['status'] == status
+
+                    await binary.send(json.dumps({'event': 'set_encoding', 'encoding': 'msgpack'}))
+                    assert json.loads(await binary.recv())['result'] == 'error'
+
+        asyncio.run(main())
+        assert server.encodings == {}
@@ -1,43 +1,207 @@
-import sys
-import pkgutil
+import os
 import re
+import copy
+import time
+import asyncio
+import logging
+import importlib
+import pkgutil
+import threading
+from collections import namedtuple
+
 import yaml
 
 
-def get_module(full_package_name, module_info):
-    if full_package_name not in sys.modules:
-        module = module_info.module_finder.find_module(
-            module_info.name).load_module(module_info.name)
-        sys.modules[full_package_name] = module
-    else:
-        module = sys.modules[full_package_name]
+class ModuleRegistry:
+    """
+    Finds the module providing a name (a device type, a plugin config section) and imports only
+    that module, on first use.
+
+    Names are looked up in `builtin` (name -> module of `package`), then in the entry points of
+    `group` registered by installed packages, and at last by importing the not yet known modules of
+    `package` matching `pattern` (so a `*_driver.py` dropped into the folder still works);
+    `names_of(module)` tells which names a scanned module provides.
+    """
+
+    def __init__(self, package, pattern, builtin, group, names_of=None):
+        self.package = package
+        self.pattern = pattern
+        self.builtin = builtin
+        self.group = group
+        self.names_of = names_of
+
+        self.modules = {}
+        self.import_times = {}  # module name -> seconds it took to import
+        self._entry_points = None
+        self._scanned = False
+
+    def _timed(self, module_name, load):
+        start = time.perf_counter()
+        module = load()
+        self.import_times.setdefault(module_name, time.perf_counter() - start)
+        return module
+
+    def import_module(self, module_name):
+        full_name = f"{self.package}.{module_name}"
+        return self._timed(full_name, lambda: importlib.import_module(full_name))
+
+    def entry_points(self):
+        if self._entry_points is None:
+            try:
+                from importlib.metadata import entry_points
+                eps = entry_points()
+                eps = eps.select(group=self.group) if hasattr(eps, 'select') else eps.get(self.group, [])
+            except ImportError:
+                # Python 3.7
+                eps = []
+            self._entry_points = {ep.name: ep for ep in eps}
+
+        return self._entry_points
+
+    def extra_modules(self):
+        """
+        Names of the modules in `package` matching `pattern` that aren't builtin.
+        """
+        builtin_modules = set(self.builtin.values())
+        return [module_info.name
+                for module_info in pkgutil.iter_modules(importlib.import_module(self.package).__path__)
+                if re.match(self.pattern, module_info.name) and module_info.name not in builtin_modules]
 
-    return module
+    def _scan(self):
+        self._scanned = True
+        for module_name in self.extra_modules():
+            module = self.import_module(module_name)
+            for name in self.names_of(module) if self.names_of else []:
+                self.modules.setdefault(name, module)
 
-def list_all_modules(pattern, dirname):
-    modules_dict = {}
+    def get(self, name):
+        """
+        The module providing `name`, or None if there is none.
+        """
+        if name in self.modules:
+            return self.modules[name]
 
-    for module_info in pkgutil.iter_modules([dirname]):
-        package_name = module_info.name
-        match = re.match(pattern, package_name)
-        if not match:
-            continue
+        if name in self.builtin:
+            self.modules[name] = self.import_module(self.builtin[name])
+        elif name in self.entry_points():
+            ep = self.entry_points()[name]
+            self.modules[name] = self._timed(ep.value, ep.load)
+        elif not self._scanned:
+            self._scan()
 
-        module_name = match[1]
+        return self.modules.get(name)
 
-        full_package_name = f"{dirname}.{package_name}"
-        modules_dict[module_name] = get_module(full_package_name, module_info)
 
-    return modules_dict
+NamedListDiff = namedtuple("NamedListDiff", ["added", "removed", "changed"])
+ConfigDiff = namedtuple("ConfigDiff", ["sections", "devices", "programs"])
+
+
+def diff_named_list(old, new):
+    """
+    Compare two lists of dicts identified by their `name`. Returns dicts from name to the new entry
+    (`added`, `changed`) or the old one (`removed`).
+    """
+    old = {item['name']: item for item in old or []}
+    new = {item['name']: item for item in new or []}
+    return NamedListDiff(
+        {name: item for name, item in new.items() if name not in old},
+        {name: item for name, item in old.items() if name not in new},
+        {name: item for name, item in new.items() if name in old and old[name] != item}
+    )
 
 
 class Config:
-    def __init__(self, path):
+    """
+    The YAML configuration file.
+
+    Programs can be kept in a separate file named by `programs_file` (relative to the
+    configuration file), so that saving a program doesn't rewrite the rest of the configuration.
+    `set` marks the top-level section it changes as dirty, and writing only rewrites the files
+    holding dirty sections. Each file is replaced atomically: the new content goes to a temporary
+    file which is synced and then renamed over the old one.
+    """
+
+    def __init__(self, path, write_delay=1.0):
         self.config = {}
         self.path = path
+        self.programs_path = None
+        self.write_delay = write_delay  # seconds changes are collected before `schedule_write` saves them
+        self.dirty = set()
+
+        self._write_lock = threading.Lock()
+        self._write_handle = None
+        self._write_task = None
+        self._write_error_callback = None
+        self._report_task = None
+
+        self._mtimes = {}
+
+        self.config = self._read()
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self):
+        with open(self.path, "r") as f:
+            config = yaml.safe_load(f) or {}
+        self._mtimes[self.path] = self._mtime(self.path)
+
+        self.programs_path = None
+        if config.get('programs_file'):
+            self.programs_path = os.path.join(os.path.dirname(os.path.abspath(self.path)), config['programs_file'])
+            if os.path.exists(self.programs_path):
+                with open(self.programs_path, "r") as f:
+                    config['programs'] = yaml.safe_load(f) or []
+                self._mtimes[self.programs_path] = self._mtime(self.programs_path)
 
-        with open(path, "r") as f:
-            self.config = yaml.safe_load(f)
+        return config
+
+    def changed_on_disk(self):
+        return any(self._mtime(path) != mtime for path, mtime in self._mtimes.items())
+
+    def reload(self):
+        """
+        Read the files again and return what changed as a `ConfigDiff`. Sections changed by `set`
+        but not saved yet keep their value.
+        """
+        new_config = self._read()
+        for section in self.dirty:
+            if section in self.config:
+                new_config[section] = self.config[section]
+            else:
+                new_config.pop(section, None)
+
+        old_config, self.config = self.config, new_config
+        sections = {key for key in set(old_config) | set(new_config) if old_config.get(key) != new_config.get(key)}
+
+        return ConfigDiff(
+            sections,
+            diff_named_list(old_config.get('devices'), new_config.get('devices')),
+            diff_named_list(old_config.get('programs'), new_config.get('programs'))
+        )
+
+    async def watch(self, callback, error_callback, interval=2):
+        """
+        Check the files every `interval` seconds, and reload them and await `callback(diff)` when
+        they changed. If they can't be read, `error_callback(exception)` is awaited instead, and
+        the files are read again after their next change.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if not self.changed_on_disk():
+                continue
+
+            try:
+                diff = self.reload()
+            except (OSError, yaml.YAMLError) as e:
+                self._mtimes = {path: self._mtime(path) for path in self._mtimes}
+                await error_callback(e)
+                continue
+
+            await callback(diff)
 
     def get(self, *args, default=None):
         ret = self.config
@@ -50,6 +214,7 @@ class Config:
 
     def set(self, *args, value):
         target = self.config
+        self.dirty.add(args[0])
 
         for i, name in enumerate(args):
             if i == len(args) - 1:
@@ -62,8 +227,101 @@ class Config:
                 target[name] = {}
                 target = target[name]
 
+    def _snapshot(self):
+        """
+        Copy the sections to save, as a list of (path, data), and clear the dirty flags.
+        """
+        files = []
+        dirty, self.dirty = self.dirty, set()
+
+        if self.programs_path:
+            if 'programs' in dirty:
+                files.append((self.programs_path, copy.deepcopy(self.config.get('programs', []))))
+                dirty.discard('programs')
+            if dirty:
+                files.append((self.path, copy.deepcopy({key: value for key, value in self.config.items()
+                                                         if key != 'programs'})))
+        elif dirty:
+            files.append((self.path, copy.deepcopy(self.config)))
+
+        return files
+
+    @staticmethod
+    def _atomic_dump(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            yaml.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_files(self, files):
+        with self._write_lock:
+            for path, data in files:
+                self._atomic_dump(path, data)
+                self._mtimes[path] = self._mtime(path)  # our own writes don't count as changes
+
     def write(self):
-        with open(self.path, "w") as f:
-            yaml.dump(self.config, f)
+        """
+        Save the dirty sections now.
+        """
+        if self._write_handle is not None:
+            self._write_handle.cancel()
+            self._write_handle = None
+
+        self._write_files(self._snapshot())
+
+    def schedule_write(self, error_callback=None):
+        """
+        Save the dirty sections from the executor, once no more changes came in for `write_delay`
+        seconds. Must be called from the event loop. If saving fails, the sections stay dirty and
+        `error_callback(exception)` is awaited.
+        """
+        if self._write_handle is not None:
+            self._write_handle.cancel()
+
+        if error_callback is not None:
+            self._write_error_callback = error_callback
+        self._write_handle = asyncio.get_event_loop().call_later(self.write_delay, self._start_write)
+
+    def _start_write(self):
+        self._write_handle = None
+        previous = self._write_task
+
+        async def write():
+            if previous is not None:
+                # one write at a time, so that an older snapshot never lands last
+                await asyncio.gather(previous, return_exceptions=True)
+
+            sections = set(self.dirty)
+            files = self._snapshot()
+            if files:
+                try:
+                    await asyncio.get_event_loop().run_in_executor(None, self._write_files, files)
+                except Exception:
+                    self.dirty |= sections  # saved again by the next write
+                    raise
+
+        self._write_task = asyncio.ensure_future(write())
+        self._write_task.add_done_callback(self._write_done)
+
+    def _write_done(self, task):
+        if task.cancelled() or task.exception() is None:
+            return
+
+        logging.getLogger("temperature_app").error(f"Config: Cannot save the configuration: {task.exception()}")
+        if self._write_error_callback is not None:
+            self._report_task = asyncio.ensure_future(self._write_error_callback(task.exception()))
 
+    async def flush(self):
+        """
+        Save any pending changes, including those a failed write left dirty, and wait until they
+        are on disk. Raises the error of the write if it failed again.
+        """
+        if self._write_handle is not None:
+            self._write_handle.cancel()
+        if self._write_handle is not None or self.dirty:
+            self._start_write()
 
+        if self._write_task is not None:
+            await self._write_task
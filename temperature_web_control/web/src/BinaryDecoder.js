@@ -0,0 +1,127 @@
+// Decoder of the binary websocket frames, see temperature_web_control/server/ws_encoding.py for the layout.
+
+const FLAG_COMPRESSED = 1;
+
+const KIND_STATUS = 1;
+const KIND_HISTORY = 2;
+
+const textDecoder = new TextDecoder();
+
+export const supportsCompression = typeof DecompressionStream !== 'undefined';
+
+const align = (offset, alignment) => offset + (alignment - offset % alignment) % alignment;
+
+const inflate = (bytes) => {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'));
+    return new Response(stream).arrayBuffer();
+};
+
+const decodeHistory = (buffer) => {
+    const view = new DataView(buffer);
+    const count = view.getUint32(0, true);
+    let offset = 8;
+    const data = {};
+
+    for (let i = 0; i < count; i++) {
+        const n = view.getUint32(offset, true);
+        const nameLength = view.getUint16(offset + 4, true);
+        offset += 6;
+        const name = textDecoder.decode(new Uint8Array(buffer, offset, nameLength));
+        offset = align(offset + nameLength, 8);
+
+        // the timestamps are rebuilt in float64 from the first one and the float32 deltas
+        const time = new Float64Array(n);
+        let current = view.getFloat64(offset, true);
+        offset += 8;
+        const deltas = new Float32Array(buffer, offset, Math.max(n - 1, 0));
+        if (n > 0) {
+            time[0] = current;
+        }
+        for (let j = 0; j < deltas.length; j++) {
+            current += deltas[j];
+            time[j + 1] = current;
+        }
+        offset = align(offset + deltas.length * 4, 4);
+
+        // NaN where the temperature is unknown
+        const temperature = new Float32Array(buffer, offset, n);
+        offset = align(offset + n * 4, 8);
+
+        data[name] = { time: time, temperature: temperature };
+    }
+
+    return { result: 'ok', data: data };
+};
+
+const decodeStatus = (buffer) => {
+    const view = new DataView(buffer);
+    let offset = 0;
+
+    const readString = () => {
+        const length = view.getUint16(offset, true);
+        const text = textDecoder.decode(new Uint8Array(buffer, offset + 2, length));
+        offset += 2 + length;
+        return text;
+    };
+    const readFloat = () => {
+        const value = view.getFloat64(offset, true);
+        offset += 8;
+        return isNaN(value) ? null : value;
+    };
+
+    const count = view.getUint16(0, true);
+    offset = 2;
+    const status = {};
+    for (let i = 0; i < count; i++) {
+        const name = readString();
+        const time = readFloat();
+        const temperature = readFloat();
+        const setpoint = readFloat();
+        const settleEta = readFloat();
+        const controlEnabled = view.getUint8(offset) !== 0;
+        const ok = view.getUint8(offset + 1) !== 0;
+        offset += 2;
+        const currentProgram = readString();
+        const currentAction = readString();
+        const errorMsg = readString();
+
+        status[name] = ok ? {
+            name: name,
+            temperature: temperature,
+            time: time,
+            control_enabled: controlEnabled,
+            current_program: currentProgram,
+            current_action: currentAction,
+            setpoint: setpoint,
+            settle_eta: settleEta,
+            status: 'ok'
+        } : { status: 'error', error_msg: errorMsg };
+    }
+
+    return { result: 'ok', status: status };
+};
+
+export const decodeBinaryMessage = async (data) => {
+    const buffer = data instanceof Blob ? await data.arrayBuffer() : data;
+    const header = new Uint8Array(buffer, 0, 4);
+    const flags = header[1];
+    const kind = header[2];
+    const event = textDecoder.decode(new Uint8Array(buffer, 4, header[3]));
+
+    const start = align(4 + header[3], 8);
+    let body = buffer.slice(start);
+    if (flags & FLAG_COMPRESSED) {
+        body = await inflate(body);
+    }
+
+    let message;
+    if (kind === KIND_HISTORY) {
+        message = decodeHistory(body);
+    } else if (kind === KIND_STATUS) {
+        message = decodeStatus(body);
+    } else {
+        throw new Error(`Unknown binary frame kind ${kind}`);
+    }
+    message.event = event;
+    return message;
+};
@@ -150,30 +150,19 @@ class Dashboard extends React.Component {
     setHistory = (dataDict) => {
         const data = dataDict.data;
         const newData = Object.keys(data).map((dev, i) => {
-            const time = data[dev].time.map((time, i) => {
-                return new Date(time  * 1000);
-            });
+            // the series may be typed arrays (binary frames), appendHistory needs plain arrays
+            const start = Math.max(data[dev].time.length - maxHistoryLength, 0);
+            const time = Array.from(data[dev].time.slice(start), (time) => new Date(time * 1000));
+            const temperature = Array.from(data[dev].temperature.slice(start),
+                (temperature) => (temperature === null || isNaN(temperature)) ? null : temperature);
 
-            if (time.length < maxHistoryLength) {
-                return {
-                    x: time,
-                    y: data[dev].temperature,
-                    type: 'scatter',
-                    mode: 'lines',
-                    name: dev,
-                };
-            } else {
-                const _time = time.splice(time.length - maxHistoryLength, maxHistoryLength);
-                const _temperature = data[dev].temperature.splice(time.length - maxHistoryLength, maxHistoryLength);
-
-                return {
-                    x: _time,
-                    y: _temperature,
-                    type: 'scatter',
-                    mode: 'lines',
-                    name: dev,
-                };
-            }
+            return {
+                x: time,
+                y: temperature,
+                type: 'scatter',
+                mode: 'lines',
+                name: dev,
+            };
         });
         this.setState({
             data: newData
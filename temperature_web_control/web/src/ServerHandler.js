@@ -1,5 +1,6 @@
 import React from 'react';
 import RobustWebSocket from 'robust-websocket';
+import { decodeBinaryMessage, supportsCompression } from './BinaryDecoder';
 
 const timeout = 5000;
 
@@ -10,6 +11,8 @@ class ServerHandler {
         this.connectionLost = true;
 
         this.pingTimeout = null;
+        // binary frames are decoded asynchronously, messages are handled in the order they arrived
+        this.messageQueue = Promise.resolve();
 
         this.onLostConnection = null;
         this.onEstablishedConnection = null;
@@ -55,12 +58,14 @@ class ServerHandler {
                 this.websocket.onopen = () => {
                     console.log("Server Handler: Websocket connection open");
                     this.connectionLost = false;
+                    this.requestBinaryEncoding();
                     this.websocket.onopen = (() => {
                         console.log("Server Handler: Websocket connection restored");
                         this.connectionLost = false;
+                        this.requestBinaryEncoding();
                         this.onEstablishedConnection && this.onEstablishedConnection();
                     });
-                    this.websocket.onmessage = ((event) => this.messageHandler(event.data));
+                    this.websocket.onmessage = ((event) => this.queueMessage(event.data));
                     this.onEstablishedConnection && this.onEstablishedConnection();
                 };
             }
@@ -85,8 +90,22 @@ class ServerHandler {
         }
     }
 
-    messageHandler = (_message) => {
-        const message = JSON.parse(_message);
+    requestBinaryEncoding = () => {
+        // status and history messages then come as binary frames, see BinaryDecoder.js
+        this.sendMessage({ event: "set_encoding", encoding: "binary", compress: supportsCompression });
+    }
+
+    queueMessage = (data) => {
+        this.messageQueue = this.messageQueue.then(
+            () => typeof data === 'string' ? JSON.parse(data) : decodeBinaryMessage(data)
+        ).then(
+            message => this.messageHandler(message)
+        ).catch(
+            error => console.error("Server Handler: Cannot handle message:", error)
+        );
+    }
+
+    messageHandler = (message) => {
         if (!message.event) {
             console.error("Server Handler: Received malformed message: ", message);
         }